@@ -3,13 +3,20 @@
 from flask import Flask, request, jsonify,Response
 from flask_cors import CORS
 from session_manager import SessionManager
-from model import chatbot_enhanced
+from model import (chatbot_enhanced, chatbot_enhanced_stream, predict_fragments, get_inference_stats,
+                   get_pipeline_stats, warm_up, reload_model, watch_model_files, get_model_info, MODEL_WATCH_INTERVAL)
+from handle_functions import wikipedia_cache
+from preprocessing import preprocessor
+from metrics import generate_latest, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiler import request_profiler
 import logging
+import json
 import uuid
 from datetime import datetime
 from functools import wraps
 import os
 import re
+import hmac
 
 # Set up logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -26,7 +33,16 @@ app = Flask(__name__)
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 MAX_MESSAGE_LENGTH = int(os.getenv('MAX_MESSAGE_LENGTH', '1000'))
 API_VERSION = os.getenv('API_VERSION', '1.1.0')
+MAX_BATCH_MESSAGES = int(os.getenv('MAX_BATCH_MESSAGES', '20'))
+# Load NLTK and seed caches in a background thread right after startup
+BACKGROUND_WARM_UP = os.getenv('BACKGROUND_WARM_UP', 'true').lower() in ('1', 'true', 'yes')
+# Start background threads at import; gunicorn.conf.py starts them in each worker instead
+START_BACKGROUND_TASKS = os.getenv('START_BACKGROUND_TASKS', 'true').lower() in ('1', 'true', 'yes')
 SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT_MINUTES', '30'))
+# Seconds between sweeps of expired sessions (new sessions also reclaim a few each)
+SESSION_CLEANUP_INTERVAL = float(os.getenv('SESSION_CLEANUP_INTERVAL', '60'))
+# Bearer token for /admin/* endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
 session_manager = SessionManager(session_timeout_minutes=SESSION_TIMEOUT)
 
 
@@ -85,6 +101,49 @@ def validate_request(required_fields=None):
     return decorator
 
 
+def has_admin_token():
+    """Whether the request carries 'Authorization: Bearer <ADMIN_TOKEN>'."""
+    if not ADMIN_TOKEN:
+        return False
+
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+    # Constant-time comparison, so the token cannot be guessed from response times
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+
+def require_admin_token(f):
+    """Reject requests without 'Authorization: Bearer <ADMIN_TOKEN>'."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled"}), 404
+
+        if not has_admin_token():
+            logger.warning(f"Rejected admin request from {request.remote_addr}")
+            return jsonify({"error": "Unauthorized"}), 401
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def profiled(f):
+    """
+    Run the request under the sampling profiler when it sends 'X-Profile: 1'
+    with the admin token, is sampled, or PROFILE_SLOW_MS is set (see profiler.py).
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        requested = request.headers.get('X-Profile') == '1' and has_admin_token()
+        trigger = request_profiler.trigger(requested)
+        if trigger is None:
+            return f(*args, **kwargs)
+        return request_profiler.run(trigger, request.path, f, *args, **kwargs)
+
+    return wrapper
+
+
 def handle_errors(f):
     
     @wraps(f)
@@ -163,6 +222,135 @@ def personalize_response(response, user_name):
 
 
 
+def message_error(message):
+    """Why a stripped message cannot be answered, or None."""
+    if not message:
+        return "Message cannot be empty"
+    if len(message) > MAX_MESSAGE_LENGTH:
+        return f"Message too long (max {MAX_MESSAGE_LENGTH} characters)"
+    return None
+
+
+def process_message(session_id, session, message, predictions=None):
+    """
+    Run one validated message through the name flow or the chatbot and
+    record it in the session. Returns the JSON-serializable response payload.
+    """
+    payload = reply_to_name(session_id, session, message)
+    if payload:
+        return payload
+
+    logger.info(f"Session {session_id[:8]}... received message: {message[:50]}...")
+
+    try:
+        answer = chatbot_enhanced(message,session,threshold=0.2,predictions=predictions)
+    except Exception as e:
+        logger.error(f"Error getting chatbot response: {e}", exc_info=True)
+        answer = None
+
+    return finish_message(session_id, session, message, answer)
+
+
+def reply_to_name(session_id, session, message):
+    """The payload answering the name question asked by /start, or None for a normal message."""
+
+    # DEBUG: Log session state
+    logger.info(f"Session state - name_asked: {session.get('name_asked')}, user_name: {session.get('user_name')}")
+    logger.info(f"Received message: {message}")
+
+    if session.get("name_asked") is True and session.get("user_name") is None:
+        logger.info("Processing message as name input")
+        # This is their response to "What should I call you?"
+        # Extract name from their message
+        name = extract_name(message)
+        if name:
+            logger.info(f"Extracted name: {name}")
+    
+            success=session_manager.update_session(session_id, user_name=name)
+            logger.info(f"Update session result: {success}")
+            response = f"Nice to meet you, {name}! 😊 How can I help you today?"
+            detected_intent = "name_introduction"
+    
+            # Save to history
+            session_manager.add_to_history(session_id, message, response, intent=detected_intent)
+    
+            return {
+                "response": response,
+                "session_id": session_id,
+                "intent": detected_intent,
+                "user_name": name,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        else:
+            logger.warning(f"Could not extract name from: {message}")
+            # If we can't extract a name, use the message as-is
+            name = message.capitalize()
+            session_manager.update_session(session_id, user_name=name)
+            response = f"Nice to meet you, {name}! 😊 How can I help you today?"
+            detected_intent = "name_introduction"
+            
+            session_manager.add_to_history(session_id, message, response, intent=detected_intent)
+            
+            return {
+                "response": response,
+                "session_id": session_id,
+                "intent": detected_intent,
+                "user_name": name,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+    # Normal chat flow - name already set
+    logger.info(f"Processing as normal chat message")
+    return None
+
+
+def finish_message(session_id, session, message, answer):
+    """
+    Personalize the chatbot's (response, intent, email) answer, or the error
+    reply when it is None, record it in the session and build the payload.
+    """
+    if answer is not None:
+        response, detected_intent, email_extracted = answer
+        user_name = session.get("user_name")
+        
+        if user_name and detected_intent in ["greeting", "thanks"]:
+            response = personalize_response(response, user_name)
+
+    else:
+        response = "Désolé, une erreur s'est produite. Veuillez réessayer."
+        detected_intent = None
+        email_extracted = None
+
+    # Update session through session_manager 
+    updates = {}
+    if detected_intent:
+        updates['last_intent'] = detected_intent
+    if email_extracted:
+        updates['email'] = email_extracted
+
+    if updates:
+
+        session_manager.update_session(session_id, **updates)
+
+        logger.debug(f"Updated session {session_id[:8]}... with: {updates}")
+
+    # Save conversation to history
+    session_manager.add_to_history(session_id, message,response,intent=detected_intent)
+
+    logger.info(f"Session {session_id[:8]}... response: {response[:50]}... (intent: {detected_intent})")
+
+    return {
+        "response": response,
+        "session_id": session_id,
+        "intent": detected_intent,
+        "user_name": session.get("user_name"),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+
+
+
 @app.route('/', methods=['GET'])
 def home():
     """Health check endpoint"""
@@ -181,28 +369,45 @@ def ping():
     return "pong", 200
 
 
-@app.route('/health', methods=['GET'])
-def health():
-    from model import vectorizer, model
-    
+def health_payload():
     """Detailed health check"""
+    from model import model_ready
+
     model_exists = os.path.exists('models/chatbot_model.pkl')
-    model_loaded = (vectorizer is not None and model is not None)
+    model_loaded = model_ready()
+    model_info = get_model_info()
     stats = session_manager.get_stats()
-    return jsonify({
-        "status": "healthy",
+    try:
+        # Entry points other than app.py, gunicorn and asgi.py load it lazily
+        preprocessor.load()
+    except RuntimeError:
+        pass
+    preprocessing = preprocessor.get_stats()
+    # Failed to load (every classification raises), or NLTK_REQUIRED=false and
+    # served other features than the model was trained with
+    healthy = not (preprocessing["load_error"] or preprocessing["missing_nltk_data"])
+    return {
+        "status": "healthy" if healthy else "unhealthy",
         "version": API_VERSION,
+        "model_version": model_info["version"],
+        "model": model_info,
         "model_exists_on_disk": model_exists,
         "model_loaded_in_memory": model_loaded,
         "sessions": stats,
+        "preprocessing": preprocessing,
         "timestamp": datetime.utcnow().isoformat()
-    })
+    }
 
 
-@app.route('/start', methods=['POST'])
-@handle_errors
-def start_conversation():
-   
+@app.route('/health', methods=['GET'])
+def health():
+    payload = health_payload()
+    return jsonify(payload), 200 if payload["status"] == "healthy" else 503
+
+
+def start_payload():
+    """Open a conversation that starts by asking the user's name."""
+
     # Create new session
     session_id = session_manager.create_session()
     logger.info(f"Started new conversation: {session_id}")
@@ -222,18 +427,25 @@ def start_conversation():
     # Return greeting that asks for name
     greeting = "Hello! 👋 I'm your AI assistant. What should I call you?"
 
-    return jsonify({
+    return {
         "response": greeting,
         "session_id": session_id,
         "ask_for_name": True,
         "timestamp": datetime.utcnow().isoformat()
-    })
+    }
+
+
+@app.route('/start', methods=['POST'])
+@handle_errors
+def start_conversation():
+    return jsonify(start_payload())
 
 
 
 
 @app.route('/chat', methods=['POST'])
 @handle_errors
+@profiled
 @validate_request(required_fields=['message'])
 def chat():
 
@@ -256,107 +468,148 @@ def chat():
     message = data.get('message', '').strip()
 
     # Validate message
-    if not message:
+    error = message_error(message)
+    if error:
         return jsonify({
-            "error": "Message cannot be empty",
+            "error": error,
             "session_id": session_id
         }), 400
 
-    if len(message) > MAX_MESSAGE_LENGTH:
+    return jsonify(process_message(session_id, session, message))
+
+
+@app.route('/chat/batch', methods=['POST'])
+@handle_errors
+@profiled
+@validate_request(required_fields=['messages'])
+def chat_batch():
+
+    from flask import g
+    data = g.validated_data
+
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "'messages' must be a non-empty list"}), 400
+
+    if len(messages) > MAX_BATCH_MESSAGES:
         return jsonify({
-            "error": f"Message too long (max {MAX_MESSAGE_LENGTH} characters)",
-            "session_id": session_id
+            "error": f"Too many messages (max {MAX_BATCH_MESSAGES} per batch)"
         }), 400
 
-    # DEBUG: Log session state
-    logger.info(f"Session state - name_asked: {session.get('name_asked')}, user_name: {session.get('user_name')}")
-    logger.info(f"Received message: {message}")
+    # Get or create session
+    session_id = data.get('session_id')
+    if not session_id:
+        session_id = session_manager.create_session()
+        logger.info(f"Created new session: {session_id}")
 
-    if session.get("name_asked") is True and session.get("user_name") is None:
-        logger.info("Processing message as name input")
-        # This is their response to "What should I call you?"
-        # Extract name from their message
-        name = extract_name(message)
-        if name:
-            logger.info(f"Extracted name: {name}")
-    
-            success=session_manager.update_session(session_id, user_name=name)
-            logger.info(f"Update session result: {success}")
-            response = f"Nice to meet you, {name}! 😊 How can I help you today?"
-            detected_intent = "name_introduction"
-    
-            # Save to history
-            session_manager.add_to_history(session_id, message, response, intent=detected_intent)
-    
-            return jsonify({
-                "response": response,
-                "session_id": session_id,
-                "intent": detected_intent,
-                "user_name": name,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-        else:
-            logger.warning(f"Could not extract name from: {message}")
-            # If we can't extract a name, use the message as-is
-            name = message.capitalize()
-            session_manager.update_session(session_id, user_name=name)
-            response = f"Nice to meet you, {name}! 😊 How can I help you today?"
-            detected_intent = "name_introduction"
-            
-            session_manager.add_to_history(session_id, message, response, intent=detected_intent)
-            
-            return jsonify({
-                "response": response,
-                "session_id": session_id,
-                "intent": detected_intent,
-                "user_name": name,
-                "timestamp": datetime.utcnow().isoformat()
-            })
+    session = session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Failed to get session: {session_id}")
+        return jsonify({"error": "Invalid session"}), 400
 
-    # Normal chat flow - name already set
-    logger.info(f"Processing as normal chat message")
+    messages = [m.strip() if isinstance(m, str) else "" for m in messages]
 
+    # Classify the sub-questions of every message in a single model call
+    predictions = predict_fragments([m for m in messages if len(m) <= MAX_MESSAGE_LENGTH])
 
-    
-    logger.info(f"Session {session_id[:8]}... received message: {message[:50]}...")
-    
+    results = []
+    for message in messages:
+        error = message_error(message)
+        if error:
+            results.append({"error": error})
+            continue
+
+        # Re-read the session so each message sees the previous one's updates
+        session = session_manager.get_session(session_id)
+        result = process_message(session_id, session, message, predictions=predictions)
+        results.append(result)
+
+    logger.info(f"Session {session_id[:8]}... processed batch of {len(messages)} messages")
+
+    return jsonify({
+        "results": results,
+        "session_id": session_id,
+        "count": len(results),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+def sse_event(event, data):
+    """One Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_message(session_id, session, message):
+    """
+    process_message() as Server-Sent Events: a 'fragment' event per
+    sub-question as soon as it is answered (local intents right away, network
+    answers later), then a 'done' event carrying the /chat payload.
+    """
     try:
-        response, detected_intent, email_extracted = chatbot_enhanced(message,session,threshold=0.2)
+        payload = reply_to_name(session_id, session, message)
+        if payload:
+            yield sse_event("fragment", {"index": 0, "count": 1, "response": payload["response"],
+                                         "intent": payload["intent"]})
+            yield sse_event("done", payload)
+            return
+
+        logger.info(f"Session {session_id[:8]}... streaming message: {message[:50]}...")
+
         user_name = session.get("user_name")
-        
-        if user_name and detected_intent in ["greeting", "thanks"]:
-            response = personalize_response(response, user_name)
+        answer = None
+        for kind, *event in chatbot_enhanced_stream(message, session, threshold=0.2):
+            if kind == "answer":
+                answer = event[0]
+                continue
+
+            index, count, (response, intent) = event
+            if user_name and intent in ["greeting", "thanks"]:
+                response = personalize_response(response, user_name)
+            yield sse_event("fragment", {"index": index, "count": count, "response": response, "intent": intent})
+
+        yield sse_event("done", finish_message(session_id, session, message, answer))
 
     except Exception as e:
-        logger.error(f"Error getting chatbot response: {e}", exc_info=True)
-        response = "Désolé, une erreur s'est produite. Veuillez réessayer."
-        detected_intent = None
-        email_extracted = None
+        logger.error(f"Error streaming response: {e}", exc_info=True)
+        yield sse_event("error", {
+            "error": "Internal server error",
+            "message": "Une erreur inattendue s'est produite."
+        })
 
-    # Update session through session_manager 
-    updates = {}
-    if detected_intent:
-        updates['last_intent'] = detected_intent
-    if email_extracted:
-        updates['email'] = email_extracted
 
-    if updates:
+@app.route('/chat/stream', methods=['POST'])
+@handle_errors
+@validate_request(required_fields=['message'])
+def chat_stream():
 
-        session_manager.update_session(session_id, **updates)
+    from flask import g
+    data = g.validated_data
 
-        logger.debug(f"Updated session {session_id[:8]}... with: {updates}")
+    # Get or create session
+    session_id = data.get('session_id')
+    if not session_id:
+        session_id = session_manager.create_session()
+        logger.info(f"Created new session: {session_id}")
 
-    # Save conversation to history
-    session_manager.add_to_history(session_id, message,response,intent=detected_intent)
+    session = session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Failed to get session: {session_id}")
+        return jsonify({"error": "Invalid session"}), 400
 
-    logger.info(f"Session {session_id[:8]}... response: {response[:50]}... (intent: {detected_intent})")
+    message = data.get('message', '').strip()
 
-    return jsonify({
-        "response": response,
-        "session_id": session_id,
-        "intent": detected_intent,
-        "user_name": session.get("user_name"),
-        "timestamp": datetime.utcnow().isoformat()
+    # Invalid requests get the same JSON errors as /chat, before the stream starts
+    error = message_error(message)
+    if error:
+        return jsonify({
+            "error": error,
+            "session_id": session_id
+        }), 400
+
+    return Response(stream_message(session_id, session, message), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx and similar proxies from buffering the events
+        "X-Accel-Buffering": "no",
     })
 
 
@@ -395,16 +648,79 @@ def clear_session(session_id):
         }), 404
 
 
-@app.route('/stats', methods=['GET'])
-def get_stats():
+def stats_payload():
     stats = session_manager.get_stats()
-    return jsonify({
+    return {
         "stats": stats,
+        "inference": get_inference_stats(),
+        "handlers": get_pipeline_stats(),
+        "wikipedia_cache": wikipedia_cache.get_stats(),
         "version": API_VERSION,
         "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    return jsonify(stats_payload())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms and message/intent counters, Prometheus text format"""
+    return Response(generate_latest(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/admin/reload', methods=['POST'])
+@handle_errors
+@require_admin_token
+def admin_reload():
+    """
+    Load, validate and swap in the model on disk. Only the worker serving
+    this request reloads; the others follow through their file watcher.
+    With ONLINE_LEARNING, ?refit=1 refits the online model from scratch.
+    """
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+    refit = request.args.get('refit', '').lower() in ('1', 'true', 'yes')
+    result = reload_model(force=force, refit=refit)
+    result["pid"] = os.getpid()
+
+    status_codes = {"reloaded": 200, "unchanged": 200, "rejected": 422}
+    return jsonify(result), status_codes.get(result["status"], 500)
+
+
+@app.route('/debug/profiles', methods=['GET'])
+@handle_errors
+@require_admin_token
+def list_profiles():
+    """Profiles kept by this worker, newest first"""
+    return jsonify({
+        "profiles": request_profiler.list(),
+        "profiler": request_profiler.get_stats(),
+        "pid": os.getpid()
     })
 
 
+@app.route('/debug/profiles/<profile_id>', methods=['GET'])
+@handle_errors
+@require_admin_token
+def get_profile(profile_id):
+    """
+    A profile as folded stacks (flamegraph.pl, speedscope, inferno);
+    ?format=json adds its summary.
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found", "pid": os.getpid()}), 404
+
+    if request.args.get('format') == 'json':
+        return jsonify({**profile.summary(), "stacks": dict(profile.stacks.most_common())})
+
+    response = Response(profile.folded(), content_type='text/plain; charset=utf-8')
+    response.headers['Content-Disposition'] = f'inline; filename="profile-{profile.id}.folded"'
+    return response
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -434,7 +750,7 @@ def internal_error(error):
 
 
 # Periodic cleanup task (run every hour)
-from threading import Thread
+from threading import Thread, Lock
 import time
 
 
@@ -442,20 +758,58 @@ def cleanup_task():
     """Background task to cleanup expired sessions"""
     while True:
         try:
-            time.sleep(3600)  # Sleep for 1 hour
+            # Cheap: only the expired sessions are visited
+            time.sleep(SESSION_CLEANUP_INTERVAL)
             expired = session_manager.cleanup_expired_sessions()
-            logger.info(f"Cleaned up {expired} expired sessions")
+            if expired:
+                logger.info(f"Cleaned up {expired} expired sessions")
         except Exception as e:
             logger.error(f"Error in cleanup task: {e}")
 
 
-# Start cleanup thread
-cleanup_thread = Thread(target=cleanup_task, daemon=True)
-cleanup_thread.start()
+cleanup_thread = None
+warm_up_thread = None
+model_watcher_thread = None
+_background_pid = None
+_background_lock = Lock()
+
+
+def start_background_tasks(warm=BACKGROUND_WARM_UP):
+    """
+    Start the session cleanup thread, the model file watcher and, with
+    ``warm``, the background warm-up (NLTK, caches and HTTP pools) in this
+    process, once.
+
+    Threads do not survive fork(): a preforking server calls this in every
+    worker after the fork (see gunicorn.conf.py).
+    """
+    global cleanup_thread, warm_up_thread, model_watcher_thread, _background_pid
+
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+
+        cleanup_thread = Thread(target=cleanup_task, name="session-cleanup", daemon=True)
+        cleanup_thread.start()
+
+        if MODEL_WATCH_INTERVAL > 0:
+            model_watcher_thread = Thread(target=watch_model_files, name="model-watcher", daemon=True)
+            model_watcher_thread.start()
+
+        if warm:
+            warm_up_thread = Thread(target=warm_up, name="warm-up", daemon=True)
+            warm_up_thread.start()
+
+
+if START_BACKGROUND_TASKS:
+    start_background_tasks()
 
 if __name__ == '__main__':
     logger.info("Starting chatbot server...")
     logger.info(f"API Version: {API_VERSION}")
+    # Refuse to start without the NLTK data the model was trained with
+    preprocessor.load()
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 
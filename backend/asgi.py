@@ -0,0 +1,242 @@
+"""
+Asyncio serving entry point
+Run from the backend directory: uvicorn asgi:app --host 0.0.0.0 --port 5000 [--workers 4]
+
+Serves the chat routes of app.py (/start, /chat, /chat/batch, /history/<id>,
+/session/<id>, /stats, /health, /metrics) from an event loop. Wikipedia
+lookups are awaited (httpx) instead of holding a thread for the round trips,
+and the rest of the handler pipeline, classification included, runs in a
+bounded thread pool, so a conversation waiting on the network costs a
+coroutine, not a thread. Sessions, model and caches are the ones app.py
+sets up; the admin and debug endpoints stay on the Flask app.
+"""
+
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from app import (session_manager, message_error, reply_to_name, finish_message, start_payload, health_payload,
+                 stats_payload, API_VERSION, ENVIRONMENT, ALLOWED_ORIGINS, MAX_BATCH_MESSAGES)
+from model import chatbot_enhanced_async, predict_fragments
+from preprocessing import preprocessor
+from metrics import generate_latest, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from wikipedia_client import wikipedia_client
+
+logger = logging.getLogger(__name__)
+
+# Threads running the CPU-bound handlers (rules, classifier, fallback)
+ASGI_EXECUTOR_THREADS = int(os.getenv('ASGI_EXECUTOR_THREADS', '4'))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_THREADS, thread_name_prefix="asgi-cpu")
+
+
+async def read_json(request: Request, required_fields=()):
+    """The JSON object body, or raise HTTPException(400) like validate_request in app.py."""
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/json":
+        raise HTTPException(400, "Content-Type must be application/json")
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Invalid JSON format")
+
+    missing = [field for field in required_fields if field not in data]
+    if missing:
+        raise HTTPException(400, f"Missing required fields: {', '.join(missing)}")
+    return data
+
+
+def session_for(data):
+    """(session_id, session) of the request, creating the session when no id is given."""
+    session_id = data.get('session_id')
+    if not session_id:
+        session_id = session_manager.create_session()
+        logger.info(f"Created new session: {session_id}")
+
+    session = session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Failed to get session: {session_id}")
+        raise HTTPException(400, "Invalid session")
+    return session_id, session
+
+
+async def process_message(session_id, session, message, predictions=None):
+    """app.process_message() with the chatbot awaited."""
+    payload = reply_to_name(session_id, session, message)
+    if payload:
+        return payload
+
+    try:
+        answer = await chatbot_enhanced_async(message, session, threshold=0.2, predictions=predictions,
+                                              executor=executor)
+    except Exception as e:
+        logger.error(f"Error getting chatbot response: {e}", exc_info=True)
+        answer = None
+
+    return finish_message(session_id, session, message, answer)
+
+
+async def home(request):
+    return JSONResponse({
+        "status": "healthy",
+        "service": "Chatbot API",
+        "version": API_VERSION,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+async def ping(request):
+    return PlainTextResponse("pong")
+
+
+async def health(request):
+    payload = health_payload()
+    return JSONResponse(payload, status_code=200 if payload["status"] == "healthy" else 503)
+
+
+async def start_conversation(request):
+    return JSONResponse(start_payload())
+
+
+async def chat(request):
+    data = await read_json(request, required_fields=['message'])
+    session_id, session = session_for(data)
+
+    message = data.get('message', '').strip()
+    error = message_error(message)
+    if error:
+        return JSONResponse({"error": error, "session_id": session_id}, status_code=400)
+
+    return JSONResponse(await process_message(session_id, session, message))
+
+
+async def chat_batch(request):
+    data = await read_json(request, required_fields=['messages'])
+
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return JSONResponse({"error": "'messages' must be a non-empty list"}, status_code=400)
+
+    if len(messages) > MAX_BATCH_MESSAGES:
+        return JSONResponse({"error": f"Too many messages (max {MAX_BATCH_MESSAGES} per batch)"}, status_code=400)
+
+    session_id, session = session_for(data)
+    messages = [m.strip() if isinstance(m, str) else "" for m in messages]
+
+    # Classify the sub-questions of every message in a single model call, off the loop
+    predictions = await asyncio.get_running_loop().run_in_executor(
+        executor, predict_fragments, [m for m in messages if not message_error(m)])
+
+    results = []
+    for message in messages:
+        error = message_error(message)
+        if error:
+            results.append({"error": error})
+            continue
+
+        # Re-read the session so each message sees the previous one's updates
+        session = session_manager.get_session(session_id)
+        results.append(await process_message(session_id, session, message, predictions=predictions))
+
+    return JSONResponse({
+        "results": results,
+        "session_id": session_id,
+        "count": len(results),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+async def get_history(request):
+    session_id = request.path_params['session_id']
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        limit = 10
+
+    if limit < 1 or limit > 100:
+        return JSONResponse({"error": "Limit must be between 1 and 100"}, status_code=400)
+
+    history = session_manager.get_history(session_id, limit=limit)
+    return JSONResponse({"history": history, "session_id": session_id, "count": len(history)})
+
+
+async def clear_session(request):
+    session_id = request.path_params['session_id']
+    if session_manager.clear_session(session_id):
+        return JSONResponse({"message": "Session cleared successfully", "session_id": session_id})
+    return JSONResponse({"message": "Session not found", "session_id": session_id}, status_code=404)
+
+
+async def get_stats(request):
+    return JSONResponse(stats_payload())
+
+
+async def metrics(request):
+    return Response(generate_latest(), media_type=METRICS_CONTENT_TYPE)
+
+
+async def http_error(request, exc):
+    """Same JSON error bodies as the Flask app."""
+    if exc.status_code == 404:
+        return JSONResponse({"error": "Endpoint not found",
+                             "message": "The requested URL was not found on the server."}, status_code=404)
+    if exc.status_code == 405:
+        return JSONResponse({"error": "Method not allowed",
+                             "message": "The method is not allowed for the requested URL."}, status_code=405)
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+async def internal_error(request, exc):
+    logger.error(f"Unexpected error in {request.url.path}: {exc}", exc_info=exc)
+    return JSONResponse({"error": "Internal server error",
+                         "message": "Une erreur inattendue s'est produite."}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Refuse to start without the NLTK data the model was trained with
+    await asyncio.get_running_loop().run_in_executor(executor, preprocessor.load)
+    logger.info(f"ASGI server started ({ASGI_EXECUTOR_THREADS} executor threads)")
+    yield
+    await wikipedia_client.aclose()
+    executor.shutdown(wait=False)
+
+
+routes = [
+    Route('/', home, methods=['GET']),
+    Route('/ping', ping, methods=['GET']),
+    Route('/health', health, methods=['GET']),
+    Route('/start', start_conversation, methods=['POST']),
+    Route('/chat', chat, methods=['POST']),
+    Route('/chat/batch', chat_batch, methods=['POST']),
+    Route('/history/{session_id}', get_history, methods=['GET']),
+    Route('/session/{session_id}', clear_session, methods=['DELETE']),
+    Route('/stats', get_stats, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+]
+
+if ENVIRONMENT == 'production':
+    cors = Middleware(CORSMiddleware, allow_origins=ALLOWED_ORIGINS, allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+                      allow_headers=["Content-Type"])
+else:
+    cors = Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+app = Starlette(
+    routes=routes,
+    middleware=[cors],
+    exception_handlers={HTTPException: http_error, Exception: internal_error},
+    lifespan=lifespan,
+)
@@ -0,0 +1,210 @@
+"""
+Micro-batching scheduler for model inference
+Collects classification requests from concurrent threads and runs them as one batch
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class _PendingRequest:
+    __slots__ = ("text", "enqueued_at", "done", "result", "error", "abandoned")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when submit() has given up waiting: the worker skips the item
+        self.abandoned = False
+
+
+class MicroBatcher:
+    """
+    Groups single-item calls coming from many threads into batched calls.
+
+    Callers block in submit() while a background worker waits up to
+    max_wait_ms (or until max_batch_size items are queued), runs batch_fn
+    once over every queued item and hands each caller its own result.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[str]], List], max_batch_size: int = 32,
+                 max_wait_ms: float = 2.0, timeout: float = 5.0):
+        """
+        Initialize the batcher.
+
+        Args:
+            batch_fn: Function mapping a list of inputs to a list of results
+            max_batch_size: Largest number of items run in one batch
+            max_wait_ms: How long the first queued item may wait for company
+            timeout: How long submit() waits for its result before giving up
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+
+        self._start_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._worker: Optional[threading.Thread] = None
+
+        # Threads and held locks do not survive fork(), so start fresh in the child
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._abandoned = 0
+        self._queue_wait_total = 0.0
+        self._histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def _reset_after_fork(self):
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+
+        with self._start_lock:
+            if self._worker is not None:
+                return
+
+            self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+            self._worker.start()
+            logger.info(
+                f"Inference batcher started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait * 1000:g})"
+            )
+
+    def submit(self, text: str):
+        """Queue one item and block until its batch has been processed."""
+        return self.submit_many([text])[0]
+
+    def submit_many(self, texts: List[str]) -> List:
+        """
+        Queue several items together and block until all are processed;
+        results are aligned with ``texts``.
+        """
+        if not texts:
+            return []
+        self._ensure_worker()
+
+        pending = [_PendingRequest(text) for text in texts]
+        with self._cond:
+            self._queue.extend(pending)
+            self._cond.notify()
+
+        deadline = time.perf_counter() + self.timeout
+        for item in pending:
+            if not item.done.wait(max(0.0, deadline - time.perf_counter())):
+                with self._cond:
+                    for abandoned in pending:
+                        abandoned.abandoned = True
+                raise TimeoutError(f"Inference batch did not complete within {self.timeout}s")
+
+        for item in pending:
+            if item.error is not None:
+                raise item.error
+        return [item.result for item in pending]
+
+    def _next_batch(self) -> List[_PendingRequest]:
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+
+                # Give concurrent requests a short window to join this batch
+                deadline = time.perf_counter() + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                # Items whose caller timed out are dropped instead of classified,
+                # so under overload they do not push live requests back
+                batch = []
+                abandoned = 0
+                while self._queue and len(batch) < self.max_batch_size:
+                    item = self._queue.popleft()
+                    if item.abandoned:
+                        abandoned += 1
+                    else:
+                        batch.append(item)
+
+                if abandoned:
+                    with self._stats_lock:
+                        self._abandoned += abandoned
+                if batch:
+                    return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+
+            try:
+                results = self.batch_fn([item.text for item in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+                for item, result in zip(batch, results):
+                    item.result = result
+            except Exception as e:
+                logger.error(f"Error in inference batch of {len(batch)}: {e}", exc_info=True)
+                for item in batch:
+                    item.error = e
+
+            for item in batch:
+                item.done.set()
+
+            self._record(batch, started)
+
+    def _record(self, batch: List[_PendingRequest], started: float):
+        size = len(batch)
+        bucket = next((i for i, upper in enumerate(BATCH_SIZE_BUCKETS) if size <= upper),
+                      len(BATCH_SIZE_BUCKETS))
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._largest_batch = max(self._largest_batch, size)
+            self._queue_wait_total += sum(started - item.enqueued_at for item in batch)
+            self._histogram[bucket] += 1
+
+    def get_stats(self) -> Dict:
+
+        with self._stats_lock:
+            histogram = {
+                f"<={upper}": count for upper, count in zip(BATCH_SIZE_BUCKETS, self._histogram)
+            }
+            histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._histogram[-1]
+
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "abandoned": self._abandoned,
+                "avg_queue_wait_ms": round(self._queue_wait_total / self._items * 1000, 3) if self._items else 0.0,
+                "batch_size_histogram": histogram,
+            }
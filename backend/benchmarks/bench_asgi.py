@@ -0,0 +1,153 @@
+"""
+Throughput of the Flask app (gunicorn, gthread) against the asyncio entry point (uvicorn asgi:app)
+Run from the backend directory: python benchmarks/bench_asgi.py [--users 64] [--wiki-delay-ms 200]
+
+Both servers run the same number of worker processes against a local
+stand-in for the MediaWiki API (fake_wikipedia.py) that answers after
+--wiki-delay-ms. Virtual users post /chat messages back to back; a share of
+them (--wiki-share) are Wikipedia questions with a unique query, so every one
+misses the cache and waits on the network, the rest are answered locally.
+With threads, a worker serves at most --threads conversations waiting on
+Wikipedia; with the event loop, waiting costs no thread.
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fake_wikipedia import FakeWikipediaServer
+from load_generator import Client, Recorder, summarize, free_port
+
+LOCAL_MESSAGES = ["hello", "what is your name", "thanks a lot", "12 * 7", "quels sont vos horaires",
+                  "je cherche un stage en informatique"]
+
+
+def spawn(kind, args, api_url, timeout=120):
+    port = free_port()
+    env = dict(os.environ, LOG_LEVEL="WARNING", GUNICORN_ACCESS_LOG="", WIKI_CACHE_PATH="",
+               WIKIPEDIA_BACKEND="network", WIKIPEDIA_API_URL=api_url, MODEL_WATCH_INTERVAL="0",
+               WIKIPEDIA_POOL_SIZE=str(max(16, args.users)))
+    if kind == "flask":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(args.workers),
+                   "--threads", str(args.threads), "--bind", f"127.0.0.1:{port}", "app:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(args.workers),
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"]
+
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with status {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/ping")
+            if connection.getresponse().status == 200:
+                return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{kind} server not ready after {timeout}s")
+
+
+def run_load(url, args):
+    """Closed loop: every user posts its next message as soon as the previous one is answered."""
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def user(index):
+        rng = random.Random(args.seed + index)
+        client = Client(url, recorder, args.timeout)
+        session_id = None
+        while time.monotonic() < deadline:
+            if rng.random() < args.wiki_share:
+                with counter_lock:
+                    message = f"who is victor hugo {next(counter)}"
+                endpoint = "/chat (wikipedia)"
+            else:
+                message = rng.choice(LOCAL_MESSAGES)
+                endpoint = "/chat (local)"
+            payload = {"message": message, "session_id": session_id}
+            data = client.request("POST", "/chat", endpoint, payload)
+            if data:
+                session_id = data.get("session_id")
+        client.close()
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.users)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", nargs="+", choices=("flask", "asgi"), default=["flask", "asgi"])
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes of each server")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker (Flask)")
+    parser.add_argument("--users", type=int, default=64, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--wiki-delay-ms", type=float, default=200.0, help="Latency of the stand-in Wikipedia")
+    parser.add_argument("--wiki-share", type=float, default=0.5, help="Share of messages asking Wikipedia")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the reports as JSON")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"FLASK vs ASGI ({args.users} users, {args.workers} worker(s), "
+          f"Wikipedia {args.wiki_delay_ms:.0f} ms on {args.wiki_share:.0%} of messages)")
+    print("=" * 60)
+
+    reports = {}
+    with FakeWikipediaServer(delay_ms=args.wiki_delay_ms) as wikipedia:
+        for kind in args.servers:
+            server, url = spawn(kind, args, wikipedia.api_url)
+            try:
+                reports[kind] = run_load(url, args)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+            report = reports[kind]
+            print(f"\n  {kind}: {report['throughput_rps']} req/s, {report['errors']} errors / {report['requests']}")
+            for endpoint, stats in report["endpoints"].items():
+                print(f"    {endpoint:20s} {stats['throughput_rps']:8.1f}/s  p50 {stats['p50_ms']:7.1f} ms  "
+                      f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+
+    if len(reports) == 2 and reports["flask"]["throughput_rps"]:
+        ratio = reports["asgi"]["throughput_rps"] / reports["flask"]["throughput_rps"]
+        print(f"\n  asgi / flask throughput: {ratio:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "reports": reports}, f, indent=2)
+        print(f"\n  results written to {args.output}")
+
+    failed = [kind for kind, report in reports.items() if report["errors"]]
+    if failed:
+        print(f"\n✗ Requests failed on: {', '.join(failed)}")
+        return False
+
+    print("\n✓ Both servers answered every request")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
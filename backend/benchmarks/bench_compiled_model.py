@@ -0,0 +1,85 @@
+"""
+Latency of the compiled classifier against the sklearn path
+Run from the backend directory: python benchmarks/bench_compiled_model.py
+Equivalence with the pickled model is tested in tests/test_compiled_model.py
+"""
+
+import sys
+import time
+import pickle
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from compiled_model import CompiledClassifier
+from data import questions
+
+
+def sample_messages(count, seed=42):
+    """Intent patterns plus noisy variants (typos, casing, extra spaces, unseen text)."""
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzéèàçù0123456789  "
+
+    messages = list(questions)
+    messages += ["", " ", "a", "Bonjour   comment\tça va", "QUELLE HEURE EST-IL", "x" * 200]
+    while len(messages) < count:
+        base = rng.choice(questions)
+        kind = rng.random()
+        if kind < 0.4:
+            position = rng.randrange(len(base) + 1)
+            messages.append(base[:position] + rng.choice(alphabet) + base[position:])
+        elif kind < 0.7:
+            messages.append(base.upper() if rng.random() < 0.5 else f"  {base}  ")
+        else:
+            length = rng.randint(1, 60)
+            messages.append("".join(rng.choice(alphabet) for _ in range(length)))
+    return messages
+
+
+def time_per_call(fn, messages, repeat):
+    """Median per-message latency in microseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            fn(message)
+        timings.append((time.perf_counter() - started) / len(messages) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=str(BACKEND_DIR / "models" / "chatbot_model.pkl"))
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        data = pickle.load(f)
+    vectorizer, model = data["vectorizer"], data["model"]
+    compiled = CompiledClassifier.from_sklearn(vectorizer, model)
+
+    messages = sample_messages(args.samples)
+
+    print("=" * 60)
+    print("LATENCY (median of runs, per message)")
+    print("=" * 60)
+    timed = messages[:500]
+    sklearn_single = time_per_call(lambda m: model.predict_proba(vectorizer.transform([m])), timed, args.repeat)
+    compiled_single = time_per_call(lambda m: compiled.predict_proba([m]), timed, args.repeat)
+    print(f"  sklearn  single: {sklearn_single:8.1f} µs")
+    print(f"  compiled single: {compiled_single:8.1f} µs  ({sklearn_single / compiled_single:.1f}x)")
+
+    batches = [timed[i:i + 32] for i in range(0, len(timed), 32)]
+    sklearn_batch = time_per_call(lambda b: model.predict_proba(vectorizer.transform(b)), batches, args.repeat)
+    compiled_batch = time_per_call(lambda b: compiled.predict_proba(b), batches, args.repeat)
+    print(f"  sklearn  batch of 32: {sklearn_batch / 32:8.1f} µs/message")
+    print(f"  compiled batch of 32: {compiled_batch / 32:8.1f} µs/message  ({sklearn_batch / compiled_batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
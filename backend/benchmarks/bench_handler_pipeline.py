@@ -0,0 +1,129 @@
+"""
+Network calls and latency of the handler pipeline against the old Wikipedia-first order
+Run from the backend directory: python benchmarks/bench_handler_pipeline.py
+Exits with status 1 if a question answerable locally reaches the network,
+or an encyclopedia question stops being answered by Wikipedia
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Only the stand-in server may answer: no persistent cache, no local index
+os.environ["WIKI_CACHE_PATH"] = ""
+os.environ["WIKIPEDIA_BACKEND"] = "network"
+
+import model
+from handler_pipeline import HandlerPipeline, COST_LOCAL, COST_FALLBACK
+from wikipedia_client import wikipedia_client
+from fake_wikipedia import FakeWikipediaServer
+
+# (message, answerable without the network)
+MESSAGES = [
+    ("what is the time", True),
+    ("what is the date", True),
+    ("tell me about your opening hours", True),
+    ("what is your name", True),
+    ("what is your age", True),
+    ("12 * 7", True),
+    ("hello", True),
+    ("goodbye", True),
+    ("who is victor hugo", False),
+    ("tell me about paris", False),
+    ("what is python", False),
+    ("what is philosophy", False),
+    ("what is a mandate", False),
+    ("what is an hourglass", False),
+    ("who is victor hugo? what is the time?", None),
+]
+
+
+def wikipedia_first_pipeline():
+    """The order chatbot_enhanced used before the pipeline existed."""
+    pipeline = HandlerPipeline()
+    pipeline.register("wikipedia", model._wikipedia_handler, COST_LOCAL, priority=0,
+                      precondition=lambda f: model._wikipedia_query(f) is not None)
+    pipeline.register("datetime", model._datetime_handler, COST_LOCAL, priority=10)
+    pipeline.register("goodbye", model._goodbye_handler, COST_LOCAL, priority=20)
+    pipeline.register("calculator", model._calculator_handler, COST_LOCAL, priority=30)
+    pipeline.register("fallback", model._fallback_handler, COST_FALLBACK, priority=10)
+    return pipeline
+
+
+def run(server, pipeline, repeat):
+    model.handler_pipeline = pipeline
+
+    rows = []
+    for message, local in MESSAGES:
+        before = server.stats["requests"]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response, intent, _ = model.chatbot_enhanced(message, {})
+            timings.append((time.perf_counter() - started) * 1000)
+        requests = (server.stats["requests"] - before) / repeat
+        rows.append((message, local, intent, requests, statistics.median(timings)))
+    return rows
+
+
+def print_rows(rows):
+    for message, _, intent, requests, latency in rows:
+        print(f"  {message[:42]:42s} {str(intent):18s} {requests:4.1f} req {latency:8.1f} ms")
+    print(f"  total requests: {sum(r[3] for r in rows):.0f}, "
+          f"total latency: {sum(r[4] for r in rows):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--delay-ms", type=float, default=150.0, help="Latency of the stand-in Wikipedia")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pipeline = model.handler_pipeline
+
+    with FakeWikipediaServer(delay_ms=args.delay_ms) as server:
+        wikipedia_client.api_url = server.api_url
+
+        print("=" * 60)
+        print("WIKIPEDIA FIRST (previous order)")
+        print("=" * 60)
+        print_rows(run(server, wikipedia_first_pipeline(), args.repeat))
+
+        print("\n" + "=" * 60)
+        print("COST-ORDERED PIPELINE")
+        print("=" * 60)
+        rows = run(server, pipeline, args.repeat)
+        print_rows(rows)
+
+    print("\n" + "=" * 60)
+    print("HANDLER STATISTICS")
+    print("=" * 60)
+    for name, stats in pipeline.get_stats().items():
+        print(f"  {name:15s} {stats['cost']:9s} calls={stats['calls']:3d} hit_rate={stats['hit_rate']:.2f} "
+              f"skips={stats['skips']:3d} avg={stats['avg_latency_ms']:.2f} ms")
+
+    failures = []
+    for message, local, intent, requests, _ in rows:
+        if local is True and requests:
+            failures.append(f"'{message}' reached the network")
+        if local is False and intent != "wikipedia_search":
+            failures.append(f"'{message}' was answered by {intent} instead of Wikipedia")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Local questions stay local, encyclopedia questions still reach Wikipedia")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
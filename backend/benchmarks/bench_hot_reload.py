@@ -0,0 +1,138 @@
+"""
+Hot model reload under load
+Run from the backend directory: python benchmarks/bench_hot_reload.py
+Serves chat traffic from several threads while new bundle versions are
+written and picked up by the file watcher, plus one broken bundle that
+must be rejected. Exits with status 1 if a request fails, a good version
+is not swapped in, or the broken one is.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Work on a copy: the benchmark rewrites the bundle
+WORK_DIR = Path(tempfile.mkdtemp(prefix="bench_hot_reload_"))
+shutil.copy(BACKEND_DIR / "models" / "chatbot.bundle", WORK_DIR / "chatbot.bundle")
+os.environ["BUNDLE_PATH"] = str(WORK_DIR / "chatbot.bundle")
+# Local-only traffic: nothing may wait on the network
+os.environ["WIKIPEDIA_BACKEND"] = "local"
+os.environ["WIKI_CACHE_PATH"] = ""
+
+import model
+from bundle import BUNDLE_PATH, build_bundle
+from compiled_model import CompiledClassifier
+
+MESSAGES = ["hello", "what is the time", "what is your name", "thanks", "goodbye", "how are you",
+            "quels sont vos horaires", "merci beaucoup", "bonjour", "12 * 7"]
+
+
+def client(stop, latencies, errors, versions):
+    i = 0
+    while not stop.is_set():
+        message = MESSAGES[i % len(MESSAGES)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response, intent, _ = model.chatbot_enhanced(message, {})
+            if not response or response == "Erreur de traitement":
+                errors.append(message)
+        except Exception as e:
+            errors.append(f"{message}: {e}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        versions.add(model.served_model.version)
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--reloads", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between file checks")
+    args = parser.parse_args()
+
+    model.warm_up()
+    classifier = CompiledClassifier.from_arrays(model.served_model.bundle.classifier_arrays())
+    arrays = classifier.to_arrays()
+    arrays["coef"] = arrays["coef"][::-1].copy()
+    broken = CompiledClassifier.from_arrays(arrays)
+
+    stop, watcher_stop = threading.Event(), threading.Event()
+    latencies, errors, versions = [], [], set()
+    watcher = threading.Thread(target=model.watch_model_files, args=(args.interval, watcher_stop), daemon=True)
+    watcher.start()
+    clients = [threading.Thread(target=client, args=(stop, latencies, errors, versions), daemon=True)
+               for _ in range(args.threads)]
+    for thread in clients:
+        thread.start()
+
+    failures = []
+    reload_seconds = []
+    try:
+        time.sleep(0.5)
+        for n in range(args.reloads):
+            version = f"bench-{n}"
+            started = time.perf_counter()
+            build_bundle(classifier, BUNDLE_PATH, version=version, model_path=model.MODEL_PATH)
+            if wait_for(lambda: model.served_model.version == version, timeout=10 + 5 * args.interval):
+                reload_seconds.append(time.perf_counter() - started)
+            else:
+                failures.append(f"version {version} was not swapped in")
+
+        good_version = model.served_model.version
+        build_bundle(broken, BUNDLE_PATH, version="bench-broken", model_path=model.MODEL_PATH)
+        wait_for(lambda: (model.last_reload or {}).get("rejected_version") == "bench-broken", timeout=10)
+        if model.served_model.version != good_version:
+            failures.append("the broken bundle was swapped in")
+        time.sleep(0.5)
+    finally:
+        stop.set()
+        watcher_stop.set()
+        for thread in clients:
+            thread.join()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print("=" * 60)
+    print("HOT RELOAD UNDER LOAD")
+    print("=" * 60)
+    latencies.sort()
+    print(f"  requests: {len(latencies)} from {args.threads} threads, errors: {len(errors)}")
+    print(f"  latency p50 {statistics.median(latencies):.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms, max {latencies[-1]:.2f} ms")
+    if reload_seconds:
+        print(f"  write-to-served: median {statistics.median(reload_seconds) * 1000:.0f} ms "
+              f"(watcher interval {args.interval * 1000:.0f} ms)")
+    print(f"  versions served: {', '.join(sorted(versions))}")
+    print(f"  last reload: {model.last_reload}")
+
+    if errors:
+        failures.append(f"{len(errors)} requests failed, e.g. {errors[0]}")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Every version swapped in without failed requests, the broken one rejected")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,126 @@
+"""
+Import time of the backend, with a regression gate
+Run from the backend directory: python benchmarks/bench_import_time.py
+Exits with status 1 if importing the app is slower than the recorded baseline
+(plus tolerance) or than the budget, or if it imports a deferred dependency.
+Record a new baseline with --update-baseline.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "import_time_baseline.json"
+
+# Must stay off the import path (loaded by warm_up() or only for training)
+DEFERRED_MODULES = ["sklearn", "scipy", "nltk"]
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(m for m in {deferred!r} if m in sys.modules)}}))
+"""
+
+
+def measure(module, runs):
+    """Wall-clock import time of ``module`` in fresh interpreters, plus deferred modules it loaded."""
+    env = dict(os.environ, BACKGROUND_WARM_UP="false", LOG_LEVEL="WARNING")
+    timings, loaded = [], set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(report["seconds"])
+        loaded.update(report["modules"])
+    return statistics.median(timings), sorted(loaded)
+
+
+def importtime_report(module, top):
+    """Slowest imports by cumulative time, as reported by python -X importtime."""
+    env = dict(os.environ, BACKGROUND_WARM_UP="false", LOG_LEVEL="WARNING")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=1.0, help="Hard limit in seconds for importing app")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown over the baseline")
+    parser.add_argument("--slack", type=float, default=0.05, help="Seconds added to every limit to absorb noise")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("IMPORT TIME (median of fresh interpreters)")
+    print("=" * 60)
+    results = {}
+    for module in ("data", "handle_functions", "model", "app"):
+        seconds, loaded = measure(module, args.runs)
+        results[module] = {"seconds": round(seconds, 4), "deferred_modules_loaded": loaded}
+        note = f"  loads {', '.join(loaded)}" if loaded else ""
+        print(f"  import {module:17s} {seconds * 1000:8.1f} ms{note}")
+
+    print("\n" + "=" * 60)
+    print(f"SLOWEST IMPORTS OF app (python -X importtime, top {args.top})")
+    print("=" * 60)
+    print(f"  {'cumulative':>10s} {'self':>8s}  module")
+    for cumulative_us, self_us, name in importtime_report("app", args.top):
+        print(f"  {cumulative_us / 1000:8.1f}ms {self_us / 1000:6.1f}ms {name}")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({module: result["seconds"] for module, result in results.items()}, f, indent=2)
+        print(f"\n✓ Baseline written to {BASELINE_PATH}")
+        return True
+
+    failures = []
+    for module, result in results.items():
+        if result["deferred_modules_loaded"]:
+            failures.append(f"import {module} loads {', '.join(result['deferred_modules_loaded'])}")
+
+    if results["app"]["seconds"] > args.budget:
+        failures.append(f"import app takes {results['app']['seconds']:.3f}s, budget is {args.budget:.3f}s")
+
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        for module, seconds in baseline.items():
+            limit = seconds * args.tolerance + args.slack
+            if module in results and results[module]["seconds"] > limit:
+                failures.append(f"import {module} takes {results[module]['seconds']:.3f}s, "
+                                f"baseline {seconds:.3f}s (limit {limit:.3f}s)")
+    else:
+        print(f"\nNo baseline at {BASELINE_PATH}; run with --update-baseline to record one")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Import time within budget and baseline")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,161 @@
+"""
+Online (incremental) intent model against the batch model
+Run from the backend directory: python benchmarks/bench_online_model.py [--output report.json]
+On the same stratified split of intents.json, compares the accuracy of the
+batch model (train_model), the online model refit from scratch and the online
+model built incrementally (half the patterns, then the rest folded in by
+partial_fit), times the updates, and learns each intent as a new one.
+Exits with status 1 if the online model is less accurate than the batch model
+by more than --tolerance or its median update exceeds --max-update-ms.
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from data import load_intents
+from preprocessing import preprocessor
+from online_model import OnlineIntentClassifier
+
+
+def accuracy(predicted, expected):
+    return float(np.mean(np.asarray(predicted) == np.asarray(expected)))
+
+
+def batch_accuracy(X_train, y_train, X_test, y_test):
+    from model import train_model
+
+    started = time.perf_counter()
+    vectorizer, model = train_model(X_train, y_train)
+    fit_ms = (time.perf_counter() - started) * 1000
+    return accuracy(model.predict(vectorizer.transform(preprocessor.transform(X_test))), y_test), fit_ms
+
+
+def incremental_run(X_train, y_train, X_test, y_test, chunk):
+    """Fit on the first half of the training patterns, fold the rest in by chunks."""
+    half = len(X_train) // 2
+    online = OnlineIntentClassifier().fit(X_train[:half], y_train[:half])
+    update_ms = []
+    for start in range(half, len(X_train), chunk):
+        started = time.perf_counter()
+        online.partial_fit(X_train[start:start + chunk], y_train[start:start + chunk])
+        update_ms.append((time.perf_counter() - started) * 1000)
+    return accuracy(online.predict(X_test), y_test), update_ms
+
+
+def new_intent_runs(X_train, y_train, X_test, y_test):
+    """Leave out each intent in turn, then learn its patterns as a new intent."""
+    results = []
+    for intent in sorted(set(y_train)):
+        kept = [i for i, label in enumerate(y_train) if label != intent]
+        added = [i for i, label in enumerate(y_train) if label == intent]
+        held_out = [i for i, label in enumerate(y_test) if label == intent]
+        if not held_out:
+            continue
+
+        online = OnlineIntentClassifier().fit([X_train[i] for i in kept], [y_train[i] for i in kept])
+        started = time.perf_counter()
+        online.partial_fit([X_train[i] for i in added], [y_train[i] for i in added])
+        update_ms = (time.perf_counter() - started) * 1000
+
+        results.append({
+            "intent": intent,
+            "patterns_added": len(added),
+            "update_ms": round(update_ms, 2),
+            "recall": accuracy(online.predict([X_test[i] for i in held_out]), [intent] * len(held_out)),
+            "accuracy": accuracy(online.predict(X_test), y_test),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk", type=int, default=10, help="Patterns per incremental update")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Accuracy the online model may lose against the batch model")
+    parser.add_argument("--max-update-ms", type=float, default=50.0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    from sklearn.model_selection import train_test_split
+
+    texts, labels, _, _, _ = load_intents()
+    X_train, X_test, y_train, y_test = train_test_split(
+        texts, labels, test_size=args.test_size, random_state=args.seed, stratify=labels)
+
+    batch, batch_fit_ms = batch_accuracy(X_train, y_train, X_test, y_test)
+
+    # The online model takes normalized texts, like the served one
+    X_train, X_test = preprocessor.transform(X_train), preprocessor.transform(X_test)
+
+    started = time.perf_counter()
+    refit = OnlineIntentClassifier().fit(X_train, y_train)
+    refit_ms = (time.perf_counter() - started) * 1000
+    refit_accuracy = accuracy(refit.predict(X_test), y_test)
+
+    incremental, update_ms = incremental_run(X_train, y_train, X_test, y_test, args.chunk)
+    new_intents = new_intent_runs(X_train, y_train, X_test, y_test)
+
+    report = {
+        "patterns": {"train": len(X_train), "test": len(X_test)},
+        "batch": {"accuracy": batch, "fit_ms": round(batch_fit_ms, 1)},
+        "online_refit": {"accuracy": refit_accuracy, "fit_ms": round(refit_ms, 1)},
+        "online_incremental": {
+            "accuracy": incremental,
+            "updates": len(update_ms),
+            "update_ms_median": round(statistics.median(update_ms), 2),
+            "update_ms_max": round(max(update_ms), 2),
+        },
+        "new_intent": {
+            "recall_mean": statistics.mean(r["recall"] for r in new_intents),
+            "accuracy_mean": statistics.mean(r["accuracy"] for r in new_intents),
+            "update_ms_median": round(statistics.median(r["update_ms"] for r in new_intents), 2),
+            "intents": new_intents,
+        },
+    }
+
+    print("=" * 60)
+    print(f"ONLINE VS BATCH MODEL ({len(X_train)} training, {len(X_test)} test patterns)")
+    print("=" * 60)
+    print(f"  batch (tf-idf + logistic regression): {batch:.2%}, fit {batch_fit_ms:.0f} ms")
+    print(f"  online, full refit:                   {refit_accuracy:.2%}, fit {refit_ms:.0f} ms")
+    print(f"  online, incremental:                  {incremental:.2%}, {len(update_ms)} updates of "
+          f"{args.chunk} patterns, median {statistics.median(update_ms):.1f} ms, max {max(update_ms):.1f} ms")
+    print(f"  new intent learned by partial_fit:    recall {report['new_intent']['recall_mean']:.2%}, "
+          f"accuracy {report['new_intent']['accuracy_mean']:.2%}, "
+          f"median update {report['new_intent']['update_ms_median']:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"  report written to {args.output}")
+
+    failures = []
+    for name, value in (("full refit", refit_accuracy), ("incremental", incremental)):
+        if value < batch - args.tolerance:
+            failures.append(f"online {name} accuracy {value:.2%} is more than "
+                            f"{args.tolerance:.0%} below the batch model's {batch:.2%}")
+    if statistics.median(update_ms) > args.max_update_ms:
+        failures.append(f"median update {statistics.median(update_ms):.1f} ms above {args.max_update_ms:.0f} ms")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Online model within tolerance of the batch model")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,112 @@
+"""
+Cost of text preprocessing against the former training and inference functions
+Run from the backend directory: python benchmarks/bench_preprocessing.py
+Train/serve feature parity is tested in tests/test_preprocessing.py
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from preprocessing import Preprocessor
+from data import questions
+
+
+def legacy_functions():
+    """The former model.preprocess (training) and model.nettoyer (inference)."""
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+    from nltk.tokenize import word_tokenize
+
+    try:
+        stop_words = set(stopwords.words("french")) | set(stopwords.words("english"))
+    except LookupError:
+        stop_words = set()
+    lemmatizer = WordNetLemmatizer()
+
+    def preprocess(text):
+        try:
+            text = text.lower()
+            text = re.sub(r"[^\w\s]", "", text)
+            words = text.split()
+            if len(words) <= 3:
+                words = [lemmatizer.lemmatize(w) for w in words]
+            else:
+                words = [lemmatizer.lemmatize(w) for w in words if w not in stop_words]
+            return " ".join(words)
+        except LookupError:
+            return None
+
+    def nettoyer(text, preserve_line=False):
+        try:
+            text = text.lower()
+            text = re.sub(r"[^\w\s]", "", text)
+            return " ".join(word_tokenize(text, preserve_line=preserve_line))
+        except LookupError:
+            return None
+
+    return preprocess, nettoyer
+
+
+def sample_messages(count, seed=7):
+    rng = random.Random(seed)
+    messages = list(questions)
+    while len(messages) < count:
+        first, second = rng.choice(questions), rng.choice(questions)
+        messages.append(f"{first}, {second.upper()}!" if rng.random() < 0.5 else first + "?")
+    return messages
+
+
+def time_per_message(fn, messages, repeat):
+    """Median per-message cost in microseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            fn(message)
+        timings.append((time.perf_counter() - started) / len(messages) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    messages = sample_messages(args.samples)
+    legacy_preprocess, legacy_nettoyer = legacy_functions()
+
+    print("=" * 60)
+    print("PREPROCESSING COST (median of runs, per message)")
+    print("=" * 60)
+    if legacy_nettoyer(messages[0]) is None:
+        # Without Punkt only the Treebank word tokenizer can be timed: a lower bound
+        cost = time_per_message(lambda m: legacy_nettoyer(m, preserve_line=True), messages, args.repeat)
+        print(f"  legacy nettoyer (no Punkt, lower bound): {cost:8.1f} µs")
+    else:
+        print(f"  legacy nettoyer (Punkt):  {time_per_message(legacy_nettoyer, messages, args.repeat):8.1f} µs")
+    if legacy_preprocess(messages[0]) is None:
+        print("  legacy preprocess:        WordNet not installed, skipped")
+    else:
+        print(f"  legacy preprocess:        {time_per_message(legacy_preprocess, messages, args.repeat):8.1f} µs")
+
+    cold = Preprocessor()
+    cold("warm up resources")
+    started = time.perf_counter()
+    for message in messages:
+        cold(message)
+    print(f"  Preprocessor, cold cache: {(time.perf_counter() - started) / len(messages) * 1e6:8.1f} µs")
+    print(f"  Preprocessor, warm cache: {time_per_message(cold, messages, args.repeat):8.1f} µs")
+    print(f"  lemma cache: {cold.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
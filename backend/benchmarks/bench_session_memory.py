@@ -0,0 +1,164 @@
+"""
+Session store memory under a session-creating spike, and incremental expiry
+Run from the backend directory: python benchmarks/bench_session_memory.py [--spike 300000] [--max-sessions 50000]
+                                or python benchmarks/bench_session_memory.py --report [--exchanges 2]
+
+Spike: --spike new session ids, each with two history entries, as a burst
+of clients (or a scanner) without session ids would create them. Traced
+memory is sampled along the way, once with --max-sessions / --max-mb caps
+and once uncapped: capped, it must level off at the cap.
+
+Expiry: sessions with a --timeout-ms timeout are created at a steady pace;
+new sessions reclaim the expired ones as they arrive, so the store holds
+about rate x timeout sessions without any sweep, and a cleanup with nothing
+expired costs microseconds instead of a scan.
+
+Report: traced bytes per session in an uncapped store of 100k and 1M
+sessions holding --exchanges exchanges each (--output writes them as JSON).
+"""
+
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from session_manager import SessionManager
+
+
+def fill(manager, count, prefix, samples=6):
+    """Create ``count`` sessions with two exchanges each; returns [(sessions created, traced MB)]."""
+    points = []
+    step = max(1, count // samples)
+    for i in range(count):
+        session_id = f"{prefix}-{i}"
+        manager.get_session(session_id)
+        manager.add_to_history(session_id, "hello", "Bonjour ! Comment puis-je vous aider ?", "greeting")
+        manager.add_to_history(session_id, "what are your hours", "Nous sommes ouverts de 9h à 18h.", "hours")
+        if (i + 1) % step == 0:
+            points.append((i + 1, tracemalloc.get_traced_memory()[0] / 1024 ** 2))
+    return points
+
+
+def spike(args, max_sessions, max_bytes):
+    gc.collect()
+    tracemalloc.start()
+    manager = SessionManager(session_timeout_minutes=30, max_sessions=max_sessions, max_bytes=max_bytes)
+    points = fill(manager, args.spike, "spike")
+    stats = manager.get_stats()
+    tracemalloc.stop()
+    return points, stats
+
+
+def expiry(args):
+    timeout = args.timeout_ms / 1000
+    manager = SessionManager(session_timeout_minutes=timeout / 60, max_sessions=0, max_bytes=0)
+
+    created = 0
+    peak = 0
+    deadline = time.monotonic() + args.expiry_seconds
+    while time.monotonic() < deadline:
+        for _ in range(args.rate // 100):
+            manager.get_session(f"expiry-{created}")
+            created += 1
+        peak = max(peak, len(manager))
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    manager.cleanup_expired_sessions()
+    cleanup_ms = (time.perf_counter() - started) * 1000
+    return created, peak, manager.get_stats(), cleanup_ms
+
+
+def report(args):
+    """Traced bytes per session at each size, for sessions holding ``args.exchanges`` exchanges."""
+    results = {}
+    for label, size in (("100k", 100_000), ("1M", 1_000_000)):
+        gc.collect()
+        tracemalloc.start()
+        manager = SessionManager(session_timeout_minutes=30, max_sessions=0, max_bytes=0)
+        for i in range(size):
+            session_id = f"report-{i:08d}"
+            manager.get_session(session_id)
+            for turn in range(args.exchanges):
+                manager.add_to_history(session_id, f"question {turn} of {i}", "Nous sommes ouverts de 9h à 18h.",
+                                       "hours")
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        results[label] = round(traced / size, 1)
+        print(f"  {label:>5s} sessions: {traced / 1024 ** 2:8.1f} MB traced, {traced / size:7.1f} bytes per session")
+        del manager
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--spike", type=int, default=300_000, help="Sessions created by the spike")
+    parser.add_argument("--max-sessions", type=int, default=50_000)
+    parser.add_argument("--max-mb", type=float, default=0, help="Memory cap of the capped run (0: none)")
+    parser.add_argument("--timeout-ms", type=float, default=200, help="Session timeout of the expiry run")
+    parser.add_argument("--rate", type=int, default=20_000, help="New sessions per second in the expiry run")
+    parser.add_argument("--expiry-seconds", type=float, default=2.0)
+    parser.add_argument("--report", action="store_true", help="Only report bytes per session at 100k and 1M")
+    parser.add_argument("--exchanges", type=int, default=2, help="History entries per session in the report")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.report:
+        print("=" * 60)
+        print(f"BYTES PER SESSION ({args.exchanges} exchanges each)")
+        print("=" * 60)
+        results = report(args)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"exchanges": args.exchanges, "bytes_per_session": results}, f, indent=2)
+            print(f"\n  results written to {args.output}")
+        return True
+
+    print("=" * 60)
+    print(f"SESSION STORE UNDER A {args.spike:,}-SESSION SPIKE")
+    print("=" * 60)
+
+    max_bytes = int(args.max_mb * 1024 * 1024)
+    capped, capped_stats = spike(args, args.max_sessions, max_bytes)
+    uncapped, uncapped_stats = spike(args, 0, 0)
+
+    print(f"  {'created':>10s} {'capped MB':>10s} {'uncapped MB':>12s}")
+    for (created, capped_mb), (_, uncapped_mb) in zip(capped, uncapped):
+        print(f"  {created:10,d} {capped_mb:10.1f} {uncapped_mb:12.1f}")
+    print(f"  capped: {capped_stats['total_sessions']:,} sessions kept, {capped_stats['evicted_sessions']:,} evicted, "
+          f"~{capped_stats['memory_bytes'] / 1024 ** 2:.1f} MB estimated")
+
+    print(f"\n  expiry: {args.rate:,} new sessions/s with a {args.timeout_ms:.0f} ms timeout")
+    created, peak, expiry_stats, cleanup_ms = expiry(args)
+    print(f"  created {created:,}, at most {peak:,} held, {expiry_stats['expired_sessions']:,} reclaimed "
+          f"as sessions arrived; cleanup afterwards {cleanup_ms:.2f} ms")
+
+    # Past the cap, memory must stop growing: the last samples stay within 10%
+    level = [mb for created, mb in capped if created > args.max_sessions * 2]
+    if level and max(level) > min(level) * 1.1:
+        print("\n✗ Memory kept growing past the session cap")
+        return False
+
+    if capped_stats["total_sessions"] > args.max_sessions:
+        print(f"\n✗ {capped_stats['total_sessions']:,} sessions kept, cap is {args.max_sessions:,}")
+        return False
+
+    expected = args.rate * args.timeout_ms / 1000
+    if peak > expected * 3:
+        print(f"\n✗ {peak:,} sessions held, expiry should keep about {expected:,.0f}")
+        return False
+
+    print("\n✓ Memory levels off at the cap and expired sessions are reclaimed without a sweep")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,100 @@
+"""
+Time to first answer: /chat against /chat/stream
+Run from the backend directory: python benchmarks/bench_stream.py [--messages 30] [--wiki-delay-ms 300]
+
+Posts messages that mix a local intent with a Wikipedia question
+("bonjour, qui est Victor Hugo N", a new query each time so every lookup
+misses the cache) through the Flask test client against a stand-in
+Wikipedia (fake_wikipedia.py). /chat answers once the slowest fragment is
+done; /chat/stream sends the greeting as soon as it is answered, so its
+first event should arrive in a fraction of the Wikipedia latency.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ["WIKI_CACHE_PATH"] = ""
+os.environ["WIKIPEDIA_BACKEND"] = "network"
+os.environ["START_BACKGROUND_TASKS"] = "false"
+os.environ["MODEL_WATCH_INTERVAL"] = "0"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+from fake_wikipedia import FakeWikipediaServer
+from wikipedia_client import wikipedia_client
+from app import app
+
+
+def time_chat(client, message):
+    started = time.perf_counter()
+    response = client.post("/chat", json={"message": message})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def time_stream(client, message):
+    """(ms to the first event, ms to the 'done' event, event names)"""
+    started = time.perf_counter()
+    response = client.post("/chat/stream", json={"message": message}, buffered=False)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    first = None
+    events = []
+    for chunk in response.response:
+        if first is None:
+            first = (time.perf_counter() - started) * 1000
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        events += [line[len("event: "):] for line in text.splitlines() if line.startswith("event: ")]
+    response.close()
+    return first, (time.perf_counter() - started) * 1000, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--wiki-delay-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"/chat vs /chat/stream ({args.messages} messages, Wikipedia {args.wiki_delay_ms:.0f} ms)")
+    print("=" * 60)
+
+    with FakeWikipediaServer(delay_ms=args.wiki_delay_ms) as wikipedia:
+        wikipedia_client.api_url = wikipedia.api_url
+        client = app.test_client()
+
+        # First lookup pays the imports and connection setup
+        time_chat(client, "bonjour, qui est Victor Hugo")
+
+        chat = [time_chat(client, f"bonjour, qui est Victor Hugo {i}") for i in range(args.messages)]
+        streams = [time_stream(client, f"bonjour, qui est Victor Hugo {i + args.messages}")
+                   for i in range(args.messages)]
+
+    first = [s[0] for s in streams]
+    done = [s[1] for s in streams]
+    print(f"  /chat         response     median {statistics.median(chat):8.1f} ms")
+    print(f"  /chat/stream  first event  median {statistics.median(first):8.1f} ms")
+    print(f"  /chat/stream  done event   median {statistics.median(done):8.1f} ms")
+
+    malformed = [events for _, _, events in streams if events != ["fragment", "fragment", "done"]]
+    if malformed:
+        print(f"\n✗ Unexpected event sequence: {malformed[0]}")
+        return False
+
+    if statistics.median(first) >= statistics.median(chat) / 2:
+        print("\n✗ The first event is not ahead of the full /chat answer")
+        return False
+
+    print(f"\n✓ First answer {statistics.median(chat) / statistics.median(first):.0f}x sooner when streamed")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,222 @@
+"""
+Microbenchmarks of the chat pipeline, with a regression gate
+Run from the backend directory: python benchmarks/bench_suite.py [--output results.json]
+Times preprocessing, rules, the classifier paths, the calculator, the
+SessionManager at 10k to 1M sessions and the Flask /chat route (test client).
+Wikipedia is stubbed in-process, so nothing waits on the network; messages
+repeat, so the preprocessing and classification caches are warm, as in a
+running server. Exits with status 1 if a case is slower than the recorded
+baseline by more than the tolerance. Record a new baseline with --update-baseline.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import itertools
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "bench_suite_baseline.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Served from the stub below, without the persistent cache or the local index
+os.environ["WIKI_CACHE_PATH"] = ""
+os.environ["WIKIPEDIA_BACKEND"] = "network"
+os.environ["START_BACKGROUND_TASKS"] = "false"
+os.environ["MODEL_WATCH_INTERVAL"] = "0"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+import model
+from app import app
+from session_manager import SessionManager
+from wikipedia_client import wikipedia_client
+
+# Request logging would dominate the timings; production runs at LOG_LEVEL=WARNING
+logging.getLogger().setLevel(logging.WARNING)
+
+MESSAGES = ["hello", "what is the time", "what is your name", "thanks a lot", "goodbye",
+            "quels sont vos horaires", "je cherche un stage en informatique", "12 * 7",
+            "who is victor hugo", "bonjour, comment tu t'appelles ? et quelle heure est-il"]
+EXPRESSIONS = ["12*7", "3.5 + 4", "-8 / 2", "100-1", "7 / 0", "2 ^ 3"]
+
+SESSION_SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+
+def stub_lookup_many(query, languages, timeout=None):
+    """Answers every Wikipedia lookup at once, like a cached article."""
+    return {lang: {"title": query.title(), "summary": f"{query} is a stubbed article.",
+                   "url": f"https://{lang}.wikipedia.org/wiki/{query.replace(' ', '_')}"}
+            for lang in languages}
+
+
+def cycle(values):
+    return itertools.cycle(values).__next__
+
+
+def pipeline_cases():
+    next_message = cycle(MESSAGES)
+    next_expression = cycle(EXPRESSIONS)
+    session = SessionManager().get_session("bench")
+
+    return [
+        ("preprocess", lambda: model.preprocess(next_message())),
+        ("nettoyer", lambda: model.nettoyer(next_message())),
+        ("rule_based_intent", lambda: model.rule_based_intent(next_message())),
+        ("calc", lambda: model.calc(next_expression())),
+        ("chatbot_with_fallback", lambda: model.chatbot_with_fallback(next_message(), session)),
+        ("chatbot_enhanced", lambda: model.chatbot_enhanced(next_message(), session)),
+    ]
+
+
+def session_cases(label, size):
+    # Uncapped, so the store really holds ``size`` sessions
+    manager = SessionManager(session_timeout_minutes=30, max_sessions=0, max_bytes=0)
+    ids = [f"bench-{i}" for i in range(size)]
+    for session_id in ids:
+        manager.get_session(session_id)
+
+    rng = random.Random(42)
+    next_id = cycle([ids[rng.randrange(size)] for _ in range(4096)])
+
+    return [
+        (f"session.get_session[{label}]", lambda: manager.get_session(next_id())),
+        (f"session.add_to_history[{label}]",
+         lambda: manager.add_to_history(next_id(), "hello", "Bonjour !", "greeting")),
+        (f"session.get_stats[{label}]", manager.get_stats),
+    ]
+
+
+def flask_cases():
+    client = app.test_client()
+    session_id = client.post("/chat", json={"message": "hello"}).get_json()["session_id"]
+    next_message = cycle(MESSAGES)
+
+    def chat():
+        response = client.post("/chat", json={"message": next_message(), "session_id": session_id})
+        if response.status_code != 200:
+            raise RuntimeError(f"/chat returned {response.status_code}")
+
+    return [("flask./chat", chat)]
+
+
+def measure(fn, rounds, round_time):
+    """
+    Seconds per call: the number of calls per round is raised until a round
+    lasts ``round_time``, then the median and best of ``rounds`` rounds are kept.
+    """
+    def timed(number):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - started
+
+    fn()
+    number = 1
+    while True:
+        elapsed = timed(number)
+        if elapsed >= round_time or number >= 1_000_000:
+            break
+        number = min(number * 10, 1_000_000) if elapsed < round_time / 10 else number * 2
+
+    per_call = [timed(number) / number for _ in range(rounds)]
+    return {
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "calls": number * rounds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--round-time", type=float, default=0.1, help="Minimum seconds per round")
+    parser.add_argument("--sessions", nargs="+", choices=list(SESSION_SIZES), default=list(SESSION_SIZES),
+                        help="SessionManager sizes to benchmark")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="Allowed slowdown over the baseline")
+    parser.add_argument("--slack", type=float, default=5.0, help="Microseconds added to every limit to absorb noise")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    wikipedia_client.lookup_many = stub_lookup_many
+    model.warm_up()
+
+    groups = [pipeline_cases, flask_cases] + [
+        (lambda label=label: session_cases(label, SESSION_SIZES[label])) for label in args.sessions
+    ]
+
+    print("=" * 60)
+    print("CHAT PIPELINE MICROBENCHMARKS (per call)")
+    print("=" * 60)
+    print(f"  {'case':34s} {'median':>12s} {'best':>12s} {'calls':>9s}")
+    results = {}
+    for build in groups:
+        cases = build()
+        for name, fn in cases:
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(fn, args.rounds, args.round_time)
+            print(f"  {name:34s} {results[name]['median_us']:10.1f}µs {results[name]['min_us']:10.1f}µs "
+                  f"{results[name]['calls']:9d}")
+        # Large session tables are not kept alive across groups
+        del cases
+        gc.collect()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "timestamp": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+        print(f"\n  results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = {}
+        if BASELINE_PATH.exists():
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        baseline.update({name: result["median_us"] for name, result in results.items()})
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+        print(f"\n✓ Baseline written to {BASELINE_PATH}")
+        return True
+
+    if not BASELINE_PATH.exists():
+        print(f"\nNo baseline at {BASELINE_PATH}; run with --update-baseline to record one")
+        return True
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  (no baseline for {name})")
+            continue
+        limit = baseline[name] * args.tolerance + args.slack
+        if result["median_us"] > limit:
+            failures.append(f"{name} takes {result['median_us']:.1f}µs, baseline {baseline[name]:.1f}µs "
+                            f"(limit {limit:.1f}µs)")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Every case within tolerance of the baseline")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,177 @@
+"""
+Memory of gunicorn workers (PSS/USS) with and without preload-and-fork
+Run from the backend directory: python benchmarks/bench_worker_memory.py
+Starts gunicorn.conf.py with 1, 4 and 16 workers, sends local-only chat
+traffic to every worker and reads /proc/<pid>/smaps_rollup (Linux only).
+Exits with status 1 if preloading does not lower the private memory of a worker.
+
+USS is memory only that process uses (private pages); PSS adds its share of
+pages shared with other processes, so summing PSS gives the real total.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Answered without the network
+MESSAGES = ["hello", "what is the time", "12 * 7", "what is your name", "thanks", "goodbye"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    """Pids whose parent is ``pid``."""
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, the fields after it do not
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            found.append(int(entry))
+    return found
+
+
+def memory_kb(pid):
+    """Rss, Pss and Uss of a process in kB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def post_chat(url, message):
+    request = urllib.request.Request(url + "/chat", data=json.dumps({"message": message}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status
+
+
+def wait_ready(url, server, workers, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/ping", timeout=2):
+                pass
+            if len(children(server.pid)) >= workers:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"gunicorn not ready after {timeout}s")
+
+
+def measure(workers, preload, requests_per_worker, settle, timeout):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, GUNICORN_PRELOAD=str(preload).lower(), LOG_LEVEL="WARNING",
+               GUNICORN_ACCESS_LOG="", WIKI_CACHE_PATH="", WIKIPEDIA_BACKEND="local")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+         "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url, server, workers, timeout)
+
+        # Enough concurrent traffic for every worker to serve requests
+        total = requests_per_worker * workers
+        with ThreadPoolExecutor(max_workers=min(4 * workers, 64)) as pool:
+            statuses = list(pool.map(lambda i: post_chat(url, MESSAGES[i % len(MESSAGES)]), range(total)))
+        if any(status != 200 for status in statuses):
+            raise RuntimeError("chat requests failed")
+        time.sleep(settle)
+
+        worker_memory = [memory_kb(pid) for pid in children(server.pid)]
+        if len(worker_memory) != workers:
+            raise RuntimeError(f"expected {workers} workers, found {len(worker_memory)}")
+        master = memory_kb(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return {
+        "workers": workers,
+        "preload": preload,
+        "worker_uss_mb": statistics.mean(m["uss"] for m in worker_memory) / 1024,
+        "worker_pss_mb": statistics.mean(m["pss"] for m in worker_memory) / 1024,
+        "worker_rss_mb": statistics.mean(m["rss"] for m in worker_memory) / 1024,
+        "total_pss_mb": (master["pss"] + sum(m["pss"] for m in worker_memory)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-worker", type=int, default=25)
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait for warm-up before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--preload-only", action="store_true", help="Skip the run without preload")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("✗ /proc/<pid>/smaps_rollup is not available (Linux 4.14+ only)")
+        return False
+
+    modes = [True] if args.preload_only else [False, True]
+    results = [measure(n, preload, args.requests_per_worker, args.settle, args.timeout)
+               for n in args.workers for preload in modes]
+
+    print("=" * 60)
+    print("WORKER MEMORY (MB, mean per worker; total = master + workers PSS)")
+    print("=" * 60)
+    print(f"  {'workers':>7s} {'preload':>8s} {'USS':>8s} {'PSS':>8s} {'RSS':>8s} {'total PSS':>10s}")
+    for r in results:
+        print(f"  {r['workers']:7d} {str(r['preload']):>8s} {r['worker_uss_mb']:8.1f} {r['worker_pss_mb']:8.1f} "
+              f"{r['worker_rss_mb']:8.1f} {r['total_pss_mb']:10.1f}")
+
+    failures = []
+    if not args.preload_only:
+        for n in args.workers:
+            forked, separate = (next(r for r in results if r["workers"] == n and r["preload"] is mode)
+                                for mode in (True, False))
+            if forked["worker_uss_mb"] >= separate["worker_uss_mb"]:
+                failures.append(f"{n} workers: preload USS {forked['worker_uss_mb']:.1f} MB is not below "
+                                f"{separate['worker_uss_mb']:.1f} MB")
+
+    if failures:
+        print("\n✗ " + "\n✗ ".join(failures))
+        return False
+
+    print("\n✓ Workers share the preloaded app")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the MediaWiki API used by wikipedia_client
+Serves /<lang>/w/api.php with a small in-memory article set and an optional artificial delay
+
+Run from the backend directory:
+    python benchmarks/fake_wikipedia.py --port 8765 --delay-ms 150
+then start the backend with:
+    WIKIPEDIA_API_URL=http://127.0.0.1:8765/{lang}/w/api.php
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_ARTICLES = {
+    "en": {
+        "Python (programming language)": "Python is a high-level, general-purpose programming language. "
+                                         "Its design philosophy emphasizes code readability. "
+                                         "Python is dynamically typed and garbage-collected.",
+        "Victor Hugo": "Victor-Marie Hugo was a French Romantic writer and politician. "
+                       "He is considered to be one of the greatest French writers. "
+                       "His best-known works include Les Misérables.",
+        "Paris": "Paris is the capital and largest city of France. "
+                 "It is located on the Seine river. "
+                 "Paris is a major centre of finance, diplomacy, commerce and culture.",
+        "Mercury": None,  # disambiguation page
+        "Mercury (planet)": "Mercury is the first planet from the Sun and the smallest in the Solar System. "
+                            "It is a rocky planet with a trace atmosphere. "
+                            "Its orbit takes 88 Earth days.",
+    },
+    "fr": {
+        "Victor Hugo": "Victor Hugo est un poète, dramaturge, écrivain et homme politique français. "
+                       "Il est considéré comme l'un des plus importants écrivains de langue française. "
+                       "Il est aussi une personnalité politique engagée.",
+        "Baguette": "La baguette est une variété de pain, reconnaissable à sa forme allongée. "
+                    "Elle est emblématique de la France. "
+                    "Sa croûte est croustillante.",
+    },
+}
+
+
+def build_handler(articles, delay, stats):
+
+    class MediaWikiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (timeout), which is what some benchmarks exercise
+                pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            with stats["lock"]:
+                stats["requests"] += 1
+                stats["queries"].append((url.path, params))
+
+            if len(parts) != 3 or parts[1:] != ["w", "api.php"]:
+                self._send_json(404, {"error": {"code": "notfound", "info": url.path}})
+                return
+
+            lang = parts[0]
+            if params.get("action") != "query" or params.get("generator") != "search":
+                self._send_json(400, {"error": {"code": "badparams", "info": "unsupported query"}})
+                return
+
+            if delay:
+                time.sleep(delay)
+
+            terms = params.get("gsrsearch", "").lower().split()
+            limit = int(params.get("gsrlimit", "10"))
+            sentences = int(params.get("exsentences", "0") or 0)
+
+            hits = [
+                title for title, extract in articles.get(lang, {}).items()
+                if terms and all(term in (title + " " + (extract or "")).lower() for term in terms)
+            ][:limit]
+
+            if not hits:
+                self._send_json(200, {"batchcomplete": True})
+                return
+
+            pages = []
+            for index, title in enumerate(hits, start=1):
+                extract = articles[lang][title]
+                page = {
+                    "pageid": abs(hash((lang, title))) % 10 ** 8,
+                    "ns": 0,
+                    "title": title,
+                    "index": index,
+                    "fullurl": f"https://{lang}.wikipedia.org/wiki/{title.replace(' ', '_')}",
+                }
+                if extract is None:
+                    page["pageprops"] = {"disambiguation": ""}
+                    page["extract"] = f"{title} may refer to:"
+                else:
+                    if sentences:
+                        extract = " ".join(re.split(r"(?<=\.)\s+", extract)[:sentences])
+                    page["extract"] = extract
+                pages.append(page)
+
+            self._send_json(200, {"batchcomplete": True, "query": {"pages": pages}})
+
+    return MediaWikiHandler
+
+
+class FakeWikipediaServer:
+    """Threaded stand-in server, usable as a context manager from benchmarks."""
+
+    def __init__(self, host="127.0.0.1", port=0, delay_ms=0.0, articles=None):
+        self.stats = {"requests": 0, "queries": [], "lock": threading.Lock()}
+        handler = build_handler(articles or DEFAULT_ARTICLES, delay_ms / 1000.0, self.stats)
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{{lang}}/w/api.php"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the MediaWiki API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Artificial latency per request")
+    parser.add_argument("--articles", help="JSON file of {lang: {title: extract}} to serve instead of the defaults")
+    args = parser.parse_args()
+
+    articles = None
+    if args.articles:
+        with open(args.articles, "r", encoding="utf-8") as f:
+            articles = json.load(f)
+
+    server = FakeWikipediaServer(args.host, args.port, args.delay_ms, articles)
+    print(f"Fake Wikipedia listening, use WIKIPEDIA_API_URL={server.api_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Load generator: virtual users holding realistic conversations
+Run from the backend directory, against a running server:
+    python benchmarks/load_generator.py --url http://127.0.0.1:5000 --users 50 --duration 60
+or let it start gunicorn (gunicorn.conf.py) on a free port with --spawn [--workers 4].
+
+Every conversation follows the real protocol: POST /start, a name turn, a
+stream of POST /chat turns with the returned session_id (messages drawn from
+the intents.json patterns, weighted by --mix), an occasional GET /history and,
+mostly, DELETE /session at the end.
+
+Arrival models:
+  closed  --users virtual users each start a new conversation as soon as the
+          previous one ends (throughput adapts to the server)
+  open    conversations arrive at --rate per second (Poisson) whatever the
+          server does, at most --users at a time; /start latency is measured
+          from the scheduled arrival, so waiting for a free user counts
+
+Reports throughput and p50/p95/p99/max latency with a histogram per endpoint.
+Exits with status 1 if more than --max-error-rate of the requests fail.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+INTENTS_PATH = BACKEND_DIR / "intents.json"
+
+NAMES = ["Alice", "Yessine", "Karim", "Sarah", "Tom", "Ines", "Lucas", "Amira"]
+
+# Upper bounds (ms) of the histogram buckets
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class Recorder:
+    """Latencies (ms) and outcomes per endpoint, shared by every virtual user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.conversations = 0
+
+    def record(self, endpoint, latency_ms, status, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency_ms)
+            self.statuses.setdefault(endpoint, {})
+            self.statuses[endpoint][status] = self.statuses[endpoint].get(status, 0) + 1
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def conversation_done(self):
+        with self._lock:
+            self.conversations += 1
+
+
+class Client:
+    """One keep-alive HTTP connection, like a browser tab."""
+
+    def __init__(self, url, recorder, timeout):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, endpoint, payload=None, started=None):
+        """Send one request; returns the decoded JSON body, or None on failure."""
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        started = started or time.perf_counter()
+        status = "error"
+        data = None
+        for attempt in range(2):
+            try:
+                if self.connection is None:
+                    self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                raw = response.read()
+                status = response.status
+                data = json.loads(raw) if raw else None
+                break
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                status = type(e).__name__
+                self.close()
+                # A kept-alive connection the server closed is retried once on a new one
+                if attempt or not isinstance(e, (http.client.RemoteDisconnected, BrokenPipeError,
+                                                 ConnectionResetError)):
+                    break
+
+        self.recorder.record(endpoint, (time.perf_counter() - started) * 1000, status,
+                             isinstance(status, int) and status < 400)
+        return data if isinstance(status, int) and status < 400 else None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def load_message_mix(path, weights):
+    """
+    (messages, weights) drawn from intents.json: every pattern of an intent
+    shares the intent's weight (--mix intent=weight), by default its pattern count.
+    """
+    with open(path, encoding="utf-8") as f:
+        intents = json.load(f)["intents"]
+
+    messages, message_weights = [], []
+    for intent in intents:
+        patterns = intent.get("patterns", [])
+        weight = weights.get(intent["tag"], None if weights else len(patterns))
+        if not patterns or not weight:
+            continue
+        messages.extend(patterns)
+        message_weights.extend([weight / len(patterns)] * len(patterns))
+
+    if not messages:
+        raise ValueError("The message mix is empty; check --mix against the intents.json tags")
+    return messages, message_weights
+
+
+def conversation(client, args, mix, rng, scheduled=None):
+    """One user from /start to the end of the conversation."""
+    started = client.request("POST", "/start", "POST /start", started=scheduled)
+    if not started:
+        return
+    session_id = started["session_id"]
+
+    client.request("POST", "/chat", "POST /chat", {"message": rng.choice(NAMES), "session_id": session_id})
+
+    messages, weights = mix
+    turns = max(1, round(rng.expovariate(1 / args.turns)))
+    for _ in range(turns):
+        if args.think_time:
+            time.sleep(rng.expovariate(1 / args.think_time))
+        message = rng.choices(messages, weights)[0]
+        client.request("POST", "/chat", "POST /chat", {"message": message, "session_id": session_id})
+        if rng.random() < args.history_prob:
+            client.request("GET", f"/history/{session_id}?limit=10", "GET /history")
+
+    if rng.random() < args.delete_prob:
+        client.request("DELETE", f"/session/{session_id}", "DELETE /session")
+    client.recorder.conversation_done()
+
+
+def run_closed(args, mix, recorder, deadline):
+    def user(index):
+        rng = random.Random(args.seed + index)
+        client = Client(args.url, recorder, args.timeout)
+        try:
+            while time.monotonic() < deadline:
+                conversation(client, args, mix, rng)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(args, mix, recorder, deadline):
+    local = threading.local()
+    arrivals = random.Random(args.seed)
+
+    def user(seed, scheduled):
+        if not hasattr(local, "client"):
+            local.client = Client(args.url, recorder, args.timeout)
+        conversation(local.client, args, mix, random.Random(seed), scheduled=scheduled)
+
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        next_arrival = time.perf_counter()
+        n = 0
+        while time.monotonic() < deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(user, args.seed + n, next_arrival)
+            n += 1
+            next_arrival += arrivals.expovariate(args.rate)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(recorder, elapsed):
+    report = {"elapsed_s": round(elapsed, 2), "conversations": recorder.conversations, "endpoints": {}}
+    total = errors = 0
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for latency in latencies:
+            counts[next((i for i, bound in enumerate(BUCKETS_MS) if latency <= bound), len(BUCKETS_MS))] += 1
+        report["endpoints"][endpoint] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(endpoint, 0),
+            "statuses": {str(k): v for k, v in recorder.statuses[endpoint].items()},
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(max(latencies), 2),
+            "histogram_ms": {f"<={bound}": count for bound, count in zip(BUCKETS_MS, counts)} |
+                            {f">{BUCKETS_MS[-1]}": counts[-1]},
+        }
+        total += len(latencies)
+        errors += recorder.errors.get(endpoint, 0)
+
+    report["requests"] = total
+    report["errors"] = errors
+    report["throughput_rps"] = round(total / elapsed, 2)
+    return report
+
+
+def print_report(report, args):
+    print("=" * 60)
+    arrival = (f"open loop, {args.rate}/s arrivals, at most {args.users} users" if args.mode == "open"
+               else f"closed loop, {args.users} users")
+    print(f"LOAD TEST ({arrival}, {report['elapsed_s']}s)")
+    print("=" * 60)
+    print(f"  conversations: {report['conversations']}, requests: {report['requests']}, "
+          f"errors: {report['errors']}, throughput: {report['throughput_rps']} req/s")
+
+    for endpoint, stats in report["endpoints"].items():
+        print(f"\n  {endpoint}: {stats['requests']} requests ({stats['throughput_rps']}/s), "
+              f"{stats['errors']} errors")
+        print(f"    p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, "
+              f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+        peak = max(stats["histogram_ms"].values()) or 1
+        for bucket, count in stats["histogram_ms"].items():
+            if count:
+                print(f"    {bucket:>8s} ms {count:8d} {'#' * max(1, round(40 * count / peak))}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(workers, timeout=120):
+    """gunicorn with gunicorn.conf.py on a free port, answering without the network."""
+    port = free_port()
+    env = dict(os.environ, LOG_LEVEL="WARNING", GUNICORN_ACCESS_LOG="", WIKI_CACHE_PATH="",
+               WIKIPEDIA_BACKEND="local")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+         "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/ping")
+            if connection.getresponse().status == 200:
+                return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"gunicorn not ready after {timeout}s")
+
+
+def parse_mix(items):
+    weights = {}
+    for item in items or []:
+        tag, _, weight = item.partition("=")
+        weights[tag] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="\n".join(__doc__.strip().splitlines()[1:]))
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", action="store_true", help="Start gunicorn locally instead of using --url")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers with --spawn")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--users", type=int, default=20, help="Virtual users (open loop: most at a time)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Open loop: conversations started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds during which conversations start")
+    parser.add_argument("--turns", type=float, default=6.0, help="Mean /chat turns per conversation")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between turns (0: none)")
+    parser.add_argument("--history-prob", type=float, default=0.1, help="Chance of GET /history after a turn")
+    parser.add_argument("--delete-prob", type=float, default=0.8, help="Chance of DELETE /session at the end")
+    parser.add_argument("--mix", nargs="+", metavar="INTENT=WEIGHT",
+                        help="Message mix by intent (default: every pattern equally likely)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request fails")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    mix = load_message_mix(INTENTS_PATH, parse_mix(args.mix))
+
+    server = None
+    if args.spawn:
+        server, args.url = spawn_server(args.workers)
+    recorder = Recorder()
+    try:
+        started = time.monotonic()
+        run = run_open if args.mode == "open" else run_closed
+        run(args, mix, recorder, started + args.duration)
+        elapsed = time.monotonic() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    if not recorder.latencies:
+        print("✗ No request completed")
+        return False
+
+    report = summarize(recorder, elapsed)
+    report["settings"] = {key: value for key, value in vars(args).items() if key != "output"}
+    print_report(report, args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n  report written to {args.output}")
+
+    error_rate = report["errors"] / report["requests"]
+    if error_rate > args.max_error_rate:
+        print(f"\n✗ {error_rate:.2%} of the requests failed (limit {args.max_error_rate:.2%})")
+        return False
+
+    print(f"\n✓ {report['requests']} requests, {error_rate:.2%} failed")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,431 @@
+"""
+Compiled bot bundle: intents, responses, keyword rules and classifier weights in one file
+Built after training (save_model) or from the pickle, and opened by every worker
+with mmap, so the pages are shared through the OS page cache instead of each
+worker unpickling the model and parsing intents.json on its own.
+
+Build:
+    python bundle.py build                      # from models/chatbot_model.pkl
+    python bundle.py build --version 1.2.0
+Inspect (verifies the checksum):
+    python bundle.py info models/chatbot.bundle
+
+Layout: magic, format version and header length, a JSON header (version,
+checksum, array table, metadata), then raw little-endian NumPy arrays, each
+aligned to 64 bytes.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import pickle
+import hashlib
+import logging
+import argparse
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from preprocessing import PREPROCESSING_VERSION
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent
+BUNDLE_PATH = Path(os.getenv('BUNDLE_PATH', str(BACKEND_DIR / 'models' / 'chatbot.bundle')))
+
+BUNDLE_FORMAT_VERSION = 1
+MAGIC = b"CHATBNDL"
+# Magic, format version, header length
+_PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+
+
+class BundleError(Exception):
+    """The file is not a bundle this code can read, or its checksum does not match."""
+
+
+def file_sha256(path) -> Optional[str]:
+    """Digest of a file, None when it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def pack_strings(strings):
+    """One UTF-8 blob plus len(strings) + 1 offsets (see StringTable)."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)))
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class StringTable(Sequence):
+    """Read-only sequence of strings decoded on access from a blob and its offsets."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string table index out of range")
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._blob[start:end].tobytes().decode('utf-8')
+
+
+class ResponseTable(Mapping):
+    """Intent tag -> list of responses, read from the bundle on every lookup."""
+
+    def __init__(self, tags: StringTable, groups: np.ndarray, responses: StringTable):
+        self._index = {tag: i for i, tag in enumerate(tags)}
+        self._groups = groups
+        self._responses = responses
+
+    def __getitem__(self, tag):
+        i = self._index[tag]
+        return self._responses[int(self._groups[i]):int(self._groups[i + 1])]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, tag):
+        return tag in self._index
+
+
+def _align(position: int) -> int:
+    return position + (-position % ALIGNMENT)
+
+
+def write_bundle(path, arrays: Dict[str, np.ndarray], version: Optional[str] = None,
+                 meta: Optional[dict] = None) -> str:
+    """
+    Write arrays to a bundle file, atomically replacing any previous one
+    (workers that already mapped it keep reading the old file).
+
+    Args:
+        path: Output file
+        arrays: Name -> array; object arrays are rejected
+        version: Bundle version (default: the start of the checksum)
+        meta: JSON-serializable metadata stored in the header
+
+    Returns:
+        The version written
+    """
+    path = Path(path)
+    table, chunks, position = {}, [], 0
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        array = np.asarray(array, order="C")
+        if array.dtype.hasobject:
+            raise ValueError(f"Array {name!r} has dtype object, which cannot be memory-mapped")
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+
+        padding = b"\0" * (-position % ALIGNMENT)
+        data = array.tobytes()
+        digest.update(padding)
+        digest.update(data)
+        chunks.extend((padding, data))
+        position += len(padding)
+        table[name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+        position += len(data)
+
+    checksum = digest.hexdigest()
+    header = json.dumps({
+        "version": version or checksum[:12],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "checksum": {"algorithm": "sha256", "digest": checksum},
+        "arrays": table,
+        "meta": meta or {},
+    }, ensure_ascii=False).encode('utf-8')
+
+    preamble = _PREAMBLE.pack(MAGIC, BUNDLE_FORMAT_VERSION, len(header))
+    data_start = _align(len(preamble) + len(header))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(preamble)
+            f.write(header)
+            f.write(b"\0" * (data_start - len(preamble) - len(header)))
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return version or checksum[:12]
+
+
+class Bundle:
+    """
+    A bundle mapped read-only into memory. Arrays are NumPy views of the
+    mapping, so nothing is copied and workers share the same physical pages.
+    """
+
+    def __init__(self, path, verify: bool = True):
+        """
+        Args:
+            path: Bundle file
+            verify: Check the checksum of the array data (reads every page once)
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._header = self._read_header()
+            data_start = _align(_PREAMBLE.size + self._header_length)
+            if verify:
+                self._verify(data_start)
+            self.arrays = self._map_arrays(data_start)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _read_header(self):
+        if len(self._mmap) < _PREAMBLE.size:
+            raise BundleError(f"{self.path} is too short to be a bundle")
+        magic, format_version, self._header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise BundleError(f"{self.path} is not a bundle")
+        if format_version != BUNDLE_FORMAT_VERSION:
+            raise BundleError(f"{self.path} has format {format_version}, expected {BUNDLE_FORMAT_VERSION}")
+        end = _PREAMBLE.size + self._header_length
+        if end > len(self._mmap):
+            raise BundleError(f"{self.path} is truncated")
+        return json.loads(self._mmap[_PREAMBLE.size:end].decode('utf-8'))
+
+    def _verify(self, data_start):
+        with memoryview(self._mmap) as view:
+            checksum = hashlib.sha256(view[data_start:]).hexdigest()
+        if checksum != self._header["checksum"]["digest"]:
+            raise BundleError(f"{self.path} is corrupt (checksum mismatch)")
+
+    def _map_arrays(self, data_start):
+        arrays = {}
+        for name, spec in self._header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            if dtype.hasobject:
+                raise BundleError(f"Array {name!r} has dtype object")
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape, dtype=np.int64))
+            offset = data_start + spec["offset"]
+            if offset + count * dtype.itemsize > len(self._mmap):
+                raise BundleError(f"Array {name!r} runs past the end of {self.path}")
+            arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return arrays
+
+    @property
+    def version(self) -> str:
+        return self._header["version"]
+
+    @property
+    def checksum(self) -> str:
+        return self._header["checksum"]["digest"]
+
+    @property
+    def created(self) -> str:
+        return self._header.get("created", "")
+
+    @property
+    def meta(self) -> dict:
+        return self._header.get("meta", {})
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def is_current(self, sources: Dict[str, Path]) -> bool:
+        """
+        Whether the files this bundle was built from are unchanged. Sources
+        that are absent (a deployment shipping only the bundle) are not checked.
+        """
+        recorded = self.meta.get("sources", {})
+        for key, path in sources.items():
+            digest = file_sha256(path)
+            if digest is not None and recorded.get(key) != digest:
+                return False
+        return True
+
+    # -----------------------
+    # Bot contents
+    # -----------------------
+
+    def strings(self, name) -> StringTable:
+        return StringTable(self.arrays[f"{name}.blob"], self.arrays[f"{name}.offsets"])
+
+    def intents(self) -> StringTable:
+        """Tags of the intents file, in file order."""
+        return self.strings("intents")
+
+    def patterns(self):
+        """Training patterns and their intent tags, as lists."""
+        tags = self.intents()
+        labels = [tags[i] for i in self.arrays["patterns.labels"].tolist()]
+        return list(self.strings("patterns")), labels
+
+    def responses(self) -> ResponseTable:
+        return ResponseTable(self.strings("responses.tags"), self.arrays["responses.groups"],
+                             self.strings("responses"))
+
+    def rules(self) -> dict:
+        return json.loads(self.arrays["rules"].tobytes().decode('utf-8'))
+
+    def classifier_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays for CompiledClassifier.from_arrays, as views of the mapping."""
+        arrays = {name[len("classifier."):]: array for name, array in self.arrays.items()
+                  if name.startswith("classifier.")}
+        # Stored transposed, which is the layout the classifier computes with
+        arrays["coef"] = arrays.pop("coef_t").T
+        return arrays
+
+    def get_info(self):
+        return {
+            "path": str(self.path),
+            "version": self.version,
+            "created": self.created,
+            "checksum": self.checksum,
+            "size_bytes": len(self._mmap),
+            "arrays": len(self.arrays),
+            "meta": self.meta,
+        }
+
+    def close(self):
+        """Unmap the file; arrays handed out keep it mapped until they are released."""
+        self.arrays = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+def open_bundle(path=BUNDLE_PATH, verify: bool = True) -> Optional[Bundle]:
+    """The bundle at ``path``, or None when there is none or it cannot be read."""
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"No bundle at {path}")
+        return None
+    try:
+        return Bundle(path, verify=verify)
+    except (BundleError, OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not open bundle {path}: {e}")
+        return None
+
+
+def build_bundle(classifier, path=BUNDLE_PATH, version: Optional[str] = None, model_path=None,
+                 preprocessing: str = PREPROCESSING_VERSION) -> str:
+    """
+    Compile the intents and rules files and a classifier into a bundle.
+
+    Args:
+        classifier: CompiledClassifier to store
+        path: Output file
+        version: Bundle version (default: derived from the contents)
+        model_path: Pickle the classifier was exported from, recorded to detect staleness
+        preprocessing: Preprocessing version the classifier was trained with
+
+    Returns:
+        The version written
+    """
+    from data import load_intents, load_rules, intents_file, rules_file
+
+    questions, labels, reponses, loaded_intents, missing_responses = load_intents(intents_file)
+    rules = load_rules(rules_file)
+
+    tag_index = {tag: i for i, tag in enumerate(loaded_intents)}
+    arrays = {}
+    arrays["intents.blob"], arrays["intents.offsets"] = pack_strings(loaded_intents)
+    arrays["patterns.blob"], arrays["patterns.offsets"] = pack_strings(questions)
+    arrays["patterns.labels"] = np.asarray([tag_index[label] for label in labels], dtype=np.int32)
+
+    response_tags = list(reponses)
+    groups = np.zeros(len(response_tags) + 1, dtype=np.int64)
+    groups[1:] = np.cumsum([len(reponses[tag]) for tag in response_tags])
+    arrays["responses.tags.blob"], arrays["responses.tags.offsets"] = pack_strings(response_tags)
+    arrays["responses.groups"] = groups
+    arrays["responses.blob"], arrays["responses.offsets"] = pack_strings(
+        [response for tag in response_tags for response in reponses[tag]])
+
+    arrays["rules"] = np.frombuffer(json.dumps(rules, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+    for name, array in classifier.to_arrays().items():
+        if name == "coef":
+            name, array = "coef_t", np.ascontiguousarray(array.T)
+        arrays[f"classifier.{name}"] = array
+
+    meta = {
+        "preprocessing": preprocessing,
+        "sources": {
+            "intents": file_sha256(intents_file),
+            "rules": file_sha256(rules_file),
+            "model": file_sha256(model_path) if model_path else None,
+        },
+        "missing_responses": missing_responses,
+        "patterns": len(questions),
+        "classes": len(classifier.classes_),
+        "features": len(classifier.terms),
+    }
+    return write_bundle(path, arrays, version=version, meta=meta)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Compiled bot bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build the bundle from the trained model and the data files")
+    build.add_argument("--model", type=Path, default=BACKEND_DIR / "models" / "chatbot_model.pkl")
+    build.add_argument("--output", type=Path, default=BUNDLE_PATH)
+    build.add_argument("--version", help="Bundle version (default: derived from the contents)")
+
+    info = commands.add_parser("info", help="Verify a bundle and print its header")
+    info.add_argument("path", type=Path, nargs="?", default=BUNDLE_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from compiled_model import CompiledClassifier
+
+        # Unpickling needs scikit-learn; serving from the bundle does not
+        with open(args.model, 'rb') as f:
+            data = pickle.load(f)
+        classifier = CompiledClassifier.from_sklearn(data['vectorizer'], data['model'])
+        version = build_bundle(classifier, args.output, version=args.version or data.get('version'),
+                               model_path=args.model, preprocessing=data.get('preprocessing', '1'))
+        logger.info(f"✓ Bundle {version} written to {args.output}")
+        return True
+
+    bundle = open_bundle(args.path)
+    if bundle is None:
+        return False
+    print(json.dumps(bundle.get_info(), indent=2, ensure_ascii=False))
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,280 @@
+"""
+Compiled inference engine for the intent classifier
+Replaces the sklearn TfidfVectorizer + LogisticRegression call path with flat NumPy arrays
+"""
+
+import re
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same whitespace normalization the char_wb analyzer applies before splitting
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+
+class CompiledClassifier:
+    """
+    Pure-NumPy equivalent of a fitted char_wb TfidfVectorizer followed by a
+    linear classifier.
+
+    Features are accumulated in the same order as sklearn (sorted feature
+    indices, sequential sums), so probabilities match the sklearn path bit for bit.
+    """
+
+    def __init__(self, terms, idf, coef, intercept, classes, ngram_range=(1, 3),
+                 lowercase=True, norm="l2", sublinear_tf=False, probability="multinomial",
+                 word_cache_size=20000):
+        """
+        Initialize the classifier from exported arrays.
+
+        Args:
+            terms: Vocabulary n-grams, position i being feature i
+            idf: Inverse document frequency per feature (None when idf is disabled)
+            coef: Classifier weights of shape (n_classes, n_features)
+            intercept: Classifier bias per class
+            classes: Class labels in classifier order
+            ngram_range: (min_n, max_n) of the char_wb analyzer
+            lowercase: Whether the vectorizer lowercased its input
+            norm: 'l2' or None
+            sublinear_tf: Whether tf was replaced by 1 + log(tf)
+            probability: 'multinomial' (softmax), 'ovr' or 'binary'
+            word_cache_size: Number of words whose feature indices are memoized
+        """
+        self.terms = np.asarray(terms, dtype=str)
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.ngram_range = tuple(int(n) for n in ngram_range)
+        self.lowercase = bool(lowercase)
+        self.norm = norm
+        self.sublinear_tf = bool(sublinear_tf)
+        self.probability = probability
+
+        if norm not in ("l2", None):
+            raise ValueError(f"Unsupported norm for compiled inference: {norm}")
+        if probability not in ("multinomial", "ovr", "binary"):
+            raise ValueError(f"Unsupported probability mode: {probability}")
+
+        self.vocabulary = {term: index for index, term in enumerate(self.terms.tolist())}
+        # One row of weights per feature, so a message gathers only its own rows
+        self._coef_t = np.ascontiguousarray(self.coef.T)
+
+        self._word_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._word_cache_size = word_cache_size
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, model, **kwargs) -> "CompiledClassifier":
+        """Export a fitted TfidfVectorizer and linear classifier."""
+        if vectorizer.analyzer != "char_wb":
+            raise ValueError(f"Only the char_wb analyzer can be compiled, got {vectorizer.analyzer!r}")
+        if vectorizer.preprocessor is not None or vectorizer.strip_accents is not None:
+            raise ValueError("Custom preprocessors and accent stripping are not supported")
+        if vectorizer.binary:
+            raise ValueError("Binary term counts are not supported")
+
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, index in vectorizer.vocabulary_.items():
+            terms[index] = term
+
+        classes = model.classes_
+        if len(classes) <= 2:
+            probability = "binary"
+        elif getattr(model, "loss", None) == "log_loss":
+            # SGDClassifier: one binary model per class, normalized
+            probability = "ovr"
+        elif getattr(model, "multi_class", "auto") == "ovr" or (
+                getattr(model, "multi_class", "auto") == "auto" and getattr(model, "solver", None) == "liblinear"):
+            probability = "ovr"
+        else:
+            probability = "multinomial"
+
+        return cls(
+            terms=terms,
+            idf=vectorizer.idf_ if vectorizer.use_idf else None,
+            coef=model.coef_,
+            intercept=model.intercept_,
+            classes=classes,
+            ngram_range=vectorizer.ngram_range,
+            lowercase=vectorizer.lowercase,
+            norm=vectorizer.norm,
+            sublinear_tf=vectorizer.sublinear_tf,
+            probability=probability,
+            **kwargs,
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Flat arrays fully describing this classifier (see from_arrays)."""
+        arrays = {
+            "terms": self.terms,
+            "coef": self.coef,
+            "intercept": self.intercept,
+            "classes": self.classes_,
+            "ngram_range": np.asarray(self.ngram_range, dtype=np.int64),
+            "options": np.asarray([self.lowercase, self.norm == "l2", self.sublinear_tf]),
+            "probability": np.asarray(self.probability),
+        }
+        if self.idf is not None:
+            arrays["idf"] = self.idf
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs) -> "CompiledClassifier":
+        lowercase, l2_norm, sublinear_tf = (bool(flag) for flag in arrays["options"])
+        return cls(
+            terms=arrays["terms"],
+            idf=arrays["idf"] if "idf" in arrays else None,
+            coef=arrays["coef"],
+            intercept=arrays["intercept"],
+            classes=arrays["classes"],
+            ngram_range=tuple(arrays["ngram_range"]),
+            lowercase=lowercase,
+            norm="l2" if l2_norm else None,
+            sublinear_tf=sublinear_tf,
+            probability=str(arrays["probability"]),
+            **kwargs,
+        )
+
+    def save(self, path):
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path, **kwargs) -> "CompiledClassifier":
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls.from_arrays({name: arrays[name] for name in arrays.files}, **kwargs)
+
+    # -----------------------
+    # Featurization
+    # -----------------------
+
+    def _word_features(self, word: str) -> np.ndarray:
+        """Vocabulary indices of every char_wb n-gram of one word."""
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            return cached
+
+        min_n, max_n = self.ngram_range
+        padded = " " + word + " "
+        length = len(padded)
+        lookup = self.vocabulary.get
+
+        indices = []
+        for n in range(min_n, max_n + 1):
+            if n >= length:
+                # A word shorter than n yields the whole padded word once
+                index = lookup(padded)
+                if index is not None:
+                    indices.append(index)
+                break
+            for offset in range(length - n + 1):
+                index = lookup(padded[offset:offset + n])
+                if index is not None:
+                    indices.append(index)
+
+        features = np.asarray(indices, dtype=np.int64)
+
+        # Unsynchronized on purpose: a lost insert only costs a recomputation
+        self._word_cache[word] = features
+        if len(self._word_cache) > self._word_cache_size:
+            try:
+                self._word_cache.popitem(last=False)
+            except KeyError:
+                pass
+        return features
+
+    def _featurize(self, text: str):
+        """Sorted feature indices and tf-idf weights of one message."""
+        if self.lowercase:
+            text = text.lower()
+        words = _WHITE_SPACES.sub(" ", text).split()
+
+        if not words:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        indices, counts = np.unique(
+            np.concatenate([self._word_features(word) for word in words]),
+            return_counts=True,
+        )
+        data = counts.astype(np.float64)
+
+        if self.sublinear_tf:
+            np.log(data, data)
+            data += 1.0
+        if self.idf is not None:
+            data *= self.idf[indices]
+        if self.norm == "l2" and data.size:
+            # Sequential sum of squares, like sklearn's inplace_csr_row_normalize_l2
+            total = np.cumsum(data * data)[-1]
+            if total != 0.0:
+                data /= np.sqrt(total)
+
+        return indices, data
+
+    # -----------------------
+    # Inference
+    # -----------------------
+
+    def transform(self, texts: List[str]):
+        """Features of each message, to pass to decision_function/predict_proba."""
+        return [self._featurize(text) for text in texts]
+
+    def decision_function(self, texts: List[str], features=None) -> np.ndarray:
+
+        if features is None:
+            features = self.transform(texts)
+        scores = np.empty((len(features), len(self.intercept)), dtype=np.float64)
+
+        for row, (indices, data) in enumerate(features):
+            if indices.size:
+                # Accumulate features in index order, as the CSR dot product does
+                scores[row] = np.cumsum(self._coef_t[indices] * data[:, None], axis=0)[-1]
+            else:
+                scores[row] = 0.0
+
+        scores += self.intercept
+        return scores
+
+    def predict_proba(self, texts: List[str], features=None) -> np.ndarray:
+
+        scores = self.decision_function(texts, features)
+
+        if self.probability == "binary":
+            positive = 1.0 / (1.0 + np.exp(-scores.ravel()))
+            return np.vstack([1 - positive, positive]).T
+
+        if self.probability == "ovr":
+            proba = 1.0 / (1.0 + np.exp(-scores))
+            proba /= proba.sum(axis=1).reshape((proba.shape[0], -1))
+            return proba
+
+        # Softmax, in the same steps as sklearn.utils.extmath.softmax
+        scores -= np.max(scores, axis=1).reshape((-1, 1))
+        np.exp(scores, scores)
+        scores /= np.sum(scores, axis=1).reshape((-1, 1))
+        return scores
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+
+def verify_equivalence(compiled: CompiledClassifier, vectorizer, model, texts: List[str]) -> Dict:
+    """
+    Compare compiled probabilities against the sklearn path on ``texts``.
+
+    Returns a summary with the number of rows that are not bit-identical,
+    the largest absolute difference and the number of differing predictions.
+    """
+    expected = model.predict_proba(vectorizer.transform(texts))
+    actual = compiled.predict_proba(texts)
+
+    identical_rows = np.all(expected == actual, axis=1)
+    return {
+        "samples": len(texts),
+        "non_identical_rows": int((~identical_rows).sum()),
+        "max_abs_diff": float(np.max(np.abs(expected - actual))) if len(texts) else 0.0,
+        "prediction_mismatches": int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum()),
+    }
@@ -2,6 +2,9 @@ import json
 import os
 import operator
 import logging
+from collections import Counter
+
+from bundle import open_bundle
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,101 +18,145 @@ ops = {
     '/': operator.truediv
 }
 
-# Load intents from JSON file
 intents_file = os.path.join(os.path.dirname(__file__), 'intents.json')
+rules_file = os.path.join(os.path.dirname(__file__), 'rules.json')
+
+
+def load_intents(path=intents_file):
+    """
+    Parse the intents file.
+
+    Returns:
+        (questions, labels, reponses, loaded_intents, missing_responses)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            intents_data = json.load(f)
+        logger.info(f"✓ Successfully loaded intents from {path}")
+    except FileNotFoundError:
+        logger.error(f"Error: {path} not found. Using minimal default data.")
+        intents_data = {
+            "intents": [
+                {
+                    "tag": "greeting",
+                    "patterns": ["hello", "hi", "hey"],
+                    "responses": ["Hello!", "Hi there!"]
+                }
+            ]
+        }
+    except json.JSONDecodeError as e:
+        logger.error(f"Error: Invalid JSON in {path}: {e}")
+        intents_data = {"intents": []}
+
+    questions = []
+    labels = []
+    reponses = {}
+    loaded_intents = []
+    missing_responses = []
+
+    for intent in intents_data.get('intents', []):
+        tag = intent.get('tag')
+        patterns = intent.get('patterns', [])
+        responses = intent.get('responses', [])
+
+        if not tag:
+            logger.warning(f"Skipping intent without tag: {intent}")
+            continue
+
+        loaded_intents.append(tag)
+
+        # Add patterns to training data
+        if patterns:
+            for pattern in patterns:
+                questions.append(pattern)
+                labels.append(tag)
+        else:
+            logger.warning(f"⚠ Intent '{tag}' has no patterns!")
+
+        # Add responses
+        if responses:
+            reponses[tag] = responses
+        else:
+            logger.warning(f"⚠ Intent '{tag}' has NO responses!")
+            missing_responses.append(tag)
+            # Add default response to prevent crashes
+            reponses[tag] = [f"Je peux vous aider avec {tag}."]
+
+    # Ensure 'unknown' intent exists
+    if 'unknown' not in reponses:
+        reponses['unknown'] = [
+            "Je n'ai pas bien compris votre demande 🤔. Pouvez-vous reformuler ou préciser votre question ?",
+            "I'm not sure I understand. Could you rephrase that?",
+            "I didn't quite get that. Can you try asking differently?",
+            "Hmm, I'm not sure about that. Can you be more specific?"
+        ]
 
-try:
-    with open(intents_file, 'r', encoding='utf-8') as f:
-        intents_data = json.load(f)
-    logger.info(f"✓ Successfully loaded intents from {intents_file}")
-except FileNotFoundError:
-    logger.error(f"Error: {intents_file} not found. Using minimal default data.")
-    intents_data = {
-        "intents": [
-            {
-                "tag": "greeting",
-                "patterns": ["hello", "hi", "hey"],
-                "responses": ["Hello!", "Hi there!"]
-            }
+    # Ensure 'etat' intent exists (for "how are you")
+    if 'etat' not in reponses:
+        reponses['etat'] = [
+            "Je vais très bien 😊 Merci de demander ! Et vous ?",
+            "Tout va bien de mon côté 👍 Comment puis-je vous aider ?",
+            "I'm doing well, thank you! How can I help you?",
+            "Great, thanks for asking! What can I do for you?",
+            "Je vais bien, merci! Comment puis-je vous aider?"
         ]
-    }
-except json.JSONDecodeError as e:
-    logger.error(f"Error: Invalid JSON in {intents_file}: {e}")
-    intents_data = {"intents": []}
-
-# Initialize data structures
-questions = []
-labels = []
-reponses = {}
-
-# Process intents
-loaded_intents = []
-missing_responses = []
-
-for intent in intents_data.get('intents', []):
-    tag = intent.get('tag')
-    patterns = intent.get('patterns', [])
-    responses = intent.get('responses', [])
-
-    if not tag:
-        logger.warning(f"Skipping intent without tag: {intent}")
-        continue
-
-    loaded_intents.append(tag)
-
-    # Add patterns to training data
-    if patterns:
-        for pattern in patterns:
-            questions.append(pattern)
-            labels.append(tag)
-    else:
-        logger.warning(f"⚠ Intent '{tag}' has no patterns!")
-
-    # Add responses
-    if responses:
-        reponses[tag] = responses
-    else:
-        logger.warning(f"⚠ Intent '{tag}' has NO responses!")
-        missing_responses.append(tag)
-        # Add default response to prevent crashes
-        reponses[tag] = [f"Je peux vous aider avec {tag}."]
-
-# Ensure 'unknown' intent exists
-if 'unknown' not in reponses:
-    reponses['unknown'] = [
-        "Je n'ai pas bien compris votre demande 🤔. Pouvez-vous reformuler ou préciser votre question ?",
-        "I'm not sure I understand. Could you rephrase that?",
-        "I didn't quite get that. Can you try asking differently?",
-        "Hmm, I'm not sure about that. Can you be more specific?"
-    ]
-
-# Ensure 'etat' intent exists (for "how are you")
-if 'etat' not in reponses:
-    reponses['etat'] = [
-        "Je vais très bien 😊 Merci de demander ! Et vous ?",
-        "Tout va bien de mon côté 👍 Comment puis-je vous aider ?",
-        "I'm doing well, thank you! How can I help you?",
-        "Great, thanks for asking! What can I do for you?",
-        "Je vais bien, merci! Comment puis-je vous aider?"
-    ]
-
-# Additional helper lists
-time = ["heure", "time", "wakt", "hour", "hours", "temps"]
-bye = ["bye", "revoir", "quitter", "ciao", "au revoir", "see you", "goodbye"]
-
-# Statistics and validation
+
+    return questions, labels, reponses, loaded_intents, missing_responses
+
+
+def load_rules(path=rules_file):
+    """Keyword rule tables (rule-based intents, handler triggers, Wikipedia patterns)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules_data = json.load(f)
+        logger.info(f"✓ Successfully loaded rules from {path}")
+    except FileNotFoundError:
+        logger.error(f"Error: {path} not found. Keyword rules are disabled.")
+        rules_data = {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Error: Invalid JSON in {path}: {e}")
+        rules_data = {}
+
+    rules_data.setdefault("intent_rules", [])
+    rules_data.setdefault("handler_rules", [])
+    rules_data.setdefault("wikipedia_patterns", [])
+    return rules_data
+
+
+# The compiled bundle (bundle.py) is served while the files it was built from are
+# unchanged: responses are then read from pages shared by every worker
+bot_bundle = open_bundle()
+
+if bot_bundle is not None and bot_bundle.is_current({"intents": intents_file, "rules": rules_file}):
+    questions, labels = bot_bundle.patterns()
+    reponses = bot_bundle.responses()
+    loaded_intents = list(bot_bundle.intents())
+    missing_responses = bot_bundle.meta.get("missing_responses", [])
+    rules_data = bot_bundle.rules()
+    logger.info(f"✓ Loaded intents and rules from {bot_bundle.path} (version {bot_bundle.version})")
+else:
+    if bot_bundle is not None:
+        logger.warning(f"{bot_bundle.path} is out of date with intents.json/rules.json, reading them instead "
+                       f"(rebuild with: python bundle.py build)")
+    questions, labels, reponses, loaded_intents, missing_responses = load_intents()
+    rules_data = load_rules()
+
+# Statistics and validation (one pass over the labels)
+pattern_counts = Counter(labels)
+
 logger.info("=" * 60)
 logger.info("DATA LOADING SUMMARY")
 logger.info("=" * 60)
 logger.info(f"✓ Loaded {len(questions)} training examples")
-logger.info(f"✓ Number of unique intents: {len(set(labels))}")
+logger.info(f"✓ Number of unique intents: {len(pattern_counts)}")
 logger.info(f"✓ Intents with responses: {len(reponses)}")
+logger.info(f"✓ Keyword rules: {len(rules_data['intent_rules'])} intent, {len(rules_data['handler_rules'])} handler, "
+            f"{len(rules_data['wikipedia_patterns'])} Wikipedia patterns")
 
-logger.info(f"\n📋 All loaded intents:")
-for intent in sorted(loaded_intents):
-    pattern_count = labels.count(intent)
-    response_count = len(reponses.get(intent, []))
-    logger.info(f"  • {intent}: {pattern_count} patterns, {response_count} responses")
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug(f"\n📋 All loaded intents:")
+    for intent in sorted(loaded_intents):
+        logger.debug(f"  • {intent}: {pattern_counts[intent]} patterns, {len(reponses.get(intent, []))} responses")
 
 if missing_responses:
     logger.warning(f"\n⚠ WARNING: These intents have NO responses in intents.json:")
@@ -145,10 +192,7 @@ if __name__ == "__main__":
 
     # Show statistics
     print("\n📊 Intent distribution:")
-    from collections import Counter
-
-    intent_counts = Counter(labels)
-    for intent, count in intent_counts.most_common():
+    for intent, count in pattern_counts.most_common():
         print(f"  {intent}: {count} patterns")
 
     print("\n✓ Data loading completed successfully!")
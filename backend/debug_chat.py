@@ -19,7 +19,7 @@ print("=" * 60)
 # Test 1: Import modules
 print("\n[TEST 1] Importing modules...")
 try:
-    from model import chatbot_enhanced, vectorizer, model
+    from model import chatbot_enhanced, model_ready
     from session_manager import session_manager
     print("✓ Imports successful")
 except Exception as e:
@@ -28,7 +28,7 @@ except Exception as e:
 
 # Test 2: Check if model is loaded
 print("\n[TEST 2] Checking model...")
-if vectorizer is None or model is None:
+if not model_ready():
     print("✗ Model not loaded!")
     print("Run: python train_model_script.py")
     sys.exit(1)
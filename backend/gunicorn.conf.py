@@ -0,0 +1,78 @@
+"""
+Production launcher
+Run from the backend directory: gunicorn -c gunicorn.conf.py app:app
+
+The app (bundle, model, data, NLTK, seeded caches) is loaded once in the
+master and the workers are forked from it, so they share those pages
+copy-on-write. The GC heap is frozen before each fork: collections in a
+worker then never write to objects inherited from the master, which would
+copy their pages. Background threads do not survive fork() and are started
+in each worker after it.
+"""
+
+import gc
+import os
+import tempfile
+
+# Objects freed in the master before the fork leave holes that later
+# allocations fill, dirtying shared pages; collect nothing until the freeze
+gc.disable()
+
+# Started per worker by post_fork, not when the master imports the app
+os.environ["START_BACKGROUND_TASKS"] = "false"
+
+# Each worker writes its metrics to a file there and /metrics sums them all;
+# set before the app (and metrics.py) is imported
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"chatbot_metrics_{os.getpid()}"))
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+# Requests mostly wait on Wikipedia: threads keep a worker busy meanwhile
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycling workers bounds leaks; replacements are forked from the same master
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+# Empty disables the access log
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'INFO').lower()
+
+
+def on_starting(server):
+    # Values left by an earlier run under the same directory would be added in
+    from metrics import clear_metrics_dir
+    clear_metrics_dir(os.environ["METRICS_DIR"])
+
+
+def when_ready(server):
+    """Master, app loaded and listening, no worker forked yet."""
+    # Refuse to start without the NLTK data the model was trained with:
+    # the RuntimeError stops the master before any worker serves
+    from preprocessing import preprocessor
+    preprocessor.load()
+
+    if preload_app:
+        # Everything the warm-up loads is then shared instead of loaded per worker
+        from model import warm_up
+        warm_up()
+
+    gc.freeze()
+    gc.enable()
+    server.log.info(f"Preloaded app frozen ({gc.get_freeze_count()} objects), forking workers")
+
+
+def pre_fork(server, worker):
+    # Also covers workers forked later to replace exited ones
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import start_background_tasks, BACKGROUND_WARM_UP
+
+    # Without preload the worker imports the app itself and warms up on its own
+    start_background_tasks(warm=BACKGROUND_WARM_UP and not preload_app)
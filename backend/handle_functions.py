@@ -1,14 +1,34 @@
 import unicodedata
 from datetime import datetime
-from data import time,bye
+from data import rules_data
+from keyword_matcher import RuleEngine, PatternSet
+from wiki_cache import WikipediaCache
+from wikipedia_client import wikipedia_client
+from knowledge_index import KnowledgeIndex
+from metrics import timed
 import random
 import re
+import os
 import logging
+import threading
 
 
 
 logger = logging.getLogger(__name__)
 
+# Persistent Wikipedia cache (set WIKI_CACHE_PATH to an empty string to disable)
+WIKI_CACHE_PATH = os.getenv('WIKI_CACHE_PATH', os.path.join('cache', 'wikipedia.sqlite3'))
+WIKI_CACHE_TTL_HOURS = float(os.getenv('WIKI_CACHE_TTL_HOURS', '168'))
+WIKI_CACHE_NEGATIVE_TTL_MINUTES = float(os.getenv('WIKI_CACHE_NEGATIVE_TTL_MINUTES', '60'))
+WIKI_CACHE_MAX_ENTRIES = int(os.getenv('WIKI_CACHE_MAX_ENTRIES', '50000'))
+
+# Offline knowledge index (see knowledge_index.py)
+# WIKIPEDIA_BACKEND: "local_first" (index, then network), "local" (index only) or "network"
+KNOWLEDGE_INDEX_PATH = os.getenv('KNOWLEDGE_INDEX_PATH', 'knowledge_index')
+WIKIPEDIA_BACKEND = os.getenv('WIKIPEDIA_BACKEND', 'local_first').lower()
+# English is preferred, French is the fallback
+WIKIPEDIA_LANGUAGES = ('en', 'fr')
+
 def normalize_text(text):
     return ''.join(
         c for c in unicodedata.normalize('NFD', text)
@@ -16,137 +36,197 @@ def normalize_text(text):
     ).lower()
 
 
+# Compiled once at startup from rules.json
+rule_engine = RuleEngine(
+    {"intent": rules_data["intent_rules"], "handler": rules_data["handler_rules"]},
+    normalizer=normalize_text,
+)
+wikipedia_patterns = PatternSet(rules_data["wikipedia_patterns"])
 
-def handle_wikipedia_search(message):
-    import wikipedia
-    try:
-        msg = message.lower().strip()
-        # Detect Wikipedia search intent
-        patterns = [
-            r"(?:search|look up|find|tell me about|what is|who is|explain)\s+(?:on\s+)?(?:wikipedia\s+)?(?:for\s+)?(.+)",
-            r"wikipedia\s+(.+)",
-            r"(?:information|info)\s+(?:about|on)\s+(.+)"
-            r"search (?:wikipedia |wiki )?for (.+)",
-            r"look up (.+) (?:on |in )?(?:wikipedia|wiki)",
-            r"what is (.+)",
-            r"who is (.+)",
-            r"tell me about (.+)",
-            r"find (?:information )?(?:about |on )?(.+)",
-            r"wikipedia (.+)",
-            r"wiki (.+)",
-            r"(?:search|find|cherche) (.+)",
-            r"recherche (.+)",
-            r"qui est (.+)",
-            r"c'est quoi (.+)",
-        ]
-
-        search_query = None
-        for pattern in patterns:
-            match = re.search(pattern, message.lower())
-            if match:
-                search_query = match.group(1).strip()
-                break
-        # If no pattern matched, check if it's a simple "what is X" type question
-        if not search_query and msg.startswith(("what is ", "who is ", "tell me about ", "qui est ", "c'est quoi ")):
-            parts = msg.split(None, 2)  # Split into max 3 parts
-            if len(parts) >= 3:
-                search_query = parts[2]
-
-        if not search_query:
-            return None
+wikipedia_cache = WikipediaCache(
+    WIKI_CACHE_PATH or None,
+    ttl_seconds=WIKI_CACHE_TTL_HOURS * 3600,
+    negative_ttl_seconds=WIKI_CACHE_NEGATIVE_TTL_MINUTES * 60,
+    max_entries=WIKI_CACHE_MAX_ENTRIES,
+)
+
+_knowledge_index = None
+_knowledge_index_checked = False
+_knowledge_index_lock = threading.Lock()
+
+
+def get_knowledge_index():
+    """Open the offline index on first use, or return None when it is not available."""
+    global _knowledge_index, _knowledge_index_checked
+
+    if _knowledge_index_checked:
+        return _knowledge_index
 
-        # Clean up the query
-        search_query = search_query.strip('?.,!').strip()
+    with _knowledge_index_lock:
+        if _knowledge_index_checked:
+            return _knowledge_index
 
-        # Filter out very short or meaningless queries
-        if len(search_query) < 2 or search_query in ['it', 'that', 'this', 'you', 'me', 'ça', 'cela']:
+        if WIKIPEDIA_BACKEND != 'network' and KNOWLEDGE_INDEX_PATH:
+            if os.path.exists(os.path.join(KNOWLEDGE_INDEX_PATH, 'meta.json')):
+                try:
+                    _knowledge_index = KnowledgeIndex(KNOWLEDGE_INDEX_PATH)
+                    logger.info(f"Knowledge index loaded: {_knowledge_index.documents} documents "
+                                f"from {KNOWLEDGE_INDEX_PATH}")
+                except Exception as e:
+                    logger.error(f"Could not open knowledge index at {KNOWLEDGE_INDEX_PATH}: {e}")
+            elif WIKIPEDIA_BACKEND == 'local':
+                logger.warning(f"WIKIPEDIA_BACKEND=local but no knowledge index found at {KNOWLEDGE_INDEX_PATH}")
+
+        _knowledge_index_checked = True
+        return _knowledge_index
+
+
+
+def extract_wikipedia_query(message):
+    """Return the search query of a Wikipedia-style question, or None."""
+    msg = message.lower().strip()
+    # Detect Wikipedia search intent (first matching pattern wins)
+    search_query = None
+    match = wikipedia_patterns.search(message.lower())
+    if match:
+        _, search_query = match
+        if search_query is None:
             return None
+        search_query = search_query.strip()
+    # If no pattern matched, check if it's a simple "what is X" type question
+    if not search_query and msg.startswith(("what is ", "who is ", "tell me about ", "qui est ", "c'est quoi ")):
+        parts = msg.split(None, 2)  # Split into max 3 parts
+        if len(parts) >= 3:
+            search_query = parts[2]
+
+    if not search_query:
+        return None
+
+    # Clean up the query
+    search_query = search_query.strip('?.,!').strip()
+
+    # Filter out very short or meaningless queries
+    if len(search_query) < 2 or search_query in ['it', 'that', 'this', 'you', 'me', 'ça', 'cela']:
+        return None
 
-        logger.info(f"Wikipedia search for: {search_query}")
+    return search_query
 
-        # Try English first, then French
-        languages = ['en', 'fr']
 
-        # Search Wikipedia
-        for lang in languages:
-            try:
-                wikipedia.set_lang(lang)
-                logger.debug(f"Trying language: {lang}")
+def format_wikipedia_answer(article):
+    return f"📚 **{article['title']}**\n\n{article['summary']}\n\n🔗 En savoir plus : {article['url']}"
 
-                # First, try to search for the topic
-                search_results = wikipedia.search(search_query, results=5)
 
-                if not search_results:
-                    logger.debug(f"No results in {lang}")
-                    continue
+def _wikipedia_not_found(search_query):
+    return f"Je n'ai pas trouvé d'article Wikipedia clair pour '{search_query}'. Essayez d'être plus précis ou utilisez un autre terme."
 
-                logger.info(f"Found {len(search_results)} results in {lang}: {search_results}")
 
-                # Try each search result until one works
-                for result in search_results:
-                    try:
-                        logger.debug(f"Attempting to fetch: {result}")
+def _plan_wikipedia_search(message):
+    """
+    Everything short of the network: the query, the offline index and the cache.
+    Returns (answer, search_query, languages to fetch, articles found so far);
+    when nothing is left to fetch, answer is final (None: not a Wikipedia question).
+    """
+    search_query = extract_wikipedia_query(message)
+    if not search_query:
+        return None, None, [], {}
 
-                        # Get the page
-                        page = wikipedia.page(result, auto_suggest=False)
+    logger.info(f"Wikipedia search for: {search_query}")
 
-                        # Get summary (3 sentences)
-                        summary = wikipedia.summary(result, sentences=3, auto_suggest=False)
+    index = get_knowledge_index()
+    if index is not None:
+        article = index.lookup(search_query)
+        if article:
+            logger.info(f"Knowledge index answer: {article['title']} (score {article['score']:.1f})")
+            return format_wikipedia_answer(article), search_query, [], {}
 
-                        # Format the response
-                        response = f"📚 **{page.title}**\n\n{summary}\n\n🔗 En savoir plus : {page.url}"
+    if WIKIPEDIA_BACKEND == 'local':
+        logger.warning(f"No knowledge index article for: {search_query}")
+        return _wikipedia_not_found(search_query), search_query, [], {}
 
-                        logger.info(f"Successfully fetched: {page.title}")
-                        return response
+    articles = {}
+    to_fetch = []
+    for lang in WIKIPEDIA_LANGUAGES:
+        hit, article = wikipedia_cache.get(lang, search_query)
+        if not hit:
+            to_fetch.append(lang)
+            continue
+        logger.debug(f"Wikipedia cache hit ({lang}): {search_query}")
+        articles[lang] = article
+        if article and not to_fetch:
+            # Nothing preferred is left to ask for
+            return format_wikipedia_answer(article), search_query, [], articles
 
-                    except wikipedia.exceptions.DisambiguationError as e:
-                        # Multiple possibilities found - try the first option
-                        logger.debug(f"Disambiguation error for '{result}', trying first option")
-                        if e.options:
-                            try:
-                                first_option = e.options[0]
-                                logger.debug(f"Trying disambiguation option: {first_option}")
-                                page = wikipedia.page(first_option, auto_suggest=False)
-                                summary = wikipedia.summary(first_option, sentences=3, auto_suggest=False)
+    if to_fetch:
+        return None, search_query, to_fetch, articles
+    return _finish_wikipedia_search(search_query, articles, {}), search_query, [], articles
 
-                                response = f"📚 **{page.title}**\n\n{summary}\n\n🔗 En savoir plus : {page.url}"
-                                logger.info(f"Successfully fetched via disambiguation: {page.title}")
-                                return response
-                            except:
-                                # If first option fails, continue to next result
-                                continue
 
-                    except wikipedia.exceptions.PageError:
-                        # This page doesn't exist, try next result
-                        logger.debug(f"PageError for '{result}', trying next")
-                        continue
+def _finish_wikipedia_search(search_query, articles, outcomes):
+    """Cache the lookups ({lang: article, None or error}) and answer in the preferred language."""
+    for lang, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            logger.warning(f"Error in {lang} search: {outcome}")
+            continue
+        # Remember the answer, including "nothing found", for other users
+        wikipedia_cache.put(lang, search_query, outcome)
+        articles[lang] = outcome
 
-                    except Exception as e:
-                        # Any other error, try next result
-                        logger.debug(f"Error fetching '{result}': {e}")
-                        continue
+    for lang in WIKIPEDIA_LANGUAGES:
+        if articles.get(lang):
+            logger.info(f"Successfully fetched ({lang}): {articles[lang]['title']}")
+            return format_wikipedia_answer(articles[lang])
 
-            except Exception as e:
-                logger.debug(f"Error in {lang} search: {e}")
-                continue
+    logger.warning(f"Could not find Wikipedia article for: {search_query}")
+    return _wikipedia_not_found(search_query)
 
-            # If we get here, nothing worked
-        logger.warning(f"Could not find Wikipedia article for: {search_query}")
-        return f"Je n'ai pas trouvé d'article Wikipedia clair pour '{search_query}'. Essayez d'être plus précis ou utilisez un autre terme."
+
+@timed("wikipedia")
+def handle_wikipedia_search(message):
+    try:
+        answer, search_query, to_fetch, articles = _plan_wikipedia_search(message)
+        if not to_fetch:
+            return answer
+
+        # Query the remaining languages concurrently, one request each
+        outcomes = wikipedia_client.lookup_many(search_query, to_fetch)
+        return _finish_wikipedia_search(search_query, articles, outcomes)
 
     except Exception as e:
         logger.error(f"Error in handle_wikipedia_search: {e}", exc_info=True)
         return None
 
 
-def handle_email_recall(message,session):
+@timed("wikipedia")
+async def handle_wikipedia_search_async(message, executor=None):
+    """
+    handle_wikipedia_search() awaiting the lookups instead of blocking a thread (asgi.py).
+    Planning (knowledge index, cache reads) and finishing (cache writes) block,
+    so they run in ``executor`` (the loop's default when None).
+    """
+    import asyncio
 
-    msg = normalize_text(message)
+    try:
+        loop = asyncio.get_running_loop()
+        answer, search_query, to_fetch, articles = await loop.run_in_executor(
+            executor, _plan_wikipedia_search, message)
+        if not to_fetch:
+            return answer
+
+        outcomes = await wikipedia_client.lookup_many_async(search_query, to_fetch)
+        return await loop.run_in_executor(executor, _finish_wikipedia_search, search_query, articles, outcomes)
+
+    except Exception as e:
+        logger.error(f"Error in handle_wikipedia_search_async: {e}", exc_info=True)
+        return None
 
-    if any(expr in msg for expr in [
-        "what is my email", "quel est mon email", "mon email",
-        "my email", "rappelle mon email", "recall my email"
-    ]):
+
+@timed("email_recall")
+def handle_email_recall(message,session,scan=None):
+
+    if scan is None:
+        scan = rule_engine.scan(message)
+
+    if scan.fired("handler", "email_recall"):
 
         email = session.get("email")
         if email:
@@ -157,9 +237,15 @@ def handle_email_recall(message,session):
 
     return None
 
-def handle_goodbye(message):
+@timed("goodbye")
+def handle_goodbye(message,scan=None):
+
+    if scan is None:
+        scan = rule_engine.scan(message)
+
+    if not scan.fired("handler", "goodbye"):
+        return None
 
-    msg=message.lower()
     hour = datetime.now().hour
 
     if 5 <= hour < 12:
@@ -177,26 +263,26 @@ def handle_goodbye(message):
         " et au plaisir de te revoir.",
         ". J'espère avoir pu t'aider !"
     ]
-    if any(word in msg for word in bye):
-        return f"{greeting}{random.choice(suffixes)}"
-
-    return None
+    return f"{greeting}{random.choice(suffixes)}"
 
 
 
-def handle_datetime(message):
+@timed("datetime")
+def handle_datetime(message,scan=None):
 
-    msg = message.lower()
+    if scan is None:
+        scan = rule_engine.scan(message)
 
-    if any(word in msg for word in time):
+    if scan.fired("handler", "time"):
         return f"Il est {datetime.now().strftime('%H:%M')}."
 
-    if "date" in msg or "aujourd'hui" in msg:
+    if scan.fired("handler", "date"):
         return f"Nous sommes le {datetime.now().strftime('%d/%m/%Y')}."
 
     return None
 
 
+@timed("email_extraction")
 def handle_email(message):
 
     email_pattern = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
@@ -0,0 +1,268 @@
+"""
+Cost-ordered handler pipeline
+Runs registered handlers over the sub-questions of a message, cheapest first,
+and keeps per-handler hit rates and latencies. stream() yields each fragment
+as soon as it is answered; run_async() is the same walk on an event loop:
+handlers with an awaitable variant are awaited, the others run in an executor.
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Handlers run one cost class at a time, in this order
+COST_LOCAL = "local"        # string and regex work on the message only
+COST_MODEL = "model"        # classifier inference
+COST_NETWORK = "network"    # anything that may wait on I/O
+COST_FALLBACK = "fallback"  # always answers; runs for whatever is left
+COST_CLASSES = (COST_LOCAL, COST_MODEL, COST_NETWORK, COST_FALLBACK)
+
+Answer = Tuple[str, Optional[str]]
+
+
+class Fragment:
+    """One sub-question travelling through the pipeline."""
+
+    __slots__ = ("text", "session", "scan", "prediction", "threshold", "answer", "answered_by", "_memo")
+
+    def __init__(self, text: str, session, scan=None, prediction=None, threshold: float = 0.2):
+        self.text = text
+        self.session = session
+        self.scan = scan
+        self.prediction = prediction
+        self.threshold = threshold
+        self.answer: Optional[Answer] = None
+        self.answered_by: Optional[str] = None
+        self._memo = {}
+
+    def memo(self, key: str, compute: Callable):
+        """Compute a per-fragment value once and share it between handlers."""
+        if key not in self._memo:
+            self._memo[key] = compute(self)
+        return self._memo[key]
+
+
+class Handler:
+    __slots__ = ("name", "func", "cost", "priority", "precondition", "batch", "async_func",
+                 "calls", "hits", "skips", "errors", "total_seconds")
+
+    def __init__(self, name: str, func: Callable, cost: str, priority: int,
+                 precondition: Optional[Callable], batch: bool, async_func: Optional[Callable] = None):
+        self.name = name
+        self.func = func
+        self.cost = cost
+        self.priority = priority
+        self.precondition = precondition
+        self.batch = batch
+        self.async_func = async_func
+
+        self.calls = 0
+        self.hits = 0
+        self.skips = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+
+class HandlerPipeline:
+    """
+    Registry of answer handlers.
+
+    A handler receives a Fragment (or, for batch handlers, the list of
+    fragments still unanswered) and returns a (response, intent) answer or
+    None. Cost classes run in COST_CLASSES order and handlers inside a class
+    by ascending priority; the first answer wins, so expensive handlers only
+    see what the cheap ones could not answer.
+    """
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func: Callable, cost: str = COST_LOCAL, priority: int = 100,
+                 precondition: Optional[Callable] = None, batch: bool = False,
+                 async_func: Optional[Callable] = None):
+        """
+        Add a handler.
+
+        Args:
+            name: Key used in the statistics
+            func: fn(fragment) -> answer or None; with batch, fn(fragments) -> list of those
+            cost: One of COST_CLASSES
+            priority: Order inside the cost class (lower runs first)
+            precondition: fn(fragment) -> bool; the handler is skipped when it is False
+            batch: Call func once with every eligible fragment at once instead of per fragment
+            async_func: async fn(fragment, executor) -> answer or None, awaited by run_async();
+                blocking work goes to ``executor``
+        """
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class '{cost}' for handler {name}")
+        if any(handler.name == name for handler in self._handlers):
+            raise ValueError(f"Handler {name} is already registered")
+
+        self._handlers.append(Handler(name, func, cost, priority, precondition, batch, async_func))
+        self._handlers.sort(key=lambda h: (COST_CLASSES.index(h.cost), h.priority))
+
+    def _eligible(self, handler: Handler, fragment: Fragment) -> bool:
+        if handler.precondition is None:
+            return True
+        try:
+            return bool(handler.precondition(fragment))
+        except Exception as e:
+            logger.error(f"Precondition of handler {handler.name} failed: {e}", exc_info=True)
+            return False
+
+    def run(self, fragments: List[Fragment]) -> List[Fragment]:
+        """Answer as many fragments as possible; unanswered ones keep answer=None."""
+        self._run_handlers(self._handlers, fragments)
+        return fragments
+
+    def stream(self, fragments: List[Fragment]) -> Iterator[Fragment]:
+        """
+        run() as a generator: yields each fragment as soon as a handler answers
+        it, so a local answer never waits for another fragment's network call.
+        Fragments no handler could answer are yielded last, with answer=None.
+        """
+        yield from self._answered(self._handlers, fragments)
+        for fragment in fragments:
+            if fragment.answer is None:
+                yield fragment
+
+    async def run_async(self, fragments: List[Fragment], executor=None) -> List[Fragment]:
+        """
+        run() without blocking the event loop. Consecutive handlers without an
+        async_func run together in ``executor`` (the loop's default when None);
+        an async_func is awaited for every eligible fragment concurrently, and
+        given the same executor for its own blocking steps.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        handlers = self._handlers
+        i = 0
+        while i < len(handlers) and any(fragment.answer is None for fragment in fragments):
+            handler = handlers[i]
+            if handler.async_func is not None:
+                await self._run_async_handler(handler, fragments, executor)
+                i += 1
+                continue
+
+            j = i
+            while j < len(handlers) and handlers[j].async_func is None:
+                j += 1
+            await loop.run_in_executor(executor, self._run_handlers, handlers[i:j], fragments)
+            i = j
+
+        return fragments
+
+    def _run_handlers(self, handlers: List[Handler], fragments: List[Fragment]):
+        for _ in self._answered(handlers, fragments):
+            pass
+
+    def _answered(self, handlers: List[Handler], fragments: List[Fragment]) -> Iterator[Fragment]:
+        for handler in handlers:
+            pending = [fragment for fragment in fragments if fragment.answer is None]
+            if not pending:
+                break
+
+            eligible = [fragment for fragment in pending if self._eligible(handler, fragment)]
+            hits = 0
+            errors = 0
+            # Only the handler's own time: the consumer may hold a yield for a while
+            elapsed = 0.0
+
+            try:
+                if eligible and handler.batch:
+                    started = time.perf_counter()
+                    try:
+                        answers = handler.func(eligible)
+                    except Exception as e:
+                        logger.error(f"Handler {handler.name} failed: {e}", exc_info=True)
+                        answers = [None] * len(eligible)
+                        errors += 1
+                    elapsed += time.perf_counter() - started
+
+                    for fragment, answer in zip(eligible, answers):
+                        if self._keep(handler, fragment, answer):
+                            hits += 1
+                            yield fragment
+                else:
+                    for fragment in eligible:
+                        started = time.perf_counter()
+                        try:
+                            answer = handler.func(fragment)
+                        except Exception as e:
+                            logger.error(f"Handler {handler.name} failed: {e}", exc_info=True)
+                            answer = None
+                            errors += 1
+                        elapsed += time.perf_counter() - started
+
+                        if self._keep(handler, fragment, answer):
+                            hits += 1
+                            yield fragment
+            finally:
+                self._count(handler, len(pending), len(eligible), hits, errors, elapsed)
+
+    async def _run_async_handler(self, handler: Handler, fragments: List[Fragment], executor=None):
+        import asyncio
+
+        pending = [fragment for fragment in fragments if fragment.answer is None]
+        eligible = [fragment for fragment in pending if self._eligible(handler, fragment)]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(handler.async_func(fragment, executor) for fragment in eligible),
+                                       return_exceptions=True)
+        answers = []
+        errors = 0
+        for result in results:
+            # BaseException: gather() also returns a lookup's CancelledError
+            if isinstance(result, BaseException):
+                logger.error(f"Handler {handler.name} failed: {result}", exc_info=result)
+                result = None
+                errors += 1
+            answers.append(result)
+
+        self._record(handler, pending, eligible, answers, errors, time.perf_counter() - started)
+
+    @staticmethod
+    def _keep(handler: Handler, fragment: Fragment, answer) -> bool:
+        """Store a handler's answer on the fragment; False when it had none."""
+        if not answer:
+            return False
+        fragment.answer = answer
+        fragment.answered_by = handler.name
+        return True
+
+    def _record(self, handler: Handler, pending: List[Fragment], eligible: List[Fragment],
+                answers: List, errors: int, elapsed: float):
+        """Keep the first answer of each fragment and update the handler's counters."""
+        hits = sum(self._keep(handler, fragment, answer) for fragment, answer in zip(eligible, answers))
+        self._count(handler, len(pending), len(eligible), hits, errors, elapsed)
+
+    def _count(self, handler: Handler, pending: int, eligible: int, hits: int, errors: int, elapsed: float):
+        with self._lock:
+            handler.calls += eligible
+            handler.hits += hits
+            handler.skips += pending - eligible
+            handler.errors += errors
+            handler.total_seconds += elapsed
+
+    def get_stats(self) -> Dict:
+        """Per-handler counters, in execution order."""
+        with self._lock:
+            return {
+                handler.name: {
+                    "cost": handler.cost,
+                    "priority": handler.priority,
+                    "calls": handler.calls,
+                    "hits": handler.hits,
+                    "hit_rate": round(handler.hits / handler.calls, 4) if handler.calls else 0.0,
+                    "skips": handler.skips,
+                    "errors": handler.errors,
+                    "avg_latency_ms": round(handler.total_seconds * 1000 / handler.calls, 3)
+                                      if handler.calls else 0.0,
+                }
+                for handler in self._handlers
+            }
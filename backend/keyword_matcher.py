@@ -0,0 +1,217 @@
+"""
+Compiled keyword and pattern matching for the rule tables
+Scans a message once and reports every rule that fired, in priority order
+"""
+
+import re
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _word_padded(text: str) -> str:
+    """Words of ``text`` joined by single spaces, with a space on each side."""
+    return " " + " ".join(_WORD_RE.findall(text)) + " "
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over literal phrases.
+
+    Failure links are folded into a full transition table at build time, so
+    a scan is one dict lookup per character no matter how many phrases exist.
+    """
+
+    def __init__(self, phrases: Iterable[Tuple[str, int]]):
+        """
+        Build the automaton.
+
+        Args:
+            phrases: (phrase, payload) pairs; the payloads of every phrase
+                found in a text are returned by find_all()
+        """
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[set] = [set()]
+
+        for phrase, payload in phrases:
+            if not phrase:
+                continue
+            state = 0
+            for char in phrase:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(payload)
+
+        # Breadth-first pass: failure links, inherited outputs and full transitions
+        fail = [0] * len(goto)
+        transitions: List[Dict[str, int]] = [dict() for _ in goto]
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                fail[child] = transitions[fail[state]].get(char, 0) if state else 0
+                outputs[child] |= outputs[fail[child]]
+                queue.append(child)
+            if state:
+                transitions[state] = {**transitions[fail[state]], **goto[state]}
+
+        self._transitions = transitions
+        self._outputs = [frozenset(output) for output in outputs]
+
+    def find_all(self, text: str) -> set:
+        """Payloads of every phrase occurring in ``text``."""
+        transitions = self._transitions
+        outputs = self._outputs
+
+        state = 0
+        found = set()
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class Rule:
+    __slots__ = ("group", "name", "priority")
+
+    def __init__(self, group: str, name: str, priority: int):
+        self.group = group
+        self.name = name
+        self.priority = priority
+
+    def __repr__(self):
+        return f"Rule({self.group}:{self.name})"
+
+
+class ScanResult:
+    """Rules fired by one message, sorted by priority."""
+
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+
+    def first(self, group: str) -> Optional[str]:
+        """Name of the highest-priority rule of ``group`` that fired."""
+        for rule in self.rules:
+            if rule.group == group:
+                return rule.name
+        return None
+
+    def fired(self, group: str, name: str) -> bool:
+        return any(rule.group == group and rule.name == name for rule in self.rules)
+
+    def names(self, group: str) -> List[str]:
+        return [rule.name for rule in self.rules if rule.group == group]
+
+
+class RuleEngine:
+    """
+    Keyword rules compiled into one automaton plus an exact-match table.
+
+    Rules are given per group ("intent", "handler", ...) as lists of
+    {"name", "contains", "exact"} entries; list order is the priority.
+    """
+
+    def __init__(self, rule_groups: Dict[str, List[Dict]], normalizer: Callable[[str], str] = str.lower):
+        """
+        Compile the rule tables.
+
+        Args:
+            rule_groups: Mapping of group name to its ordered rule list
+            normalizer: Applied to keywords at build time and to messages at scan time
+        """
+        self.normalizer = normalizer
+        self.rules: List[Rule] = []
+
+        phrases = []
+        word_phrases = []
+        self._exact: Dict[str, List[int]] = {}
+
+        for group, entries in rule_groups.items():
+            for entry in entries:
+                rule_id = len(self.rules)
+                self.rules.append(Rule(group, entry["name"], rule_id))
+
+                for phrase in entry.get("contains", []):
+                    phrases.append((normalizer(phrase), rule_id))
+                    word_phrases.append((_word_padded(normalizer(phrase)), rule_id))
+                for phrase in entry.get("exact", []):
+                    self._exact.setdefault(normalizer(phrase), []).append(rule_id)
+
+        self._automaton = AhoCorasick(phrases)
+        self._word_automaton = AhoCorasick(word_phrases)
+        logger.info(f"Rule engine compiled: {len(self.rules)} rules, {len(phrases)} keywords")
+
+    def scan(self, message: str, whole_words: bool = False) -> ScanResult:
+        """
+        Normalize ``message`` once and return every rule that fired.
+
+        With whole_words, a keyword only fires on word boundaries ("hi" does
+        not fire inside "philosophy").
+        """
+        text = self.normalizer(message)
+
+        if whole_words:
+            fired = self._word_automaton.find_all(_word_padded(text))
+        else:
+            fired = self._automaton.find_all(text)
+        exact = self._exact.get(text)
+        if exact:
+            fired.update(exact)
+
+        return ScanResult([self.rules[rule_id] for rule_id in sorted(fired)])
+
+
+class PatternSet:
+    """
+    Ordered regex patterns compiled into a single alternation.
+
+    Each alternative is anchored behind a lazy prefix, so one re.match
+    reports the same pattern (and capture) that the first successful
+    re.search over the list would have.
+    """
+
+    def __init__(self, patterns: List[str], flags: int = 0):
+        alternatives = []
+        self._first_group: Dict[str, int] = {}
+
+        group_index = 0
+        for i, pattern in enumerate(patterns):
+            groups = re.compile(pattern, flags).groups
+            name = f"p{i}"
+            alternatives.append(rf"[\s\S]*?(?P<{name}>{pattern})")
+            # Index of the pattern's own group 1 inside the combined regex
+            self._first_group[name] = group_index + 2 if groups else None
+            group_index += groups + 1
+
+        self.patterns = list(patterns)
+        self._regex = re.compile("|".join(alternatives), flags) if patterns else None
+
+    def search(self, text: str) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Return (pattern index, first capture group) of the highest-priority
+        pattern found in ``text``, or None.
+        """
+        if self._regex is None:
+            return None
+
+        match = self._regex.match(text)
+        if not match:
+            return None
+
+        name = match.lastgroup
+        first_group = self._first_group[name]
+        return int(name[1:]), match.group(first_group) if first_group else None
@@ -0,0 +1,533 @@
+"""
+Offline knowledge index used as a Wikipedia backend
+Builds a compact BM25 inverted index from an abstracts dump or title/abstract JSONL,
+and answers lookups from memory-mapped postings
+
+Build:
+    python knowledge_index.py build enwiki-latest-abstract.xml.gz --output knowledge_index
+    python knowledge_index.py build articles.jsonl --output knowledge_index
+Query:
+    python knowledge_index.py search knowledge_index "victor hugo"
+"""
+
+import re
+import gzip
+import json
+import mmap
+import time
+import hashlib
+import logging
+import argparse
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+
+# Title words count this many times in a document's term frequencies
+TITLE_WEIGHT = 3
+# Postings are sorted and spilled to disk every this many entries while building
+CHUNK_POSTINGS = 2_000_000
+# Terms in more documents than this also get a "champion list" of their
+# highest-impact postings, which bounds the work a common term costs a query
+CHAMPION_SIZE = 2000
+# Field and record separators of docs.bin, removed from the fields themselves
+FIELD_SEP = "\x1f"
+RECORD_SEP = b"\x1e"
+_SEPARATORS = str.maketrans({FIELD_SEP: " ", RECORD_SEP.decode("ascii"): " "})
+
+_TOKEN_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were what which who with
+au aux avec ce ces dans de des du elle en est et il ils la le les leur mais ne nous ou par pas pour qu que qui
+sa se ses son sur un une vous quoi c est
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-free word tokens without stopwords."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return [token for token in _TOKEN_RE.findall(text) if len(token) > 1 and token not in STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def title_key(title: str) -> str:
+    """Normalized form under which a title is found by an exact-title query."""
+    return " ".join(tokenize(title))
+
+
+def first_sentences(text: str, count: int = 3) -> str:
+    return " ".join(_SENTENCE_RE.split(text.strip())[:count])
+
+
+# -----------------------
+# Input readers
+# -----------------------
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_abstracts_xml(path: Path) -> Iterator[Dict]:
+    """Stream <doc> records of a Wikipedia *-abstract.xml(.gz) dump."""
+    import xml.etree.ElementTree as ET
+
+    with _open_text(path) as f:
+        for _, element in ET.iterparse(f, events=("end",)):
+            if element.tag != "doc":
+                continue
+            title = (element.findtext("title") or "").strip()
+            if title.startswith("Wikipedia: "):
+                title = title[len("Wikipedia: "):]
+            yield {
+                "title": title,
+                "abstract": (element.findtext("abstract") or "").strip(),
+                "url": (element.findtext("url") or "").strip(),
+            }
+            element.clear()
+
+
+def read_jsonl(path: Path) -> Iterator[Dict]:
+    """Stream {"title", "abstract" | "summary" | "text", "url"?} records."""
+    with _open_text(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid JSON on line {line_number} of {path}: {e}")
+                continue
+            yield {
+                "title": str(record.get("title", "")).strip(),
+                "abstract": str(record.get("abstract") or record.get("summary") or record.get("text") or "").strip(),
+                "url": str(record.get("url", "")).strip(),
+            }
+
+
+def read_records(path: Path) -> Iterator[Dict]:
+    name = path.name[:-3] if path.suffix == ".gz" else path.name
+    if name.endswith(".xml"):
+        return read_abstracts_xml(path)
+    return read_jsonl(path)
+
+
+# -----------------------
+# Build
+# -----------------------
+
+def build_champions(term_offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray, lengths: np.ndarray,
+                    k1: float, b: float, size: int):
+    """Top-``size`` postings by BM25 term impact for every term with more postings than that."""
+    avg_length = lengths.mean()
+    df = np.diff(term_offsets)
+    champion_terms = np.flatnonzero(df > size)
+
+    champion_docs, champion_tfs = [], []
+    for term in champion_terms:
+        start, end = term_offsets[term], term_offsets[term + 1]
+        term_docs, term_tfs = docs[start:end], tfs[start:end].astype(np.float64)
+        impact = term_tfs / (term_tfs + k1 * (1.0 - b + b * lengths[term_docs] / avg_length))
+        best = np.sort(np.argpartition(-impact, size)[:size])
+        champion_docs.append(term_docs[best])
+        champion_tfs.append(tfs[start:end][best])
+
+    if not champion_docs:
+        return champion_terms, np.zeros(1, dtype=np.int64), np.zeros(0, np.uint32), np.zeros(0, np.uint16)
+    offsets = np.arange(len(champion_terms) + 1, dtype=np.int64) * size
+    return champion_terms, offsets, np.concatenate(champion_docs), np.concatenate(champion_tfs)
+
+
+def merge_chunks(chunks: List[Path], output: Path):
+    """
+    Merge the sorted chunk files into postings_docs.npy and postings_tf.npy.
+
+    The output arrays are memory-mapped and filled one chunk at a time, so
+    only a single chunk is ever held in memory. Returns (terms, term_offsets).
+    """
+    chunk_terms, chunk_counts = [], []
+    for prefix in chunks:
+        terms, counts = np.unique(np.load(f"{prefix}-terms.npy", mmap_mode="r"), return_counts=True)
+        chunk_terms.append(terms)
+        chunk_counts.append(counts)
+
+    unique_terms = np.unique(np.concatenate(chunk_terms))
+    df = np.zeros(len(unique_terms), dtype=np.int64)
+    for terms, counts in zip(chunk_terms, chunk_counts):
+        df[np.searchsorted(unique_terms, terms)] += counts
+    term_offsets = np.zeros(len(unique_terms) + 1, dtype=np.int64)
+    np.cumsum(df, out=term_offsets[1:])
+    total = int(term_offsets[-1])
+
+    out_docs = np.lib.format.open_memmap(output / "postings_docs.npy", mode="w+", dtype=np.uint32, shape=(total,))
+    out_tfs = np.lib.format.open_memmap(output / "postings_tf.npy", mode="w+", dtype=np.uint16, shape=(total,))
+
+    # Chunks hold increasing doc ids, so appending them in order keeps each term's postings sorted by doc
+    filled = term_offsets[:-1].copy()
+    for prefix, terms, counts in zip(chunks, chunk_terms, chunk_counts):
+        positions = np.searchsorted(unique_terms, terms)
+        starts = np.repeat(filled[positions], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        destination = starts + within
+        out_docs[destination] = np.load(f"{prefix}-docs.npy")
+        out_tfs[destination] = np.load(f"{prefix}-tf.npy")
+        filled[positions] += counts
+        del starts, within, destination
+        for suffix in ("terms", "docs", "tf"):
+            Path(f"{prefix}-{suffix}.npy").unlink()
+
+    out_docs.flush()
+    out_tfs.flush()
+    del out_docs, out_tfs
+    return unique_terms, term_offsets
+
+
+def build_index(inputs: List[Path], output: Path, k1: float = 1.2, b: float = 0.75,
+                min_abstract_chars: int = 20, champion_size: int = CHAMPION_SIZE) -> Dict:
+    """
+    Build an index directory from one or more dumps.
+
+    Returns the index metadata that is also written to meta.json.
+    """
+    output.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+
+    chunk_terms, chunk_docs, chunk_tfs = array("Q"), array("I"), array("H")
+    chunks = []
+    doc_lengths = array("I")
+    doc_offsets = array("q", [0])
+    title_hashes = array("Q")
+
+    def flush():
+        # Each chunk is written sorted by (term, doc); doc ids only grow, so a stable sort on terms is enough
+        if chunk_terms:
+            terms = np.frombuffer(chunk_terms, dtype=np.uint64)
+            order = np.argsort(terms, kind="stable")
+            prefix = output / f"chunk-{len(chunks)}"
+            np.save(f"{prefix}-terms.npy", terms[order])
+            np.save(f"{prefix}-docs.npy", np.frombuffer(chunk_docs, dtype=np.uint32)[order])
+            np.save(f"{prefix}-tf.npy", np.frombuffer(chunk_tfs, dtype=np.uint16)[order])
+            chunks.append(prefix)
+            del terms, order
+            del chunk_terms[:], chunk_docs[:], chunk_tfs[:]
+
+    doc_id = 0
+    with open(output / "docs.bin", "wb") as docs_file:
+        for path in inputs:
+            logger.info(f"Indexing {path}...")
+            for record in read_records(path):
+                title, abstract = record["title"], record["abstract"]
+                if not title or len(abstract) < min_abstract_chars:
+                    continue
+
+                frequencies = {}
+                title_tokens = tokenize(title)
+                for token in title_tokens:
+                    frequencies[token] = frequencies.get(token, 0) + TITLE_WEIGHT
+                for token in tokenize(abstract):
+                    frequencies[token] = frequencies.get(token, 0) + 1
+                if not frequencies:
+                    continue
+
+                for token, tf in frequencies.items():
+                    chunk_terms.append(term_hash(token))
+                    chunk_docs.append(doc_id)
+                    chunk_tfs.append(min(tf, 65535))
+                doc_lengths.append(sum(frequencies.values()))
+                title_hashes.append(term_hash(" ".join(title_tokens)))
+
+                url = record["url"] or f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
+                fields = (title, first_sentences(abstract), url)
+                payload = FIELD_SEP.join(field.translate(_SEPARATORS) for field in fields).encode("utf-8") + RECORD_SEP
+                docs_file.write(payload)
+                doc_offsets.append(doc_offsets[-1] + len(payload))
+
+                doc_id += 1
+                if len(chunk_terms) >= CHUNK_POSTINGS:
+                    flush()
+                if doc_id % 100_000 == 0:
+                    logger.info(f"  {doc_id} documents indexed")
+    flush()
+
+    if not doc_id:
+        raise ValueError("No usable documents found in the input")
+
+    unique_terms, term_offsets = merge_chunks(chunks, output)
+    docs = np.load(output / "postings_docs.npy", mmap_mode="r")
+    tfs = np.load(output / "postings_tf.npy", mmap_mode="r")
+
+    lengths = np.frombuffer(doc_lengths, dtype=np.uint32)
+    np.save(output / "terms.npy", unique_terms)
+    np.save(output / "term_offsets.npy", term_offsets)
+    np.save(output / "doc_lengths.npy", lengths)
+    np.save(output / "doc_offsets.npy", np.frombuffer(doc_offsets, dtype=np.int64))
+
+    # Title table: documents sorted by the hash of their normalized title
+    title_hashes = np.frombuffer(title_hashes, dtype=np.uint64)
+    title_order = np.argsort(title_hashes, kind="stable")
+    np.save(output / "title_hashes.npy", title_hashes[title_order])
+    np.save(output / "title_docs.npy", title_order.astype(np.uint32))
+    del title_order
+
+    champion_terms, champion_offsets, champion_docs, champion_tfs = build_champions(
+        term_offsets, docs, tfs, lengths, k1, b, champion_size)
+    np.save(output / "champion_terms.npy", champion_terms)
+    np.save(output / "champion_offsets.npy", champion_offsets)
+    np.save(output / "champion_docs.npy", champion_docs)
+    np.save(output / "champion_tf.npy", champion_tfs)
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "documents": int(doc_id),
+        "terms": int(len(unique_terms)),
+        "postings": int(len(docs)),
+        "avg_doc_length": float(lengths.mean()),
+        "k1": k1,
+        "b": b,
+        "champion_size": champion_size,
+        "champion_terms": int(len(champion_terms)),
+        "title_weight": TITLE_WEIGHT,
+        "sources": [str(path) for path in inputs],
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build_seconds": round(time.time() - started, 1),
+    }
+    with open(output / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f"Index built in {output}: {meta['documents']} documents, {meta['terms']} terms, "
+                f"{meta['postings']} postings ({meta['build_seconds']}s)")
+    return meta
+
+
+# -----------------------
+# Lookup
+# -----------------------
+
+class KnowledgeIndex:
+    """
+    Read-only BM25 index over memory-mapped arrays.
+
+    Only the pages touched by a query are read, so resident memory stays
+    small and the OS shares the pages between worker processes.
+    """
+
+    def __init__(self, path, min_score: float = 1.0, min_coverage: float = 0.6,
+                 title_boost: float = 2.0):
+        """
+        Open an index directory.
+
+        Args:
+            path: Directory written by build_index
+            min_score: Best BM25 score below which a lookup reports nothing
+            min_coverage: Fraction of query terms the answer must contain
+            title_boost: Score multiplier of documents whose title is the query
+        """
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge index format: {self.meta.get('format_version')}")
+
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.title_boost = title_boost
+
+        def load(name):
+            return np.load(self.path / name, mmap_mode="r")
+
+        self.terms = load("terms.npy")
+        self.term_offsets = load("term_offsets.npy")
+        self.postings_docs = load("postings_docs.npy")
+        self.postings_tf = load("postings_tf.npy")
+        self.doc_lengths = load("doc_lengths.npy")
+        self.doc_offsets = load("doc_offsets.npy")
+        self.champion_terms = load("champion_terms.npy")
+        self.champion_offsets = load("champion_offsets.npy")
+        self.champion_docs = load("champion_docs.npy")
+        self.champion_tf = load("champion_tf.npy")
+        self.title_hashes = load("title_hashes.npy")
+        self.title_docs = load("title_docs.npy")
+
+        self._docs_file = open(self.path / "docs.bin", "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.documents = self.meta["documents"]
+        self.avg_doc_length = self.meta["avg_doc_length"]
+        self.k1 = self.meta["k1"]
+        self.b = self.meta["b"]
+
+    def document(self, doc_id: int) -> Dict:
+        start, end = int(self.doc_offsets[doc_id]), int(self.doc_offsets[doc_id + 1])
+        title, summary, url = self._docs[start:end - 1].decode("utf-8").split(FIELD_SEP)
+        return {"title": title, "summary": summary, "url": url}
+
+    def _term_position(self, token: str) -> Optional[int]:
+        key = np.uint64(term_hash(token))
+        position = int(np.searchsorted(self.terms, key))
+        if position >= len(self.terms) or self.terms[position] != key:
+            return None
+        return position
+
+    def _postings(self, token: str):
+        """
+        (docs, tfs, df, complete) for ``token``, or None when it is not indexed.
+
+        Common terms return their champion list, so ``complete`` is False and
+        documents missing from it may still contain the term.
+        """
+        position = self._term_position(token)
+        if position is None:
+            return None
+
+        start, end = int(self.term_offsets[position]), int(self.term_offsets[position + 1])
+        df = end - start
+        if df <= self.meta["champion_size"]:
+            return self.postings_docs[start:end], self.postings_tf[start:end], df, True
+
+        champion = int(np.searchsorted(self.champion_terms, position))
+        start, end = int(self.champion_offsets[champion]), int(self.champion_offsets[champion + 1])
+        return self.champion_docs[start:end], self.champion_tf[start:end], df, False
+
+    def _bm25(self, tfs, docs, df: int) -> np.ndarray:
+        idf = np.log(1.0 + (self.documents - df + 0.5) / (df + 0.5))
+        tf = tfs.astype(np.float64)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+        return idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+    def _title_matches(self, tokens: List[str]) -> np.ndarray:
+        """Documents whose normalized title is exactly the query."""
+        wanted = " ".join(tokens)
+        key = np.uint64(term_hash(wanted))
+        start = int(np.searchsorted(self.title_hashes, key, side="left"))
+        end = int(np.searchsorted(self.title_hashes, key, side="right"))
+        # The hash only narrows the range down; the stored titles decide
+        docs = [int(doc) for doc in self.title_docs[start:end]
+                if title_key(self.document(int(doc))["title"]) == wanted]
+        return np.array(sorted(docs), dtype=np.int64)
+
+    def _exact_scores(self, tokens: List[str], docs: np.ndarray) -> np.ndarray:
+        """Full BM25 of ``docs``, read from the complete postings rather than champion lists."""
+        scores = np.zeros(len(docs))
+        for token in tokens:
+            position = self._term_position(token)
+            if position is None:
+                continue
+            start, end = int(self.term_offsets[position]), int(self.term_offsets[position + 1])
+            term_docs = self.postings_docs[start:end]
+            found = np.minimum(np.searchsorted(term_docs, docs), end - start - 1)
+            present = term_docs[found] == docs
+            if present.any():
+                tfs = self.postings_tf[start:end][found[present]]
+                scores[present] += self._bm25(tfs, docs[present], end - start)
+        return scores
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Top documents for ``query`` with their BM25 score."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        doc_parts, score_parts = [], []
+        partial = 0
+        for token in tokens:
+            postings = self._postings(token)
+            if postings is None:
+                continue
+            docs, tfs, df, complete = postings
+            if not complete:
+                partial += 1
+
+            doc_parts.append(np.asarray(docs))
+            score_parts.append(self._bm25(tfs, docs, df))
+
+        if not doc_parts:
+            return []
+
+        candidates, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        matched = np.bincount(inverse)
+
+        # Absence from a champion list proves nothing, so only complete terms are required
+        required = int(np.ceil(self.min_coverage * len(tokens))) - partial
+        enough = matched >= max(1, required)
+        candidates, scores = candidates[enough], scores[enough]
+
+        # An exact title match is what "who is X" questions are after; it is
+        # scored even when a champion list left it out of the candidates
+        titles = self._title_matches(tokenize(query))
+        if len(titles):
+            others = ~np.isin(candidates, titles)
+            candidates = np.concatenate([candidates[others], titles])
+            scores = np.concatenate([scores[others], self._exact_scores(tokens, titles) * self.title_boost])
+        if not len(candidates):
+            return []
+
+        results = []
+        for index in np.argsort(-scores, kind="stable")[:limit]:
+            document = self.document(int(candidates[index]))
+            document["score"] = float(scores[index])
+            results.append(document)
+        return results
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """Best article for ``query`` in the {"title", "summary", "url"} shape, or None."""
+        results = self.search(query, limit=1)
+        if not results or results[0]["score"] < self.min_score:
+            return None
+        return results[0]
+
+    def close(self):
+        self._docs.close()
+        self._docs_file.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Offline knowledge index for the chatbot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build an index from dumps")
+    build.add_argument("inputs", nargs="+", type=Path, help="*-abstract.xml(.gz) dumps or JSONL files")
+    build.add_argument("--output", type=Path, default=Path("knowledge_index"))
+    build.add_argument("--k1", type=float, default=1.2)
+    build.add_argument("--b", type=float, default=0.75)
+
+    search = commands.add_parser("search", help="Query an index")
+    search.add_argument("index", type=Path)
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        meta = build_index(args.inputs, args.output, k1=args.k1, b=args.b)
+        print(json.dumps(meta, indent=2))
+        return
+
+    index = KnowledgeIndex(args.index)
+    started = time.perf_counter()
+    results = index.search(args.query, limit=args.limit)
+    elapsed = (time.perf_counter() - started) * 1000
+    for result in results:
+        print(f"{result['score']:8.2f}  {result['title']}  {result['url']}")
+        print(f"          {result['summary'][:120]}")
+    print(f"{len(results)} results in {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Prometheus metrics
+Histograms and counters recorded along the chat pipeline and exposed at
+/metrics in the Prometheus text format.
+
+With METRICS_DIR set (gunicorn.conf.py does), every process keeps its values
+in its own memory-mapped file there: recording stays a memory write, and a
+scrape of any worker sums the files of all of them. Files of exited workers
+are kept so counters never go backwards. Without METRICS_DIR the values live
+in this process only. METRICS_ENABLED=false turns recording into no-ops.
+"""
+
+import os
+import mmap
+import json
+import glob
+import inspect
+import struct
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from a cached classification (~10µs) to a slow Wikipedia call
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_FILE_PREFIX = "metrics_"
+_HEADER = struct.Struct("<I4x")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+class _LocalValues:
+    """Values of this process only."""
+
+    def __init__(self):
+        self.values = []
+        self._offsets = {}
+        self.lock = threading.Lock()
+
+    def offset(self, key):
+        with self.lock:
+            if key not in self._offsets:
+                self._offsets[key] = len(self.values)
+                self.values.append(0.0)
+            return self._offsets[key]
+
+    def items(self):
+        with self.lock:
+            return [(key, self.values[offset]) for key, offset in self._offsets.items()]
+
+
+class _FileValues:
+    """
+    Values of this process in METRICS_DIR/metrics_<pid>.db: a used-size
+    header, then (key length, key, padding to 8 bytes, float64) entries.
+    An entry is written before the header grows to include it, so readers
+    in other processes never parse a partial one. ``values`` views the file
+    as float64s: an offset is the index of the value, not its byte position.
+    """
+
+    def __init__(self, directory, initial_size=64 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{_FILE_PREFIX}{os.getpid()}.db")
+        self.lock = threading.Lock()
+        self._file = open(self.path, "w+b")
+        self._file.truncate(initial_size)
+        self._map = mmap.mmap(self._file.fileno(), initial_size)
+        self.values = memoryview(self._map).cast("d")
+        # Maps outgrown by the file; a view still exported keeps them from being closed
+        self._retired = []
+        self._used = _HEADER.size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets = {}
+
+    def _grow(self, end):
+        size = len(self._map)
+        while size < end:
+            size *= 2
+        self._file.truncate(size)
+        self._retired.append((self._map, self.values))
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self.values = memoryview(self._map).cast("d")
+
+    def offset(self, key):
+        with self.lock:
+            if key in self._offsets:
+                return self._offsets[key]
+
+            encoded = key.encode("utf-8")
+            value_at = self._used + _KEY_LENGTH.size + len(encoded)
+            value_at += -value_at % 8
+            end = value_at + _VALUE.size
+            if end > len(self._map):
+                self._grow(end)
+
+            _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+            self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+            _VALUE.pack_into(self._map, value_at, 0.0)
+            self._used = end
+            _HEADER.pack_into(self._map, 0, self._used)
+            self._offsets[key] = value_at // _VALUE.size
+            return self._offsets[key]
+
+    def items(self):
+        return read_values_file(self.path)
+
+
+def read_values_file(path):
+    """(key, value) entries of a metrics file written by any process."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return []
+
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    entries = []
+    position = _HEADER.size
+    while position + _KEY_LENGTH.size <= used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        key_at = position + _KEY_LENGTH.size
+        value_at = key_at + length
+        value_at += -value_at % 8
+        if value_at + _VALUE.size > used:
+            break
+        entries.append((data[key_at:key_at + length].decode("utf-8"), _VALUE.unpack_from(data, value_at)[0]))
+        position = value_at + _VALUE.size
+    return entries
+
+
+def clear_metrics_dir(directory=METRICS_DIR):
+    """Remove the files of a previous run (called by gunicorn.conf.py before any worker starts)."""
+    for path in glob.glob(os.path.join(directory, f"{_FILE_PREFIX}*.db")):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove metrics file {path}: {e}")
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def _store():
+    """Value store of the current process, created on first use."""
+    global _values
+    if _values is None:
+        with _values_lock:
+            if _values is None:
+                _values = _FileValues(METRICS_DIR) if METRICS_DIR else _LocalValues()
+    return _values
+
+
+def _forget_store():
+    # A forked worker records into its own file, not the master's
+    global _values
+    _values = None
+
+
+os.register_at_fork(after_in_child=_forget_store)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._add_child(values)
+        return child
+
+    def _add_child(self, values):
+        labels = tuple(str(value) for value in values)
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labels}")
+        with self._lock:
+            child = self._children.get(labels)
+            if child is None:
+                child = self._children[labels] = self._child(labels)
+            # Also found under the values as passed (e.g. None) next time
+            self._children[values] = child
+        return child
+
+    def _key(self, sample, values):
+        return json.dumps([self.name, sample, values], ensure_ascii=False)
+
+
+class _Child:
+    """Resolves its value offsets once per process."""
+
+    __slots__ = ("_keys", "_store", "_offsets")
+
+    def __init__(self, keys):
+        self._keys = keys
+        self._store = None
+        self._offsets = None
+
+    def _resolve(self):
+        store = _store()
+        if store is not self._store:
+            self._offsets = [store.offset(key) for key in self._keys]
+            self._store = store
+        return store
+
+
+class _CounterChild(_Child):
+    __slots__ = ()
+
+    def inc(self, amount=1.0):
+        if not METRICS_ENABLED:
+            return
+        store = _values
+        if store is None or store is not self._store:
+            store = self._resolve()
+        # Explicit acquire/release costs half a with block; the adds cannot raise
+        store.lock.acquire()
+        store.values[self._offsets[0]] += amount
+        store.lock.release()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self, values):
+        return _CounterChild([self._key("total", values)])
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def samples(self, values):
+        for (sample, labels), value in sorted(values.items()):
+            yield self.name, labels, value
+
+
+class _HistogramChild(_Child):
+    __slots__ = ("_bounds",)
+
+    def __init__(self, keys, bounds):
+        super().__init__(keys)
+        self._bounds = bounds
+
+    def observe(self, seconds):
+        if not METRICS_ENABLED:
+            return
+        store = _values
+        if store is None or store is not self._store:
+            store = self._resolve()
+        offsets = self._offsets
+        bucket = offsets[bisect_left(self._bounds, seconds)]
+        store.lock.acquire()
+        values = store.values
+        values[bucket] += 1.0
+        values[offsets[-1]] += seconds
+        store.lock.release()
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager observing the time spent in its block."""
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(perf_counter() - self._started)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _child(self, values):
+        # One count per bucket, +Inf included, then the sum; not cumulative, so an
+        # observation is one add, and _count is the +Inf bucket at exposition
+        keys = [self._key(f"b{i}", values) for i in range(len(self.buckets) + 1)]
+        keys.append(self._key("sum", values))
+        return _HistogramChild(keys, self.buckets)
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def samples(self, values):
+        series = {}
+        for (sample, labels), value in values.items():
+            series.setdefault(labels, {})[sample] = value
+
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        for labels in sorted(series):
+            data = series[labels]
+            cumulative = 0.0
+            for i, bound in enumerate(bounds):
+                cumulative += data.get(f"b{i}", 0.0)
+                yield f"{self.name}_bucket", labels + (("le", bound),), cumulative
+            yield f"{self.name}_sum", labels, data.get("sum", 0.0)
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def collect(self):
+        """{metric name: {(sample, labels): value}} summed over every process."""
+        if METRICS_DIR:
+            entries = []
+            for path in glob.glob(os.path.join(METRICS_DIR, f"{_FILE_PREFIX}*.db")):
+                try:
+                    entries.extend(read_values_file(path))
+                except OSError as e:
+                    logger.warning(f"Could not read metrics file {path}: {e}")
+        else:
+            entries = _store().items()
+
+        collected = {}
+        for key, value in entries:
+            name, sample, values = json.loads(key)
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            labels = tuple(zip(metric.labelnames, values))
+            series = collected.setdefault(name, {})
+            series[(sample, labels)] = series.get((sample, labels), 0.0) + value
+        return collected
+
+    def generate_latest(self):
+        """Every metric in the Prometheus text exposition format."""
+        collected = self.collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, labels, value in metric.samples(collected.get(name, {})):
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+REGISTRY = Registry()
+
+
+def generate_latest():
+    return REGISTRY.generate_latest()
+
+
+# -----------------------
+# Chat pipeline metrics
+# -----------------------
+
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of the chat pipeline (stages may nest)",
+    ["stage"],
+)
+MESSAGE_SECONDS = Histogram(
+    "chatbot_message_seconds",
+    "Time to answer a message in chatbot_enhanced, by outcome",
+    ["outcome"],
+)
+MESSAGES = Counter(
+    "chatbot_messages_total",
+    "Messages handled by chatbot_enhanced, by outcome",
+    ["outcome"],
+)
+INTENTS = Counter(
+    "chatbot_intents_total",
+    "Answered sub-questions, by intent and the handler that answered",
+    ["intent", "handler"],
+)
+SESSION_LOCK_WAIT_SECONDS = Histogram(
+    "chatbot_session_lock_wait_seconds",
+    "Time waiting for the session store lock when another thread held it, by operation",
+    ["operation"],
+)
+SESSIONS_REMOVED = Counter(
+    "chatbot_sessions_removed_total",
+    "Sessions dropped from the store: expired, or evicted least recently used first by the session or memory cap",
+    ["reason"],
+)
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    """Context manager timing a pipeline stage."""
+    if not METRICS_ENABLED:
+        return _NO_STAGE
+    return STAGE_SECONDS.labels(name).time()
+
+
+def timed(name):
+    """Decorator timing every call of a function (or coroutine function) as a pipeline stage."""
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        child = STAGE_SECONDS.labels(name)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(perf_counter() - started)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def record_message(outcome, seconds):
+    MESSAGES.labels(outcome).inc()
+    MESSAGE_SECONDS.labels(outcome).observe(seconds)
@@ -1,109 +1,78 @@
-import nltk
-from nltk.tokenize import word_tokenize
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from data import reponses,questions, labels,ops
+from data import reponses,questions, labels,ops, bot_bundle, intents_file, rules_file, load_intents
 from handle_functions import *
+from batching import MicroBatcher
+from compiled_model import CompiledClassifier
+from bundle import BUNDLE_PATH, build_bundle, file_sha256, open_bundle
+from preprocessing import preprocessor, PREPROCESSING_VERSION
+from handler_pipeline import HandlerPipeline, Fragment, COST_LOCAL, COST_MODEL, COST_NETWORK, COST_FALLBACK
+from metrics import stage, timed, record_message, INTENTS
 import re
 import random
+import itertools
 import pickle
 import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 from pathlib import Path
-
-import ssl
+import numpy as np
 import os
 
-
-
-
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
-# Set NLTK data path for deployment
-nltk_data_dir = os.path.join(os.getcwd(), 'nltk_data')
-if not os.path.exists(nltk_data_dir):
-    os.makedirs(nltk_data_dir)
-nltk.data.path.append(nltk_data_dir)
-
-# Download required NLTK data with error handling
-print("Downloading NLTK data...")
-datasets = ['punkt', 'punkt_tab', 'stopwords', 'wordnet', 'omw-1.4']
-
-for dataset in datasets:
-    try:
-        nltk.data.find(f'tokenizers/{dataset}')
-        print(f"{dataset} already downloaded")
-    except LookupError:
-        try:
-            nltk.data.find(f'corpora/{dataset}')
-            print(f"{dataset} already downloaded")
-        except LookupError:
-            print(f"Downloading {dataset}...")
-            nltk.download(dataset, download_dir=nltk_data_dir)
-            print(f"{dataset} downloaded successfully!")
-
-print("All NLTK data ready!")
-
-
-
-
-
-
+# sklearn and NLTK are slow to import: sklearn is only loaded to train or when no
+# current bundle (bundle.py) exists, NLTK by warm_up() (see preprocessing.py).
+# Nothing here downloads data; run provision_nltk.py when deploying.
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
-MODEL_VERSION = os.getenv('MODEL_VERSION', '1.1.0')
 MODEL_DIR = Path("models")
 MODEL_PATH = MODEL_DIR / "chatbot_model.pkl"
+# The served model is the bundle at BUNDLE_PATH, whose version identifies it
 
-# Initialize
-stop_words = set(stopwords.words("french")) | set(stopwords.words("english"))
-lemmatizer = WordNetLemmatizer()
+# Serve predictions from the compiled classifier (the bundle's) instead of sklearn
+COMPILED_INFERENCE = os.getenv('COMPILED_INFERENCE', 'true').lower() in ('1', 'true', 'yes')
 
+# Micro-batching of concurrent classification requests
+INFERENCE_BATCHING = os.getenv('INFERENCE_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '32'))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', '2'))
 
+# Number of normalized messages whose classification is kept in memory (0 disables)
+CLASSIFICATION_CACHE_SIZE = int(os.getenv('CLASSIFICATION_CACHE_SIZE', '10000'))
 
+# A classifier prediction at least this confident answers before any network handler runs
+PIPELINE_CONFIDENCE = float(os.getenv('PIPELINE_CONFIDENCE', '0.6'))
 
+# Hot reload: seconds between checks of the model files (0 disables the watcher). A new
+# model replaces the served one only if its accuracy on its training patterns reaches
+# RELOAD_MIN_ACCURACY and is at most RELOAD_MAX_ACCURACY_DROP below the served model's
+MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', '5'))
+RELOAD_MIN_ACCURACY = float(os.getenv('RELOAD_MIN_ACCURACY', '0.5'))
+RELOAD_MAX_ACCURACY_DROP = float(os.getenv('RELOAD_MAX_ACCURACY_DROP', '0.05'))
 
-def preprocess(text):
-    try:
-        text = text.lower()
-        text = re.sub(r"[^\w\s]", "", text)
-        words = text.split()
-        if len(words) <= 3:
-            words = [lemmatizer.lemmatize(w) for w in words]
-        else:
-            words = [lemmatizer.lemmatize(w) for w in words if w not in stop_words]
-        return " ".join(words)
-    except Exception as e:
-        logger.error(f"Error in preprocess: {e}")
-        return text.lower()
-
-
+# Online learning (online_model.py): serve a model learned from intents.json itself, updated
+# in place when patterns or intents are added and refit from scratch every
+# ONLINE_REFIT_INTERVAL seconds after an update (0 disables). Replaces the bundle/pickle model.
+ONLINE_LEARNING = os.getenv('ONLINE_LEARNING', 'false').lower() in ('1', 'true', 'yes')
+ONLINE_REFIT_INTERVAL = float(os.getenv('ONLINE_REFIT_INTERVAL', '3600'))
 
 # -----------------------
 # Text preprocessing
 # -----------------------
-def nettoyer(text):
+# Training, evaluation and inference all go through preprocessing.preprocessor
 
-    try:
-        text = text.lower()
-        text = re.sub(r"[^\w\s]", "", text)
-        tokens = word_tokenize(text)
-        return " ".join(tokens)
-    except Exception as e:
-        logger.error(f"Error in nettoyer: {e}")
-        return text.lower()
+def preprocess(text):
+    return preprocessor(text)
 
 
+def nettoyer(text):
+    return preprocessor(text)
+
+
+@timed("split")
 def split_questions(text):
     # Split by common delimiters: '.', '?', '!', 'et', ','
     sentences = re.split(r'[?.!]| et |,', text)
@@ -117,6 +86,7 @@ def split_questions(text):
 # -----------------------
 import operator
 
+@timed("calculator")
 def calc(expr):
     try:
         # Remove spaces
@@ -141,39 +111,29 @@ def calc(expr):
 # Train ML model
 # -----------------------
 
-def train_model():
+def train_model(texts=None, targets=None, params=None):
+    """
+    Fit the vectorizer and classifier, by default on every loaded pattern
+    with the served settings (training.DEFAULT_PARAMS).
+    """
     
     logger.info("Training model...")
     
     try:
+        from training import fit
+
         # questions and labels are already loaded!
-        X = [preprocess(x) for x in questions]
-
-        vectorizer = TfidfVectorizer(
-                analyzer="char_wb",
-                ngram_range=(1, 3),
-                max_df=0.8,
-                min_df=1,
-                max_features=5000,
-            )
-        X_vec = vectorizer.fit_transform(X)
-
-        model = LogisticRegression(
-            max_iter=2000,  # Increased iterations
-            C=1.0,  # Regularization
-            class_weight='balanced',  # Handle imbalanced classes
-            random_state=42
-        )
-        model.fit(X_vec, labels)
-
-        return vectorizer, model
+        if texts is None:
+            texts, targets = questions, labels
+
+        return fit(preprocessor.transform(texts), targets, params)
     except Exception as e:
         logger.error(f"Error training model: {e}")
         raise
 
 
-def save_model(vectorizer, model, path=MODEL_PATH):
-    
+def save_model(vectorizer, model, path=MODEL_PATH, version=None):
+    """Pickle a trained model and, for the served path, rebuild the bundle from it."""
     try:
         # Create directory if it doesn't exist
         path.parent.mkdir(parents=True, exist_ok=True)
@@ -183,18 +143,22 @@ def save_model(vectorizer, model, path=MODEL_PATH):
             pickle.dump({
                 'vectorizer': vectorizer,
                 'model': model,
-                'version': MODEL_VERSION
+                'version': version,
+                'preprocessing': PREPROCESSING_VERSION
             }, f)
 
         logger.info(f"Model saved to {path}")
 
+        if path == MODEL_PATH:
+            export_bundle(CompiledClassifier.from_sklearn(vectorizer, model), version)
+
     except Exception as e:
         logger.error(f"Error saving model: {e}")
         raise
 
 
-def load_model(path=MODEL_PATH):
-    
+def load_pickled_model(path=MODEL_PATH):
+    """Returns (vectorizer, model, version), or None when the pickle is missing or unreadable."""
     try:
         if not path.exists():
             logger.warning(f"Model file not found at {path}")
@@ -203,109 +167,648 @@ def load_model(path=MODEL_PATH):
         with open(path, 'rb') as f:
             data = pickle.load(f)
 
-        logger.info(f"Model loaded from {path} (version: {data.get('version', 'unknown')})")
-        return data['vectorizer'], data['model']
+        version = data.get('version') or file_sha256(path)[:12]
+        logger.info(f"Model loaded from {path} (version: {version})")
+
+        preprocessing = data.get('preprocessing', '1')
+        if preprocessing != PREPROCESSING_VERSION:
+            logger.warning(f"Model was trained with preprocessing {preprocessing}, serving with "
+                           f"{PREPROCESSING_VERSION}; retrain it (train_model_script.py) for matching features")
+        return data['vectorizer'], data['model'], version
 
     except Exception as e:
         logger.error(f"Error loading model: {e}")
         return None
 
 
-def get_or_train_model():
+class ServedModel:
+    """
+    One loaded model version: classifier, responses and version. Inference
+    reads ``served_model`` once per call and a reload swaps that single
+    reference, so in-flight requests finish on the model they started with.
+    """
+
+    def __init__(self, version, compiled=None, vectorizer=None, model=None, responses=None,
+                 bundle=None, source="none", fingerprint=None, patterns=None):
+        self.version = version
+        # CompiledClassifier, or OnlineIntentClassifier for source "online"
+        self.compiled = compiled
+        self.vectorizer = vectorizer
+        self.model = model
+        self.responses = reponses if responses is None else responses
+        self.bundle = bundle
+        self.patterns = patterns
+        self.source = source
+        # Identifies the artifact, so an unchanged file is not reloaded
+        self.fingerprint = fingerprint
+        self.loaded_at = datetime.utcnow().isoformat()
+
+    def ready(self):
+        return self.compiled is not None or (self.vectorizer is not None and self.model is not None)
+
+    def predict_proba(self, cleaned):
+        """Returns (probabilities, classes) for already-normalized texts."""
+        if self.compiled is not None:
+            with stage("vectorize"):
+                features = self.compiled.transform(cleaned)
+            with stage("predict_proba"):
+                return self.compiled.predict_proba(cleaned, features), self.compiled.classes_
+
+        with stage("vectorize"):
+            features = self.vectorizer.transform(cleaned)
+        with stage("predict_proba"):
+            return self.model.predict_proba(features), self.model.classes_
+
+    def smoke_set(self):
+        """Training patterns and labels the model was built from."""
+        if self.patterns is not None:
+            return self.patterns
+        if self.bundle is not None:
+            return self.bundle.patterns()
+        return questions, labels
+
+    def get_info(self):
+        info = {
+            "version": self.version,
+            "source": self.source,
+            "compiled": self.compiled is not None,
+            "loaded_at": self.loaded_at,
+        }
+        if self.source == "online":
+            info["online"] = self.compiled.get_stats()
+        return info
+
+
+def load_model(bundle=bot_bundle, source=MODEL_PATH):
+    """
+    The bundle's model, or None when there is no bundle or it was built
+    from another pickle than the one at ``source``.
+    """
+    try:
+        if bundle is None:
+            return None
+
+        if not bundle.is_current({"model": source}):
+            logger.info(f"Bundle {bundle.path} is out of date with {source}")
+            return None
+
+        compiled = CompiledClassifier.from_arrays(bundle.classifier_arrays())
+
+        preprocessing = bundle.meta.get("preprocessing", "1")
+        if preprocessing != PREPROCESSING_VERSION:
+            logger.warning(f"Model was trained with preprocessing {preprocessing}, serving with "
+                           f"{PREPROCESSING_VERSION}; retrain it (train_model_script.py) for matching features")
+
+        # Responses come with the bundle unless the intents changed since it was built
+        responses = None
+        if bundle.is_current({"intents": intents_file, "rules": rules_file}):
+            responses = bundle.responses()
+
+        logger.info(f"Model loaded from bundle {bundle.path} (version: {bundle.version})")
+        return ServedModel(bundle.version, compiled=compiled, responses=responses, bundle=bundle,
+                           source="bundle", fingerprint=f"{bundle.version}:{bundle.checksum}")
+
+    except Exception as e:
+        logger.error(f"Error loading model from bundle: {e}")
+        return None
+
+
+def get_or_train_model(train=True):
     
     # Try to load existing model
-    result = load_model()
+    result = load_pickled_model()
 
-    if result:
+    if result or not train:
         return result
 
     # Model doesn't exist, train new one
     logger.info("No saved model found, training new model...")
-    vectorizer, model = train_model(intents)
+    vectorizer, model = train_model()
 
     # Save for next time
     save_model(vectorizer, model)
 
-    return vectorizer, model
+    return vectorizer, model, file_sha256(MODEL_PATH)[:12]
 
 
-# Initialize model (load or train)
+def compile_model(vectorizer, model):
+    
+    try:
+        compiled = CompiledClassifier.from_sklearn(vectorizer, model)
+        logger.info(f"Compiled classifier ready ({len(compiled.terms)} features, {len(compiled.classes_)} classes)")
+        return compiled
+    except Exception as e:
+        logger.warning(f"Could not compile model, using sklearn inference: {e}")
+        return None
+
+
+def export_bundle(compiled, version=None, path=BUNDLE_PATH, source=MODEL_PATH):
+    """Write the bundle for a compiled classifier, tied to the pickle it came from."""
+    try:
+        version = build_bundle(compiled, path, version=version, model_path=source)
+        logger.info(f"Bundle {version} written to {path}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not write bundle: {e}")
+        return False
+
+
+def load_served_model(bundle, train=True):
+    """
+    Load the model on disk: the bundle when it is current, else the pickle
+    (trained first when there is none and ``train`` is set).
+    Returns a ServedModel, or None when nothing could be loaded.
+    """
+    if COMPILED_INFERENCE:
+        served = load_model(bundle)
+        if served is not None:
+            return served
+
+    result = get_or_train_model(train=train)
+    if result is None:
+        return None
+    vectorizer, model, version = result
+
+    compiled = None
+    if COMPILED_INFERENCE:
+        compiled = compile_model(vectorizer, model)
+        # Next start can skip sklearn
+        if compiled is not None and MODEL_PATH.exists():
+            export_bundle(compiled, version)
+
+    return ServedModel(version, compiled=compiled, vectorizer=vectorizer, model=model,
+                       source="pickle", fingerprint=file_sha256(MODEL_PATH))
+
+
+_online_versions = itertools.count(1)
+
+
+def load_online_model(previous=None, refit=False):
+    """
+    Online model for the intents on disk: a copy of ``previous``'s classifier
+    updated with the patterns added since, or a full refit when there is no
+    online model yet, patterns were removed or ``refit`` is set. ``previous``
+    itself is returned when intents.json did not change.
+    Returns a ServedModel, or None when the model could not be built.
+    """
+    try:
+        fingerprint = file_sha256(intents_file)
+        if previous is not None and previous.source == "online" and not refit \
+                and fingerprint == previous.fingerprint:
+            return previous
+
+        from online_model import OnlineIntentClassifier
+
+        started = time.perf_counter()
+        texts, intent_labels, responses, _, _ = load_intents()
+        cleaned = preprocessor.transform(texts)
+
+        if previous is not None and previous.source == "online" and not refit:
+            # The served classifier keeps answering while its copy learns
+            classifier = previous.compiled.copy()
+            mode = classifier.update_from_catalog(cleaned, intent_labels)
+        else:
+            classifier = OnlineIntentClassifier().fit(cleaned, intent_labels)
+            mode = "refit"
+
+        version = f"online-{(fingerprint or 'default')[:8]}.{next(_online_versions)}"
+        logger.info(f"Online model {version} ready ({mode}, {len(classifier.classes_)} intents, "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms)")
+        return ServedModel(version, compiled=classifier, responses=responses, source="online",
+                           fingerprint=fingerprint, patterns=(texts, intent_labels))
+
+    except Exception as e:
+        logger.error(f"Error building online model: {e}")
+        return None
+
+
+# Initialize model: the bundle when it is current, else the pickle (or train);
+# with ONLINE_LEARNING, a model fitted on intents.json
 try:
-    vectorizer, model = get_or_train_model()
+    if ONLINE_LEARNING:
+        served_model = load_online_model() or ServedModel("unknown")
+    else:
+        served_model = load_served_model(bot_bundle) or ServedModel("unknown")
 except Exception as e:
     logger.error(f"Failed to initialize model: {e}")
-    vectorizer, model = None, None
+    served_model = ServedModel("unknown")
+
 
+def model_ready():
+    return served_model.ready()
+
+
+# -----------------------
+# Classification cache
+# -----------------------
+
+class ClassificationCache:
+    """
+    Bounded, thread-safe LRU cache of classifier outputs keyed on the
+    normalized message. Entries belong to one model version and are
+    dropped as soon as a different version is seen.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            if self._entries:
+                logger.info(f"Model version changed ({self.version} -> {version}), clearing classification cache")
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get_many(self, keys, version):
+        """Return {key: (intent, probability)} for the keys that are cached."""
+        found = {}
+        if self.max_size <= 0:
+            return found
+
+        with self._lock:
+            self._check_version(version)
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = value
+        return found
+
+    def get(self, key, version):
+        return self.get_many([key], version).get(key)
+
+    def put_many(self, items, version):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "model_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+classification_cache = ClassificationCache(max_size=CLASSIFICATION_CACHE_SIZE)
 
 
 # -----------------------
 # Chatbot response function
 # -----------------------
 
-def rule_based_intent(message):
+def rule_based_intent(message, scan=None):
     
     try:
-        msg = normalize_text(message)
+        # Keyword tables live in rules.json; list order is the priority
+        if scan is None:
+            scan = rule_engine.scan(message)
+        return scan.first("intent")
+
+    except Exception as e:
+        logger.error(f"Error in rule_based_intent: {e}")
+
+    return None
+
+
+def _predict_clean(cleaned, served=None):
+    """
+    Run the classifier on already-normalized texts and cache the results.
+    Returns a list of (intent, probability) tuples aligned with ``cleaned``.
+    """
+    if not cleaned:
+        return []
+
+    served = served or served_model
+    if not served.ready():
+        logger.error("Model not loaded! Cannot classify batch.")
+        return [(None, 0.0) for _ in cleaned]
+
+    unique = list(dict.fromkeys(cleaned))
+
+    probas, classes = served.predict_proba(unique)
+    best = probas.argmax(axis=1)
+
+    predictions = {
+        text: (str(classes[index]), float(proba[index]))
+        for text, proba, index in zip(unique, probas, best)
+    }
+    # After a reload, results of the previous model must not reset the cache
+    if served is served_model:
+        classification_cache.put_many(predictions.items(), served.version)
+
+    return [predictions[text] for text in cleaned]
+
+
+def classify_batch(texts):
+    """
+    Classify several messages with a single vectorizer/predict_proba call.
+
+    Returns a list of (intent, probability) tuples aligned with ``texts``.
+    Messages that normalize to the same text are only featurized once, and
+    previously seen messages are answered from the classification cache.
+    """
+    if not texts:
+        return []
+
+    served = served_model
+    with stage("preprocess"):
+        cleaned = preprocessor.transform(texts)
+    unique = list(dict.fromkeys(cleaned))
+
+    with stage("classification_cache"):
+        predictions = classification_cache.get_many(unique, served.version)
+    missing = [text for text in unique if text not in predictions]
+    if missing:
+        # Cache misses share a batch with concurrent requests when INFERENCE_BATCHING is enabled
+        if INFERENCE_BATCHING:
+            computed = classifier_batcher.submit_many(missing)
+        else:
+            computed = _predict_clean(missing, served)
+        predictions.update(zip(missing, computed))
+
+    logger.debug(f"classify_batch: {len(texts)} texts, {len(unique)} unique, {len(missing)} computed")
+
+    return [predictions[text] for text in cleaned]
+
+
+def seed_classification_cache():
+    """Pre-compute the classification of every training pattern."""
+    served = served_model
+    if not served.ready() or CLASSIFICATION_CACHE_SIZE <= 0:
+        return 0
+
+    try:
+        patterns = list(dict.fromkeys(preprocessor.transform(served.smoke_set()[0])))
+        _predict_clean(patterns, served)
+        logger.info(f"Classification cache seeded with {len(patterns)} patterns")
+        return len(patterns)
+    except Exception as e:
+        logger.error(f"Error seeding classification cache: {e}")
+        return 0
 
-        if any(expr in msg for expr in ["hello", "hi", "hey", "bonjour", "salut","good morning", "good afternoon" ]):
-            return "greeting"
 
-        if any(expr in msg for expr in ["how are you", "comment ça va", "ça va", "what's up", "comment ca va","ca va","how are you","how are you doing","whats up"]):
-            return "etat"
+def warm_up():
+    """
+    Load everything the first request would otherwise wait for: NLTK
+    resources, the classification of every training pattern and the
+    Wikipedia HTTP session. Run in the background after startup.
+    """
+    started = time.perf_counter()
+    preprocessor.load()
+    # Training patterns are the most frequent messages, so start with them cached
+    seed_classification_cache()
+    wikipedia_client.warm_up()
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
 
-        if any(expr in msg for expr in ["who are you", "qui es-tu", "que fais-tu", "what do you do"]):
-            return "about"
 
-        if any(word in msg for word in ["horaire", "horaires", "heure", "ouvrir", "fermer","opening hours", "working hours"]):
-            return "horaire"
+# -----------------------
+# Hot reload
+# -----------------------
 
-        if any(word in msg for word in ["help", "aide", "assist"]):
-            return "help"
+_reload_lock = threading.Lock()
+# Outcome of the last reload attempt, reported by /health
+last_reload = None
 
-        if any(word in msg for word in ["contact", "email", "téléphone", "numero","phone"]):
-            return "contact"
-        # Thanks
-        if any(word in msg for word in ["thank", "thanks", "merci", "thx"]):
-            return "thanks"
 
-        # Joke
-        if any(expr in msg for expr in ["tell me a joke", "joke", "make me laugh", "something funny"]):
-            return "joke"
+def _smoke_accuracy(served, texts, expected):
+    """Accuracy on normalized texts, None when the probabilities are unusable."""
+    probas, classes = served.predict_proba(texts)
+    if probas.shape != (len(texts), len(classes)) or not np.all(np.isfinite(probas)) \
+            or not np.allclose(probas.sum(axis=1), 1.0):
+        return None
+    predicted = np.asarray(classes)[probas.argmax(axis=1)]
+    return float(np.mean(predicted == np.asarray(expected)))
+
+
+def validate_model(candidate, reference=None):
+    """
+    Smoke test of a loaded model on the patterns it was trained with, against
+    the absolute floor and, when given, the accuracy of ``reference`` on the
+    same patterns. Returns (ok, detail).
+    """
+    if not candidate.ready():
+        return False, "model not loaded"
+
+    texts, expected = candidate.smoke_set()
+    if not texts:
+        return False, "no smoke patterns"
+    texts = preprocessor.transform(texts)
+
+    accuracy = _smoke_accuracy(candidate, texts, expected)
+    if accuracy is None:
+        return False, "invalid probabilities"
+    if accuracy < RELOAD_MIN_ACCURACY:
+        return False, f"smoke accuracy {accuracy:.2%} below {RELOAD_MIN_ACCURACY:.0%}"
+
+    detail = f"smoke accuracy {accuracy:.2%} on {len(texts)} patterns"
+    if reference is not None and reference.ready():
+        baseline = _smoke_accuracy(reference, texts, expected)
+        if baseline is not None:
+            if accuracy < baseline - RELOAD_MAX_ACCURACY_DROP:
+                return False, f"smoke accuracy {accuracy:.2%}, served model has {baseline:.2%}"
+            detail += f" (served model: {baseline:.2%})"
+
+    return True, detail
+
+
+def reload_model(force=False, refit=False):
+    """
+    Load the model on disk, validate it and swap it in. Requests already
+    running keep the model they started with. An artifact identical to the
+    served one is not swapped unless ``force`` is set. With ONLINE_LEARNING
+    the online model is updated from intents.json instead, or refit from
+    scratch when ``refit`` or ``force`` is set.
+
+    Returns a status dict ("reloaded", "unchanged", "rejected" or "failed").
+    """
+    global served_model, last_reload
+
+    with _reload_lock:
+        started = time.perf_counter()
+        previous = served_model
+        result = {"previous_version": previous.version, "version": previous.version}
 
-        # Age
-        if any(expr in msg for expr in ["how old", "your age", "when were you created", "when is your birthday"]):
-                return "age"
+        try:
+            if ONLINE_LEARNING:
+                refit = refit or force
+                candidate = load_online_model(previous, refit=refit)
+            else:
+                candidate = load_served_model(open_bundle(), train=False)
+            if candidate is None:
+                result.update(status="failed", detail="no loadable model on disk")
+            elif candidate is previous or (candidate.fingerprint == previous.fingerprint
+                                           and not force and not refit):
+                result.update(status="unchanged", detail="served model is up to date")
+            else:
+                ok, detail = validate_model(candidate, previous)
+                if ok:
+                    served_model = candidate
+                    result.update(status="reloaded", version=candidate.version, detail=detail)
+                else:
+                    result.update(status="rejected", detail=detail, rejected_version=candidate.version)
+        except Exception as e:
+            logger.error(f"Error reloading model: {e}")
+            result.update(status="failed", detail=str(e))
 
-        # Name
-        if any(expr in msg for expr in ["what is your name", "your name", "what should i call you", "comment tu t'appelles"]):
-            return "name"
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["timestamp"] = datetime.utcnow().isoformat()
+        log = logger.info if result["status"] in ("reloaded", "unchanged") else logger.error
+        log(f"Model reload {result['status']}: {result['detail']} "
+            f"({result['previous_version']} -> {result['version']}, {result['duration_ms']} ms)")
+        last_reload = result
 
-        # Options
-        if any(expr in msg for expr in ["what can i ask", "what questions", "show me options", "give me examples", "what are my options"]):
-            return "options"
+    if result["status"] == "reloaded":
+        seed_classification_cache()
+    return dict(result)
 
-        # Positive feedback
-        if msg in ["awesome", "perfect", "excellent", "amazing", "wonderful", "fantastic", "cool", "nice", "super","great","oui"] or any(expr in msg for expr in ["that's great", "that's good", "that's awesome", "that's perfect"]):
-            return "positive"
 
-        # Negative feedback
-        if msg in ["no", "nope", "bad", "wrong","non"] or any(expr in msg for expr in ["that's bad", "not good", "that sucks", "don't like", "not helpful", "that's wrong","that's incorrect"]):
-            return "negative"
+def _artifact_signature():
+    signature = []
+    for path in ((intents_file,) if ONLINE_LEARNING else (BUNDLE_PATH, MODEL_PATH)):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _online_refit_due():
+    served = served_model
+    if served.source != "online" or not served.compiled.updates:
+        return False
+    return time.monotonic() - served.compiled.refitted_at >= ONLINE_REFIT_INTERVAL
+
+
+def watch_model_files(interval=MODEL_WATCH_INTERVAL, stop=None):
+    """
+    Reload the model when the bundle or the pickle changes (intents.json
+    with ONLINE_LEARNING, whose model is also refit every
+    ONLINE_REFIT_INTERVAL after an update). A change must stay the same for
+    one more interval first, so a file still being written is not loaded.
+    """
+    stop = stop or threading.Event()
+    seen = _artifact_signature()
+    pending = None
+
+    while not stop.wait(interval):
+        try:
+            current = _artifact_signature()
+            if current == seen:
+                pending = None
+            elif current != pending:
+                pending = current
+            else:
+                seen, pending = current, None
+                logger.info("Model files changed on disk, reloading")
+                reload_model()
 
-    except Exception as e:
-        logger.error(f"Error in rule_based_intent: {e}")
+            if ONLINE_LEARNING and ONLINE_REFIT_INTERVAL > 0 and _online_refit_due():
+                logger.info("Refitting the online model")
+                reload_model(refit=True)
+        except Exception as e:
+            logger.error(f"Error in model watcher: {e}")
+
+
+def get_model_info():
+    info = served_model.get_info()
+    info["last_reload"] = last_reload
+    return info
 
-    return None
 
+def predict_fragments(messages):
+    """
+    Pre-classify every sub-question of several messages in one batch.
 
-def chatbot_with_fallback(message,session,threshold=0.2):
+    Returns a dict mapping each fragment to its (intent, probability) so it
+    can be handed to chatbot_enhanced(..., predictions=...). Fragments that
+    a keyword rule already answers are skipped.
+    """
+    fragments = []
+    for message in messages:
+        if not message:
+            continue
+        fragments.extend(q for q in split_questions(message) if not rule_based_intent(q))
+
+    fragments = list(dict.fromkeys(fragments))
+    return dict(zip(fragments, classify_batch(fragments)))
+
+
+classifier_batcher = MicroBatcher(_predict_clean, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+
+def classify(message):
+    """
+    Classify a single message. Cache misses share a batch with concurrent
+    requests when INFERENCE_BATCHING is enabled.
+    """
+    served = served_model
+    with stage("preprocess"):
+        cleaned = preprocessor(message)
+
+    with stage("classification_cache"):
+        cached = classification_cache.get(cleaned, served.version)
+    if cached is not None:
+        return cached
+
+    if INFERENCE_BATCHING:
+        return classifier_batcher.submit(cleaned)
+    return _predict_clean([cleaned], served)[0]
+
+
+def get_inference_stats():
+
+    stats = classifier_batcher.get_stats()
+    stats["enabled"] = INFERENCE_BATCHING
+    stats["classification_cache"] = classification_cache.get_stats()
+    stats["preprocessing"] = preprocessor.get_stats()
+    stats["model_version"] = served_model.version
+    return stats
+
+
+@timed("fallback")
+def chatbot_with_fallback(message,session,threshold=0.2,prediction=None,scan=None):
     
     try:
         
         logger.debug(f"chatbot_with_fallback called with: '{message}'")
+        reponses = served_model.responses
         logger.debug("Checking rule-based classification...")
     
-        forced_intent = rule_based_intent(message)
+        forced_intent = rule_based_intent(message, scan)
         if forced_intent:
             logger.debug(f"Rule-based matched intent: {forced_intent}")
             response = reponses.get(forced_intent, reponses.get("unknown", "Je ne comprends pas."))
@@ -314,7 +817,7 @@ def chatbot_with_fallback(message,session,threshold=0.2):
             return response,forced_intent
     
         # Check if model is available
-        if vectorizer is None or model is None:
+        if not model_ready():
             logger.error("Model not loaded! Using fallback response.")
             response = reponses.get("unknown", ["Je ne comprends pas votre question. Pouvez-vous reformuler ?"])
             if isinstance(response, list):
@@ -322,12 +825,10 @@ def chatbot_with_fallback(message,session,threshold=0.2):
             return response, "unknown"
     
     
-        message_clean = nettoyer(message)
-        vect = vectorizer.transform([message_clean])
-    
-        proba = model.predict_proba(vect)[0]
-        max_prob = max(proba)
-        intention = model.classes_[proba.argmax()]
+        # Reuse a prediction computed by classify_batch if we were given one
+        if prediction is None:
+            prediction = classify(message)
+        intention, max_prob = prediction
     
         if max_prob < threshold:
             
@@ -352,106 +853,267 @@ def chatbot_with_fallback(message,session,threshold=0.2):
 
 
 
-def chatbot_enhanced(message,session,threshold=0.2):
+# -----------------------
+# Handler pipeline
+# -----------------------
+
+def intent_response(intent):
+    reponses = served_model.responses
+    response = reponses.get(intent, reponses.get("unknown", "Je ne comprends pas."))
+    if isinstance(response, list):
+        response = random.choice(response)
+    return response, intent
+
+
+def _wikipedia_query(fragment):
+    return fragment.memo("wikipedia_query", lambda f: extract_wikipedia_query(f.text))
+
+
+def _local_scan(fragment):
+    # Keyword rules match substrings ("hi" in "philosophy", "date" in "mandate");
+    # on encyclopedia-style questions only whole words may beat the Wikipedia lookup
+    def compute(f):
+        if _wikipedia_query(f):
+            return rule_engine.scan(f.text, whole_words=True)
+        return f.scan
+    return fragment.memo("local_scan", compute)
+
+
+def _datetime_handler(fragment):
+    response = handle_datetime(fragment.text, _local_scan(fragment))
+    return (response, "datetime") if response else None
+
+
+def _goodbye_handler(fragment):
+    response = handle_goodbye(fragment.text, _local_scan(fragment))
+    return (response, "goodbye") if response else None
+
+
+def _calculator_handler(fragment):
+    response = calc(fragment.text)
+    return (response, "calculator") if response else None
+
+
+def _keyword_intent_handler(fragment):
+    intent = rule_based_intent(fragment.text, _local_scan(fragment))
+    return intent_response(intent) if intent else None
+
+
+def _classifier_handler(fragments):
+    # One model call for every fragment that was not pre-classified
+    missing = list(dict.fromkeys(f.text for f in fragments if f.prediction is None))
+    if missing:
+        predictions = dict(zip(missing, classify_batch(missing)))
+        for fragment in fragments:
+            if fragment.prediction is None:
+                fragment.prediction = predictions[fragment.text]
+
+    answers = []
+    for fragment in fragments:
+        intent, proba = fragment.prediction
+        # A confident "wikipedia_search" still needs the lookup itself
+        if proba >= PIPELINE_CONFIDENCE and intent != "wikipedia_search":
+            answers.append(intent_response(intent))
+        else:
+            answers.append(None)
+    return answers
+
+
+def _wikipedia_handler(fragment):
+    response = handle_wikipedia_search(fragment.text)
+    return (response, "wikipedia_search") if response else None
+
+
+async def _wikipedia_handler_async(fragment, executor=None):
+    response = await handle_wikipedia_search_async(fragment.text, executor)
+    return (response, "wikipedia_search") if response else None
+
+
+def _fallback_handler(fragment):
+    response, intent = chatbot_with_fallback(fragment.text, fragment.session, fragment.threshold,
+                                             prediction=fragment.prediction, scan=fragment.scan)
+    if isinstance(response, list):
+        response = " ".join(response)
+    return response, intent
+
+
+handler_pipeline = HandlerPipeline()
+handler_pipeline.register("datetime", _datetime_handler, COST_LOCAL, priority=10)
+handler_pipeline.register("goodbye", _goodbye_handler, COST_LOCAL, priority=20)
+handler_pipeline.register("calculator", _calculator_handler, COST_LOCAL, priority=30)
+handler_pipeline.register("keyword_intent", _keyword_intent_handler, COST_LOCAL, priority=40)
+handler_pipeline.register("classifier", _classifier_handler, COST_MODEL, priority=10, batch=True,
+                          precondition=lambda f: model_ready())
+handler_pipeline.register("wikipedia", _wikipedia_handler, COST_NETWORK, priority=10,
+                          precondition=lambda f: _wikipedia_query(f) is not None,
+                          async_func=_wikipedia_handler_async)
+handler_pipeline.register("fallback", _fallback_handler, COST_FALLBACK, priority=10)
+
+
+def get_pipeline_stats():
+    return handler_pipeline.get_stats()
+
+
+def _early_answer(message, session):
+    """
+    Answers that skip the handler pipeline: invalid input, email extraction and
+    email recall. Returns ((response, intent, email), outcome) or None.
+    """
+    # Input validation
+    if not message or not message.strip():
+        return ("Veuillez entrer un message.", None, None), "invalid"
+
+    if len(message) > 1000:
+        return ("Votre message est trop long (maximum 1000 caractères).", None, None), "invalid"
+
+    try:
+        # Check for email extraction
+        logger.debug("Checking for email extraction...")
+        email_response, extracted_email = handle_email(message)
+        if email_response:
+            logger.info(f"Email extracted: {extracted_email}")
+            return (email_response, "email_extraction", extracted_email), "email_extraction"
+
+    except Exception as e:
+        logger.error(f"Email extraction error: {e}")
+
+    try:
+        # Check for email recall
+        logger.debug("Checking for email recall...")
+        recall = handle_email_recall(message, session)
+        if recall:
+            logger.info("Email recall triggered")
+            return (recall, "email_recall", None), "email_recall"
+    except Exception as e:
+        logger.error(f"Email recall error: {e}")
+
+    return None
+
+
+def _message_fragments(message, session, threshold, predictions):
+    # Split into multiple questions
+    logger.debug("Splitting message into questions...")
+    questions = split_questions(message)
+    logger.debug(f"Split into {len(questions)} questions: {questions}")
+
+    # Run the keyword automaton once per question; handlers share the result
+    predictions = predictions or {}
+    with stage("rules"):
+        return [
+            Fragment(q, session, scan=rule_engine.scan(q), prediction=predictions.get(q), threshold=threshold)
+            for q in questions
+        ]
+
+
+def _combine_answers(fragments):
+    """((joined response, main intent, None), outcome) of answered fragments."""
+    answers = [fragment.answer or ("Erreur de traitement", None) for fragment in fragments]
+    for fragment, (_, intent) in zip(fragments, answers):
+        INTENTS.labels(intent or "none", fragment.answered_by or "none").inc()
+
+    responses = [response for response, _ in answers]
+    intents = [intent for _, intent in answers if intent]
+
+    # Use the last detected intent as the main intent
+    detected_intent = intents[-1] if intents else None
+    final_response = " ".join(responses)
+
+    return (final_response, detected_intent, None), ("answered" if detected_intent else "unanswered")
+
+
+def chatbot_enhanced(message,session,threshold=0.2,predictions=None):
     
+    # Reported to /metrics with the time taken, whichever way the message leaves
+    started = time.perf_counter()
+    outcome = "error"
+
     try:
         
         logger.debug(f"chatbot_enhanced called with message: '{message[:50]}...'")
-    
-        # Input validation
-        if not message or not message.strip():
-            return "Veuillez entrer un message.", None, None
-    
-        if len(message) > 1000:
-            return "Votre message est trop long (maximum 1000 caractères).", None, None
-    
-        responses = []
-        intents=[]
-        detected_intent = None
-        extracted_email = None
-    
-        try:
-            # Check for email extraction
-            logger.debug("Checking for email extraction...")
-            email_response, extracted_email = handle_email(message)
-            if email_response:
-                logger.info(f"Email extracted: {extracted_email}")
-                return email_response, "email_extraction", extracted_email
-    
-        except Exception as e:
-            logger.error(f"Email extraction error: {e}")
-    
-        try:
-            # Check for email recall
-            logger.debug("Checking for email recall...")
-            recall = handle_email_recall(message, session)
-            if recall:
-                logger.info("Email recall triggered")
-                return recall, "email_recall", None
-        except Exception as e:
-            logger.error(f"Email recall error: {e}")
-    
-        # Split into multiple questions
-        logger.debug("Splitting message into questions...")
-        questions = re.split(r'[?.!]| et |,', message)
-        questions = [q.strip() for q in questions if q.strip()]
-        logger.debug(f"Split into {len(questions)} questions: {questions}")
-    
-    
-        for q in questions:
-            
-            try:
-                # Try Wikipedia search first
-                wiki_response = handle_wikipedia_search(q)
-                if wiki_response:
-                    logger.debug("Wikipedia handler matched")
-                    responses.append(wiki_response)
-                    intents.append("wikipedia_search")
-                    continue
-            except:
-                pass
-    
-            # Try special handlers
-            date_time_response = handle_datetime(q)
-            if date_time_response:
-                responses.append(date_time_response)
-                intents.append("datetime")
-                continue
-    
-            bye_response = handle_goodbye(q)
-            if bye_response:
-                responses.append(bye_response)
-                intents.append("goodbye")
-                continue
-                
-            calcul = calc(q)
-            if calcul:
-                responses.append(calcul)
-                intents.append("calculator")
-                continue
-                
-            try:
-                response,intent= chatbot_with_fallback(q, session, threshold)
-                if isinstance(response, list):
-                    response = " ".join(response)
-                responses.append(response)
-                if intent:
-                    intents.append(intent)
-    
-            except Exception as e:
-                logger.error(f"Fallback error: {e}", exc_info=True)
-                responses.append("Erreur de traitement")
-    
-        # Use the last detected intent as the main intent
-        detected_intent = intents[-1] if intents else None
-        final_response = " ".join(responses)
-        
-        return final_response, detected_intent, extracted_email
+
+        early = _early_answer(message, session)
+        if early:
+            answer, outcome = early
+            return answer
+
+        fragments = _message_fragments(message, session, threshold, predictions)
+
+        # Cheap handlers first; the network is only used for what they leave unanswered
+        handler_pipeline.run(fragments)
+
+        answer, outcome = _combine_answers(fragments)
+        return answer
 
     except Exception as e:
         logger.error(f"Error in chatbot_enhanced: {e}",exc_info=True)
         return "Désolé, une erreur s'est produite. Veuillez réessayer.",None,None
 
+    finally:
+        record_message(outcome, time.perf_counter() - started)
+
+
+def chatbot_enhanced_stream(message, session, threshold=0.2, predictions=None):
+    """
+    chatbot_enhanced() as a generator, for /chat/stream. Yields
+    ("fragment", index, count, (response, intent)) for each of the count
+    sub-questions as soon as it is answered, then ("answer", (response, intent, email)): what
+    chatbot_enhanced() would have returned.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+
+    try:
+        early = _early_answer(message, session)
+        if early:
+            answer, outcome = early
+            yield "fragment", 0, 1, answer[:2]
+            yield "answer", answer
+            return
+
+        fragments = _message_fragments(message, session, threshold, predictions)
+        index = {id(fragment): i for i, fragment in enumerate(fragments)}
+
+        for fragment in handler_pipeline.stream(fragments):
+            yield "fragment", index[id(fragment)], len(fragments), fragment.answer or ("Erreur de traitement", None)
+
+        answer, outcome = _combine_answers(fragments)
+        yield "answer", answer
+
+    except Exception as e:
+        logger.error(f"Error in chatbot_enhanced_stream: {e}", exc_info=True)
+        yield "answer", ("Désolé, une erreur s'est produite. Veuillez réessayer.", None, None)
+
+    finally:
+        record_message(outcome, time.perf_counter() - started)
+
+
+async def chatbot_enhanced_async(message, session, threshold=0.2, predictions=None, executor=None):
+    """
+    chatbot_enhanced() for an event loop (asgi.py): the Wikipedia lookups are
+    awaited and the other handlers, classification included, run in ``executor``.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+
+    try:
+        early = _early_answer(message, session)
+        if early:
+            answer, outcome = early
+            return answer
+
+        fragments = _message_fragments(message, session, threshold, predictions)
+        await handler_pipeline.run_async(fragments, executor)
+
+        answer, outcome = _combine_answers(fragments)
+        return answer
+
+    except Exception as e:
+        logger.error(f"Error in chatbot_enhanced_async: {e}", exc_info=True)
+        return "Désolé, une erreur s'est produite. Veuillez réessayer.", None, None
+
+    finally:
+        record_message(outcome, time.perf_counter() - started)
+
 
 # Script to train and save model manually
 if __name__ == "__main__":
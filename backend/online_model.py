@@ -0,0 +1,288 @@
+"""
+Incremental intent classifier for intents.json updates
+Stateless hashed char n-grams and a softmax regression with partial_fit, so
+new patterns and new intents are folded into a live model in milliseconds;
+fit() is the periodic full-refit path. Pure NumPy, like compiled_model.py.
+Served when ONLINE_LEARNING is enabled (see model.py); compare its accuracy
+with the batch model with python benchmarks/bench_online_model.py
+"""
+
+import os
+import copy
+import time
+import zlib
+import logging
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Hashed feature space; the char 1-3-grams of a chat corpus rarely collide in it
+ONLINE_N_FEATURES = int(os.getenv('ONLINE_N_FEATURES', str(2 ** 15)))
+
+
+class OnlineIntentClassifier:
+    """
+    Multinomial logistic regression over hashed char_wb n-grams, trained by
+    mini-batch SGD with per-weight AdaGrad steps.
+
+    The featurizer has no vocabulary to refit, and a new intent is one more
+    (zero) row of weights, so an update only trains on the new patterns plus
+    a replay sample of earlier ones (keeping the weights from drifting toward
+    the latest batch). Steps only touch the columns of the features present in
+    the batch. Patterns seen so far are kept for replay and refits.
+    Inputs are already-normalized texts (preprocessing.preprocessor).
+    """
+
+    def __init__(self, n_features: int = ONLINE_N_FEATURES, ngram_range=(1, 3), alpha: float = 1e-4,
+                 learning_rate: float = 0.5, batch_size: int = 32, update_epochs: int = 3,
+                 refit_epochs: int = 30, replay_size: int = 64, random_state: int = 42,
+                 word_cache_size: int = 20000):
+        """
+        Args:
+            n_features: Size of the hashed feature space (a power of two)
+            ngram_range: Character n-gram sizes, as in the batch model
+            alpha: L2 regularization
+            learning_rate: AdaGrad base step
+            batch_size: Patterns per SGD step
+            update_epochs: Passes over an update batch (new patterns plus replay)
+            refit_epochs: Passes over all patterns in fit()
+            replay_size: Earlier patterns replayed with each update
+            random_state: Seed of shuffling and replay sampling
+            word_cache_size: Number of words whose n-gram hashes are memoized
+        """
+        if n_features & (n_features - 1):
+            raise ValueError(f"n_features must be a power of two, got {n_features}")
+
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.alpha = alpha
+        self.learning_rate = learning_rate
+        self.batch_size = batch_size
+        self.update_epochs = update_epochs
+        self.refit_epochs = refit_epochs
+        self.replay_size = replay_size
+        self.random_state = random_state
+
+        self._word_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._word_cache_size = word_cache_size
+        self._reset()
+
+    def _reset(self):
+        self.classes_ = np.asarray([], dtype=object)
+        self._class_index = {}
+        # Feature-major, so the weights of the features in a batch are whole rows
+        self._W = np.zeros((self.n_features, 0))
+        self._b = np.zeros(0)
+        # AdaGrad accumulators of squared gradients
+        self._W_sq = np.zeros((self.n_features, 0))
+        self._b_sq = np.zeros(0)
+        # Weights are views of these, which keep spare columns for new intents
+        self._W_store = self._W
+        self._W_sq_store = self._W_sq
+
+        self._rows: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._y = np.zeros(0, dtype=np.int64)
+        self._seen = set()
+        self._rng = np.random.RandomState(self.random_state)
+
+        self.updates = 0
+        self.refitted_at = time.monotonic()
+
+    # -----------------------
+    # Featurization
+    # -----------------------
+
+    def _word_hashes(self, word: str) -> np.ndarray:
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            return cached
+
+        min_n, max_n = self.ngram_range
+        padded = " " + word + " "
+        mask = self.n_features - 1
+        hashes = []
+        for n in range(min_n, max_n + 1):
+            if n >= len(padded):
+                # A word shorter than n yields the whole padded word once
+                hashes.append(zlib.crc32(padded.encode("utf-8")) & mask)
+                break
+            for offset in range(len(padded) - n + 1):
+                hashes.append(zlib.crc32(padded[offset:offset + n].encode("utf-8")) & mask)
+
+        features = np.asarray(hashes, dtype=np.int64)
+        self._word_cache[word] = features
+        if len(self._word_cache) > self._word_cache_size:
+            try:
+                self._word_cache.popitem(last=False)
+            except KeyError:
+                pass
+        return features
+
+    def featurize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted hashed feature indices and l2-normalized counts of one text."""
+        words = text.lower().split()
+        if not words:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        indices, counts = np.unique(np.concatenate([self._word_hashes(w) for w in words]), return_counts=True)
+        values = counts.astype(np.float64)
+        return indices, values / np.sqrt(np.dot(values, values))
+
+    @staticmethod
+    def _dense_batch(rows):
+        """Columns used by a batch of rows and the batch as a dense matrix over them."""
+        lengths = [len(indices) for indices, _ in rows]
+        if not sum(lengths):
+            return np.empty(0, dtype=np.int64), np.zeros((len(rows), 0))
+        columns, inverse = np.unique(np.concatenate([indices for indices, _ in rows]), return_inverse=True)
+        X = np.zeros((len(rows), len(columns)))
+        X[np.repeat(np.arange(len(rows)), lengths), inverse] = np.concatenate([values for _, values in rows])
+        return columns, X
+
+    # -----------------------
+    # Training
+    # -----------------------
+
+    def _add_classes(self, labels):
+        new = [label for label in dict.fromkeys(labels) if label not in self._class_index]
+        if not new:
+            return
+        for label in new:
+            self._class_index[label] = len(self._class_index)
+        self.classes_ = np.asarray(list(self._class_index), dtype=object)
+
+        n_classes = len(self.classes_)
+        if n_classes > self._W_store.shape[1]:
+            capacity = n_classes + max(8, n_classes // 2)
+            W_store, W_sq_store = np.zeros((2, self.n_features, capacity))
+            W_store[:, :self._W.shape[1]] = self._W
+            W_sq_store[:, :self._W.shape[1]] = self._W_sq
+            self._W_store, self._W_sq_store = W_store, W_sq_store
+        self._W = self._W_store[:, :n_classes]
+        self._W_sq = self._W_sq_store[:, :n_classes]
+        self._b = np.concatenate([self._b, np.zeros(len(new))])
+        self._b_sq = np.concatenate([self._b_sq, np.zeros(len(new))])
+
+    def _remember(self, texts, labels):
+        self._add_classes(labels)
+        start = len(self._rows)
+        self._rows.extend(self.featurize(text) for text in texts)
+        self._y = np.concatenate([self._y, [self._class_index[label] for label in labels]]).astype(np.int64)
+        self._seen.update(zip(texts, labels))
+        return np.arange(start, len(self._rows))
+
+    def _step(self, batch, sample_weight):
+        columns, X = self._dense_batch([self._rows[i] for i in batch])
+        y = self._y[batch]
+
+        W = self._W[columns]
+        scores = X @ W + self._b
+        scores -= scores.max(axis=1, keepdims=True)
+        probas = np.exp(scores)
+        probas /= probas.sum(axis=1, keepdims=True)
+
+        # Gradient of the weighted cross-entropy
+        probas[np.arange(len(batch)), y] -= 1.0
+        probas *= sample_weight[:, None] / len(batch)
+        grad_W = X.T @ probas + self.alpha * W
+        grad_b = probas.sum(axis=0)
+
+        W_sq = self._W_sq[columns] + grad_W * grad_W
+        self._W_sq[columns] = W_sq
+        self._W[columns] = W - self.learning_rate * grad_W / (np.sqrt(W_sq) + 1e-8)
+        self._b_sq += grad_b * grad_b
+        self._b -= self.learning_rate * grad_b / (np.sqrt(self._b_sq) + 1e-8)
+
+    def _train(self, samples, epochs):
+        """Shuffled mini-batch passes over the given pattern indices."""
+        # Intents have very different pattern counts: balance like class_weight='balanced'
+        counts = np.bincount(self._y, minlength=len(self.classes_)).astype(np.float64)
+        class_weight = len(self._y) / (len(self.classes_) * np.maximum(counts, 1.0))
+
+        for _ in range(epochs):
+            order = samples[self._rng.permutation(len(samples))]
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                self._step(batch, class_weight[self._y[batch]])
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str]) -> "OnlineIntentClassifier":
+        """Full refit from scratch on every pattern."""
+        self._reset()
+        pairs = list(dict.fromkeys(zip(texts, labels)))
+        samples = self._remember([t for t, _ in pairs], [l for _, l in pairs])
+        self._train(samples, self.refit_epochs)
+        return self
+
+    def partial_fit(self, texts: Sequence[str], labels: Sequence[str]) -> int:
+        """
+        Fold new (text, intent) pairs into the model; pairs already learned
+        are skipped and unknown intents are added. Returns the number of pairs added.
+        """
+        pairs = [pair for pair in dict.fromkeys(zip(texts, labels)) if pair not in self._seen]
+        if not pairs:
+            return 0
+
+        earlier = len(self._rows)
+        new = self._remember([t for t, _ in pairs], [l for _, l in pairs])
+        replay = self._rng.choice(earlier, size=min(self.replay_size, earlier), replace=False) \
+            if earlier and self.replay_size > 0 else np.empty(0, dtype=np.int64)
+
+        self._train(np.concatenate([new, replay]).astype(np.int64), self.update_epochs)
+        self.updates += 1
+        return len(pairs)
+
+    def update_from_catalog(self, texts: Sequence[str], labels: Sequence[str]) -> str:
+        """
+        Bring the model in line with the full pattern catalog: new pairs are
+        learned incrementally, while removed ones (which SGD cannot unlearn)
+        trigger a refit. Returns "unchanged", "incremental" or "refit".
+        """
+        if self._seen - set(zip(texts, labels)):
+            self.fit(texts, labels)
+            return "refit"
+        return "incremental" if self.partial_fit(texts, labels) else "unchanged"
+
+    def copy(self) -> "OnlineIntentClassifier":
+        """Independent copy, updated while the original keeps serving."""
+        # deepcopy would turn the weight views into separate arrays
+        clone = copy.copy(self)
+        clone._W_store, clone._W_sq_store = self._W_store.copy(), self._W_sq_store.copy()
+        clone._W = clone._W_store[:, :self._W.shape[1]]
+        clone._W_sq = clone._W_sq_store[:, :self._W_sq.shape[1]]
+        clone._b, clone._b_sq, clone._y = self._b.copy(), self._b_sq.copy(), self._y.copy()
+        clone._class_index = dict(self._class_index)
+        clone._rows = list(self._rows)
+        clone._seen = set(self._seen)
+        clone._rng = copy.deepcopy(self._rng)
+        clone._word_cache = OrderedDict(self._word_cache)
+        return clone
+
+    # -----------------------
+    # Prediction
+    # -----------------------
+
+    def transform(self, texts: Sequence[str]):
+        """Features of each text, to pass to predict_proba."""
+        return [self.featurize(text) for text in texts]
+
+    def predict_proba(self, texts: Sequence[str], features=None) -> np.ndarray:
+        if not len(self.classes_):
+            raise ValueError("OnlineIntentClassifier is not fitted")
+        columns, X = self._dense_batch(features if features is not None else self.transform(texts))
+        scores = X @ self._W[columns] + self._b
+        scores -= scores.max(axis=1, keepdims=True)
+        probas = np.exp(scores)
+        return probas / probas.sum(axis=1, keepdims=True)
+
+    def predict(self, texts: Sequence[str]) -> List[str]:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)].tolist()
+
+    def get_stats(self):
+        return {
+            "intents": len(self.classes_),
+            "patterns": len(self._rows),
+            "updates_since_refit": self.updates,
+            "seconds_since_refit": round(time.monotonic() - self.refitted_at, 1),
+        }
@@ -0,0 +1,152 @@
+"""
+Text preprocessing shared by training, evaluation and inference
+One Preprocessor turns a message into the text the vectorizer sees, so
+features at serve time are built exactly like at training time
+"""
+
+import os
+import re
+import logging
+import threading
+from functools import lru_cache
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Identifies the text transformation; stored with trained models.
+# Version 1 is the former model.preprocess(), which models without the key were trained with
+PREPROCESSING_VERSION = "1"
+
+# Pre-provisioned NLTK data (see provision_nltk.py); nothing is downloaded at runtime
+NLTK_DATA_DIR = os.getenv('NLTK_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+# Without the stopwords or WordNet, features differ from the ones the model was
+# trained with, so load() fails; false serves without them (development only)
+NLTK_REQUIRED = os.getenv('NLTK_REQUIRED', 'true').lower() in ('1', 'true', 'yes')
+
+# Number of distinct tokens whose lemma is remembered
+LEMMA_CACHE_SIZE = int(os.getenv('LEMMA_CACHE_SIZE', '50000'))
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+class Preprocessor:
+    """
+    Lowercase, strip punctuation, split on whitespace, drop stopwords from
+    longer messages and lemmatize.
+
+    Tokenizing is a precompiled regex plus str.split (no Punkt), and
+    lemmas come from a bounded per-token cache, since chat traffic reuses a
+    small vocabulary. NLTK (a slow import) is loaded by load(), or on first
+    use; when WordNet or the stopword lists are missing it raises, unless
+    NLTK_REQUIRED is off.
+    """
+
+    def __init__(self, languages=("french", "english"), short_message_words: int = 3,
+                 lemma_cache_size: int = LEMMA_CACHE_SIZE):
+        """
+        Args:
+            languages: NLTK stopword lists to merge
+            short_message_words: Messages with at most this many words keep their stopwords
+            lemma_cache_size: Bound of the per-token lemma cache
+        """
+        self.languages = tuple(languages)
+        self.short_message_words = short_message_words
+
+        self._lock = threading.Lock()
+        self._ready = False
+        self._stop_words = frozenset()
+        self._lemmatizer = None
+        # NLTK packages load() could not find, and why it last failed
+        self.missing = ()
+        self.load_error = None
+        self._lemma = lru_cache(maxsize=lemma_cache_size)(self._lemmatize)
+
+    def load(self):
+        """
+        Import NLTK and load the stopword lists and WordNet from the bundle.
+
+        Raises RuntimeError if either is missing, unless NLTK_REQUIRED is off.
+        """
+        with self._lock:
+            if self._ready:
+                return
+
+            import nltk
+            if NLTK_DATA_DIR not in nltk.data.path:
+                nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+            missing = []
+            try:
+                from nltk.corpus import stopwords
+                self._stop_words = frozenset(
+                    word for language in self.languages for word in stopwords.words(language)
+                )
+            except LookupError:
+                missing.append("stopwords")
+
+            try:
+                from nltk.stem import WordNetLemmatizer
+                lemmatizer = WordNetLemmatizer()
+                lemmatizer.lemmatize("tests")  # forces the WordNet corpus to load
+                self._lemmatizer = lemmatizer
+            except LookupError:
+                missing.append("wordnet")
+
+            self.missing = tuple(missing)
+            if missing:
+                problem = f"NLTK data missing ({', '.join(missing)}); run python provision_nltk.py or set NLTK_DATA_DIR"
+                if NLTK_REQUIRED:
+                    self.load_error = f"{problem}. Without it the features differ from the model's training"
+                    raise RuntimeError(self.load_error)
+                logger.warning(f"{problem}. Serving without it (NLTK_REQUIRED=false)")
+
+            self.load_error = None
+            self._ready = True
+
+    def _lemmatize(self, token: str) -> str:
+        if self._lemmatizer is None:
+            return token
+        return self._lemmatizer.lemmatize(token)
+
+    def tokens(self, text: str) -> List[str]:
+        if not self._ready:
+            self.load()
+
+        words = _PUNCTUATION_RE.sub("", text.lower()).split()
+        lemma = self._lemma
+        if len(words) <= self.short_message_words:
+            return [lemma(word) for word in words]
+        stop_words = self._stop_words
+        return [lemma(word) for word in words if word not in stop_words]
+
+    def __call__(self, text: str) -> str:
+        """The normalized text fed to the vectorizer."""
+        # Missing NLTK data is raised, never served as differently built text
+        if not self._ready:
+            self.load()
+
+        try:
+            return " ".join(self.tokens(text))
+        except Exception as e:
+            logger.error(f"Error in preprocessing: {e}")
+            return text.lower()
+
+    def transform(self, texts: Iterable[str]) -> List[str]:
+        return [self(text) for text in texts]
+
+    def get_stats(self):
+
+        info = self._lemma.cache_info()
+        return {
+            "version": PREPROCESSING_VERSION,
+            "lemmatizer": self._lemmatizer is not None,
+            "missing_nltk_data": list(self.missing),
+            "load_error": self.load_error,
+            "stop_words": len(self._stop_words),
+            "lemma_cache_hits": info.hits,
+            "lemma_cache_misses": info.misses,
+            "lemma_cache_size": info.currsize,
+        }
+
+
+preprocessor = Preprocessor()
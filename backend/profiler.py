@@ -0,0 +1,207 @@
+"""
+Request profiler
+Samples the stack of the thread serving a request every PROFILE_INTERVAL_MS
+(sys._current_frames from one background thread, so the request itself runs
+untouched) and keeps the last PROFILE_BUFFER_SIZE profiles in memory.
+
+A request is profiled when:
+- it asks for it with 'X-Profile: 1' (app.py also requires the admin token)
+- it is drawn 1 in PROFILE_SAMPLE_EVERY
+- PROFILE_SLOW_MS is set: every request is sampled and only those slower
+  than the threshold are kept
+
+Profiles are exported as folded stacks ("frame;frame;frame count" lines),
+the input of flamegraph.pl, speedscope and inferno. Each worker keeps its own.
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_BUFFER_SIZE = int(os.getenv('PROFILE_BUFFER_SIZE', '20'))
+# 0 disables sampled and slow-request profiling; the header always works
+PROFILE_SAMPLE_EVERY = int(os.getenv('PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+
+# Deepest frames kept per sample; deeper stacks are cut at the root side
+MAX_STACK_DEPTH = 128
+
+
+class Profile:
+    """Folded stack samples of one request."""
+
+    def __init__(self, trigger, path, interval_ms):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.path = path
+        self.interval_ms = interval_ms
+        self.captured_at = datetime.utcnow().isoformat()
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration_ms = None
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "trigger": self.trigger,
+            "path": self.path,
+            "captured_at": self.captured_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": self.interval_ms,
+        }
+
+    def folded(self):
+        """One 'root;...;leaf count' line per distinct stack, heaviest first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Sampler:
+    """
+    One daemon thread sampling every thread with an active profile. It sleeps
+    on an event while nothing is being profiled, so it costs nothing then.
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._labels = {}
+
+    def start(self, profile):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = profile
+            # A worker forked from the master does not inherit its thread
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="profile-sampler")
+                self._pid = os.getpid()
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+
+            # Held while sampling, so a profile is never written after stop() returns
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+
+                frames = sys._current_frames()
+                for thread_id, profile in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_id:
+                        profile.stacks[self._fold(frame)] += 1
+                        profile.samples += 1
+                frames = frame = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            # ';' separates frames in the folded format
+            label = self._labels[code] = label.replace(";", ":")
+        return label
+
+    def _fold(self, frame):
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps the last captured profiles."""
+
+    def __init__(self, buffer_size=PROFILE_BUFFER_SIZE, sample_every=PROFILE_SAMPLE_EVERY,
+                 slow_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS):
+        self.sample_every = sample_every
+        self.slow_ms = slow_ms
+        self.sampler = Sampler(interval_ms)
+        self.profiles = deque(maxlen=buffer_size)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def trigger(self, requested=False):
+        """Why this request should be profiled, or None."""
+        if requested:
+            return "header"
+        if self.sample_every > 0 and random.randrange(self.sample_every) == 0:
+            return "sampled"
+        if self.slow_ms > 0:
+            return "slow"
+        return None
+
+    def run(self, trigger, path, func, *args, **kwargs):
+        """Call func under the sampler; slow-request profiles are kept only past the threshold."""
+        profile = Profile(trigger, path, self.sampler.interval * 1000)
+        started = time.perf_counter()
+        self.sampler.start(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.sampler.stop()
+            profile.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            self._keep(profile)
+
+    def _keep(self, profile):
+        with self.lock:
+            if profile.trigger == "slow" and profile.duration_ms < self.slow_ms:
+                self.stats["discarded"] += 1
+                return
+            self.profiles.append(profile)
+            self.stats[profile.trigger] += 1
+
+        if profile.trigger == "slow":
+            logger.info(f"Captured profile {profile.id} of a {profile.duration_ms:.0f}ms {profile.path} request")
+
+    def list(self):
+        with self.lock:
+            return [profile.summary() for profile in reversed(self.profiles)]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "captured": dict(self.stats),
+                "buffered": len(self.profiles),
+                "buffer_size": self.profiles.maxlen,
+                "sample_every": self.sample_every,
+                "slow_ms": self.slow_ms,
+                "interval_ms": self.sampler.interval * 1000,
+            }
+
+    def get(self, profile_id):
+        with self.lock:
+            for profile in self.profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.profiles.clear()
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,74 @@
+"""
+Provision the NLTK data used by preprocessing into a local bundle
+Run once when building or deploying, the server itself never downloads:
+    python provision_nltk.py                 # into ./nltk_data (or $NLTK_DATA_DIR)
+    python provision_nltk.py --check         # exit 1 if something is missing
+"""
+
+import sys
+import logging
+import argparse
+
+from preprocessing import NLTK_DATA_DIR
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# NLTK package -> resource path checked after download
+REQUIRED_PACKAGES = {
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+    "omw-1.4": "corpora/omw-1.4",
+}
+
+
+def missing_packages(directory):
+    import nltk
+
+    missing = []
+    for package, resource in REQUIRED_PACKAGES.items():
+        try:
+            nltk.data.find(resource, paths=[directory])
+        except LookupError:
+            missing.append(package)
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision the NLTK data bundle")
+    parser.add_argument("--dir", default=NLTK_DATA_DIR, help="Bundle directory (default: %(default)s)")
+    parser.add_argument("--check", action="store_true", help="Only report missing packages")
+    args = parser.parse_args()
+
+    import nltk
+
+    missing = missing_packages(args.dir)
+    if args.check:
+        if missing:
+            logger.error(f"Missing NLTK packages in {args.dir}: {', '.join(missing)}")
+            return False
+        logger.info(f"✓ NLTK bundle complete in {args.dir}")
+        return True
+
+    for package in missing:
+        logger.info(f"Downloading {package} into {args.dir}...")
+        try:
+            nltk.download(package, download_dir=args.dir, quiet=True, raise_on_error=True)
+        except Exception as e:
+            logger.error(f"✗ Could not download {package}: {e}")
+
+    missing = missing_packages(args.dir)
+    if missing:
+        logger.error(f"✗ Still missing: {', '.join(missing)}")
+        return False
+
+    logger.info(f"✓ NLTK bundle ready in {args.dir}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
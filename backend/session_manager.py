@@ -3,176 +3,392 @@ Session Manager for Chatbot
 Handles per-user conversation context and state
 """
 
-from datetime import datetime, timedelta
+from collections import Counter, OrderedDict
+from datetime import datetime
+import sys
+import time
 import uuid
 import threading
-from typing import Dict, Optional
+from time import perf_counter
+from typing import Dict, List, Optional
 import os 
 
+from metrics import METRICS_ENABLED, SESSION_LOCK_WAIT_SECONDS, SESSIONS_REMOVED
+
+# Lock-striped shards of the session store
+SESSION_SHARDS = int(os.getenv('SESSION_SHARDS', '16'))
+# Caps per worker (0 disables); past either, the least recently used sessions are evicted
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '100000'))
+SESSION_MAX_BYTES = int(float(os.getenv('SESSION_MAX_MB', '256')) * 1024 * 1024)
+
+# Exchanges kept per session
+HISTORY_LIMIT = 50
+
+# Estimated footprint of a new session and of a history entry (plus its text),
+# measured with tracemalloc; the memory cap is enforced on these estimates
+SESSION_BYTES = 220
+HISTORY_ENTRY_BYTES = 200
+
+# Expired sessions reclaimed by each new session, so expiry keeps up without a sweep
+RECLAIM_BATCH = 8
+
+# Sessions keep time.monotonic() timestamps, which clock changes do not move;
+# they are turned into wall-clock datetimes only when shown
+_WALL_OFFSET = time.time() - time.monotonic()
+
+
+def _wall_clock(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp + _WALL_OFFSET)
+
+
+def _intern(label):
+    # Intent labels repeat across sessions: keep one copy of each
+    return sys.intern(label) if isinstance(label, str) else label
+
+
+class Session:
+    """
+    One conversation's state. Reads like the dict sessions used to be
+    (session.get("user_name")), timestamps included.
+
+    History is a ring buffer of (user, bot, intent, timestamp) tuples,
+    allocated with the first exchange: it grows to HISTORY_LIMIT, then each
+    exchange overwrites the oldest in place.
+    """
+
+    __slots__ = ("last_intent", "email", "user_name", "name_asked", "created_at", "last_activity",
+                 "history", "history_start", "size")
+
+    FIELDS = ("last_intent", "email", "user_name", "name_asked")
+
+    def __init__(self, now: float):
+        self.last_intent = None
+        self.email = None
+        self.user_name = None
+        self.name_asked = False
+        self.created_at = now
+        self.last_activity = now
+        self.history: Optional[List[tuple]] = None
+        self.history_start = 0
+        # Estimated bytes, for the memory cap
+        self.size = SESSION_BYTES
+
+    def get(self, key: str, default=None):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if key in ("created_at", "last_activity"):
+            return _wall_clock(getattr(self, key))
+        if key == "conversation_history":
+            return self.get_history(HISTORY_LIMIT)
+        return default
+
+    def __getitem__(self, key: str):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def exchanges(self) -> int:
+        """Exchanges held."""
+        return len(self.history) if self.history else 0
+
+    def add_exchange(self, entry: tuple) -> Optional[tuple]:
+        """Append an exchange in O(1); returns the one it overwrote once the buffer is full."""
+        history = self.history
+        if history is None:
+            self.history = [entry]
+            return None
+
+        if len(history) < HISTORY_LIMIT:
+            history.append(entry)
+            return None
+
+        start = self.history_start
+        dropped = history[start]
+        history[start] = entry
+        self.history_start = (start + 1) % HISTORY_LIMIT
+        return dropped
+
+    def get_history(self, limit: int) -> List[Dict]:
+        """The last ``limit`` exchanges, oldest first, as the API returns them."""
+        history = self.history
+        if not history or limit <= 0:
+            return []
+
+        start = self.history_start
+        ordered = history[start:] + history[:start] if start else history
+        return [
+            {"user": user, "bot": bot, "intent": intent, "timestamp": _wall_clock(timestamp).isoformat()}
+            for user, bot, intent, timestamp in ordered[-limit:]
+        ]
+
+    def __repr__(self):
+        return (f"Session(user_name={self.user_name!r}, email={self.email!r}, last_intent={self.last_intent!r}, "
+                f"name_asked={self.name_asked!r}, exchanges={self.exchanges()})")
+
+
+def _entry_bytes(entry: tuple) -> int:
+    return HISTORY_ENTRY_BYTES + len(entry[0]) + len(entry[1])
+
+
+class _TimedLock:
+    """
+    The session lock, recording how long an operation waited for it when
+    another thread held it. An uncontended acquire records nothing.
+    """
+
+    __slots__ = ("_lock", "_wait")
+
+    def __init__(self, lock, operation: str):
+        self._lock = lock
+        self._wait = SESSION_LOCK_WAIT_SECONDS.labels(operation)
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            started = perf_counter()
+            self._lock.acquire()
+            self._wait.observe(perf_counter() - started)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+
+class _Shard:
+    """
+    One stripe of the session store: its own sessions and its own lock.
+
+    Sessions are kept least recently used first. Every session has the same
+    timeout, so that is also expiry order: expired sessions are popped from
+    the front, and so are the ones evicted by the caps.
+    """
+
+    __slots__ = ("sessions", "bytes", "conversations", "removed", "lock", "locked")
+
+    def __init__(self):
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # Estimated bytes of the sessions and the history entries they hold
+        self.bytes = 0
+        self.conversations = 0
+        # Sessions dropped, by reason
+        self.removed = Counter()
+        self.lock = threading.Lock()
+
+        # with shard.locked["get_session"]: takes shard.lock
+        self.locked = {
+            operation: _TimedLock(self.lock, operation) if METRICS_ENABLED else self.lock
+            for operation in ("create_session", "get_session", "update_session", "add_to_history",
+                              "get_history", "clear_session", "cleanup_expired_sessions", "get_stats")
+        }
 
 
 class SessionManager:
     """
     Manages user sessions and conversation context.
     Each user gets their own isolated context.
+
+    Sessions are spread over lock-striped shards by hash of the session id:
+    an operation locks only its session's shard, and the stats and cleanup
+    scans lock one shard at a time, so a scan never stalls every /chat.
+
+    Expired sessions are reclaimed a few at a time as new ones arrive, in
+    O(1) each, and max_sessions / max_bytes bound the store: past either, a
+    shard evicts its least recently used sessions. Both caps are split
+    evenly between the shards.
     """
 
-    def __init__(self, session_timeout_minutes: int = 30):
+    def __init__(self, session_timeout_minutes: int = 30, shards: int = SESSION_SHARDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES):
         """
         Initialize the session manager.
 
         Args:
             session_timeout_minutes: How long before a session expires
+            shards: Number of independently locked stripes
+            max_sessions: Sessions kept at most (0 for no limit)
+            max_bytes: Estimated memory the sessions may use (0 for no limit)
         """
-        self.sessions: Dict[str, Dict] = {}
-        self.session_timeout = timedelta(minutes=session_timeout_minutes)
-        self.lock = threading.RLock()  # Thread-safe operations
+        # Seconds, compared with time.monotonic() timestamps
+        self.session_timeout = session_timeout_minutes * 60
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._shard_max_sessions = -(-max_sessions // len(self.shards)) if max_sessions > 0 else 0
+        self._shard_max_bytes = max_bytes // len(self.shards) if max_bytes > 0 else 0
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    # The helpers below run with the shard lock held
+
+    def _get(self, shard: _Shard, session_id: str) -> Session:
+        now = time.monotonic()
+        session = shard.sessions.get(session_id)
+
+        # Unknown or expired: start a new session under this ID
+        if session is None or now - session.last_activity > self.session_timeout:
+            return self._insert(shard, session_id, now)
+
+        # Update last activity
+        session.last_activity = now
+        shard.sessions.move_to_end(session_id)
+        return session
+
+    def _insert(self, shard: _Shard, session_id: str, now: float) -> Session:
+        self._reclaim(shard, now, RECLAIM_BATCH)
+        if session_id in shard.sessions:
+            self._remove(shard, session_id, "expired")
+
+        session = shard.sessions[session_id] = Session(now)
+        shard.bytes += session.size
+        self._evict(shard)
+        return session
+
+    def _reclaim(self, shard: _Shard, now: float, limit: Optional[int] = None) -> int:
+        """Drop expired sessions from the front of the shard, at most ``limit`` of them."""
+        removed = 0
+        while shard.sessions and (limit is None or removed < limit):
+            session_id, session = next(iter(shard.sessions.items()))
+            if now - session.last_activity <= self.session_timeout:
+                break
+            self._remove(shard, session_id, "expired")
+            removed += 1
+        return removed
+
+    def _evict(self, shard: _Shard):
+        """Drop least recently used sessions while the shard is over a cap; never the newest one."""
+        while len(shard.sessions) > 1:
+            if self._shard_max_sessions and len(shard.sessions) > self._shard_max_sessions:
+                reason = "evicted_sessions"
+            elif self._shard_max_bytes and shard.bytes > self._shard_max_bytes:
+                reason = "evicted_bytes"
+            else:
+                return
+            self._remove(shard, next(iter(shard.sessions)), reason)
+
+    def _remove(self, shard: _Shard, session_id: str, reason: Optional[str] = None):
+        session = shard.sessions.pop(session_id)
+        shard.bytes -= session.size
+        shard.conversations -= session.exchanges()
+        if reason:
+            shard.removed[reason] += 1
+            if METRICS_ENABLED:
+                SESSIONS_REMOVED.labels(reason).inc()
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self.shards)
 
 
     def create_session(self) -> str:
     
         session_id = str(uuid.uuid4())
-        with self.lock:
-            self.sessions[session_id] = {
-                "last_intent": None,
-                "email": None,
-                "user_name": None,  # NEW: Store user's name
-                "name_asked": False,  # NEW: Track if we've asked for name
-                "conversation_history": [],
-                "created_at": datetime.now(),
-                "last_activity": datetime.now()
-            }
+        shard = self._shard(session_id)
+        with shard.locked["create_session"]:
+            self._insert(shard, session_id, time.monotonic())
 
         return session_id
 
 
-    def get_session(self, session_id: str) -> Optional[Dict]:
+    def get_session(self, session_id: str) -> Optional[Session]:
         
-        with self.lock:
-            # Check if session exists
-            if session_id not in self.sessions:
-                # Create new session with this ID
-                self.sessions[session_id] = {
-                    "last_intent": None,
-                    "email": None,
-                    "user_name": None,  # NEW: Store user's name
-                    "name_asked": False,  # NEW: Track if we've asked for name
-                    "conversation_history": [],
-                    "created_at": datetime.now(),
-                    "last_activity": datetime.now()
-                }
-                return self.sessions[session_id]
-
-            session = self.sessions[session_id]
-
-            # Check if session expired
-            if datetime.now() - session["last_activity"] > self.session_timeout:
-                # Session expired, create new one
-                self.sessions[session_id] = {
-                    "last_intent": None,
-                    "email": None,
-                    "user_name": None,  # NEW: Store user's name
-                    "name_asked": False,  # NEW: Track if we've asked for name
-                    "conversation_history": [],
-                    "created_at": datetime.now(),
-                    "last_activity": datetime.now()
-                }
-                return self.sessions[session_id]
-
-            # Update last activity
-            session["last_activity"] = datetime.now()
-            return session
+        shard = self._shard(session_id)
+        with shard.locked["get_session"]:
+            return self._get(shard, session_id)
 
 
     
     def update_session(self, session_id: str, **kwargs) -> bool:
         
-        with self.lock:
-            session = self.get_session(session_id)
-            if not session:
-                return False
+        shard = self._shard(session_id)
+        with shard.locked["update_session"]:
+            session = self._get(shard, session_id)
 
             # Update allowed fields
-            allowed_fields = ["last_intent", "email","user_name", "name_asked"]
             for key, value in kwargs.items():
-                if key in allowed_fields:
-                    session[key] = value
+                if key in Session.FIELDS:
+                    setattr(session, key, _intern(value) if key == "last_intent" else value)
 
-            session["last_activity"] = datetime.now()
             return True
 
     def add_to_history(self, session_id: str, user_message: str,bot_response: str, intent: str = None) -> bool:
        
-        with self.lock:
-            session = self.get_session(session_id)
-            if not session:
-                return False
-
-            # Add to history (keep last 50 messages)
-            session["conversation_history"].append({
-                "user": user_message,
-                "bot": bot_response,
-                "intent": intent,
-                "timestamp": datetime.now().isoformat()
-            })
-
-            # Keep only last 50 exchanges
-            if len(session["conversation_history"]) > 50:
-                session["conversation_history"] = session["conversation_history"][-50:]
-
+        shard = self._shard(session_id)
+        with shard.locked["add_to_history"]:
+            session = self._get(shard, session_id)
+
+            # Keep the last HISTORY_LIMIT exchanges; timestamps are formatted by get_history
+            entry = (user_message, bot_response, _intern(intent), session.last_activity)
+            added = _entry_bytes(entry)
+            dropped = session.add_exchange(entry)
+            if dropped is None:
+                shard.conversations += 1
+            else:
+                added -= _entry_bytes(dropped)
+
+            session.size += added
+            shard.bytes += added
+            self._evict(shard)
             return True
 
     def get_history(self, session_id: str, limit: int = 10) -> list:
        
-        with self.lock:
-            session = self.get_session(session_id)
-            if not session:
-                return []
-
-            history = session.get("conversation_history", [])
-            return history[-limit:] if history else []
+        shard = self._shard(session_id)
+        with shard.locked["get_history"]:
+            session = self._get(shard, session_id)
+            return session.get_history(limit)
 
     def clear_session(self, session_id: str) -> bool:
         
-        with self.lock:
-            if session_id in self.sessions:
-                del self.sessions[session_id]
+        shard = self._shard(session_id)
+        with shard.locked["clear_session"]:
+            if session_id in shard.sessions:
+                self._remove(shard, session_id)
                 return True
             return False
 
     def cleanup_expired_sessions(self):
     
-        with self.lock:
-            now = datetime.now()
-            expired = [
-                sid for sid, session in self.sessions.items()
-                if now - session["last_activity"] > self.session_timeout
-            ]
-
-            for sid in expired:
-                del self.sessions[sid]
+        # Expired sessions are at the front of each shard: O(expired), no scan
+        removed = 0
+        for shard in self.shards:
+            with shard.locked["cleanup_expired_sessions"]:
+                removed += self._reclaim(shard, time.monotonic())
 
-            return len(expired)
+        return removed
 
     def get_stats(self) -> Dict:
        
-        with self.lock:
-            total = len(self.sessions)
-            now = datetime.now()
-
-            active_5min = sum(
-                1 for s in self.sessions.values()
-                if now - s["last_activity"] < timedelta(minutes=5)
-            )
-
-            total_conversations = sum(len(s.get("conversation_history", [])) for s in self.sessions.values())
-
-            return {
-                "total_sessions": total,
-                "active_last_5min": active_5min,
-                "total_conversations": total_conversations,
-                "timestamp": now.isoformat()
-            }
+        total = active_5min = total_conversations = memory_bytes = 0
+        removed = Counter()
+        recent = time.monotonic() - 5 * 60
+
+        # Shard-local counters, summed. Sessions are in activity order, so the
+        # active count walks back from the most recent one and stops at the
+        # first one older than 5 minutes: O(active sessions), nothing copied
+        for shard in self.shards:
+            with shard.locked["get_stats"]:
+                total += len(shard.sessions)
+                total_conversations += shard.conversations
+                memory_bytes += shard.bytes
+                removed.update(shard.removed)
+
+                for session in reversed(shard.sessions.values()):
+                    if session.last_activity <= recent:
+                        break
+                    active_5min += 1
+
+        return {
+            "total_sessions": total,
+            "active_last_5min": active_5min,
+            "total_conversations": total_conversations,
+            "memory_bytes": memory_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "expired_sessions": removed["expired"],
+            "evicted_sessions": removed["evicted_sessions"] + removed["evicted_bytes"],
+            "timestamp": datetime.now().isoformat()
+        }
 
 
 # Global session manager instance
@@ -0,0 +1,22 @@
+"""
+Tests run from the backend directory: python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def nltk_provisioned():
+    """Skip tests that run the preprocessor when the NLTK bundle is missing (python provision_nltk.py)."""
+    from preprocessing import preprocessor
+
+    try:
+        preprocessor.load()
+    except RuntimeError as e:
+        pytest.skip(str(e))
@@ -0,0 +1,76 @@
+"""
+Micro-batching of classifier cache misses
+"""
+
+import threading
+import time
+import uuid
+
+import pytest
+
+import model
+from batching import MicroBatcher
+
+THREADS = 8
+TURNS = 5
+
+
+def test_concurrent_chatbot_enhanced_calls_share_batches(monkeypatch, nltk_provisioned):
+    monkeypatch.setattr(model, "INFERENCE_BATCHING", True)
+    # Low-confidence fragments would otherwise look the message up on Wikipedia
+    monkeypatch.setattr(model, "handle_wikipedia_search", lambda message: None)
+    before = model.classifier_batcher.get_stats()
+
+    barrier = threading.Barrier(THREADS)
+    answers = []
+
+    def converse(index):
+        barrier.wait()
+        for turn in range(TURNS):
+            # No keyword rule answers it and it was never seen, so it reaches the classifier
+            message = f"zorblat {uuid.uuid4().hex[:8]} quintuple {index} {turn}"
+            answers.append(model.chatbot_enhanced(message, {}))
+
+    threads = [threading.Thread(target=converse, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = model.classifier_batcher.get_stats()
+    assert after["batches"] > before["batches"]
+    assert after["items"] - before["items"] >= THREADS * TURNS
+    assert len(answers) == THREADS * TURNS
+    assert not any(response.startswith("Désolé, une erreur") for response, _, _ in answers)
+
+
+def test_submit_many_keeps_order():
+    batcher = MicroBatcher(lambda texts: [text.upper() for text in texts], max_wait_ms=1)
+
+    assert batcher.submit_many(["a", "b", "c"]) == ["A", "B", "C"]
+    assert batcher.submit("d") == "D"
+
+
+def test_short_results_fail_the_batch():
+    batcher = MicroBatcher(lambda texts: texts[:-1], max_wait_ms=1)
+
+    with pytest.raises(ValueError):
+        batcher.submit_many(["a", "b"])
+
+
+def test_timed_out_requests_are_not_classified():
+    seen = []
+
+    def slow(texts):
+        seen.extend(texts)
+        time.sleep(0.2)
+        return texts
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0, timeout=0.05)
+    with pytest.raises(TimeoutError):
+        batcher.submit_many(["first", "second", "third"])
+    time.sleep(0.5)
+
+    # "first" was already running; the others were dropped from the queue
+    assert seen == ["first"]
+    assert batcher.get_stats()["abandoned"] == 2
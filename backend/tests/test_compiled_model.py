@@ -0,0 +1,59 @@
+"""
+The compiled classifier must give the probabilities of the pickled sklearn model
+"""
+
+import pickle
+import random
+from pathlib import Path
+
+import pytest
+
+from compiled_model import CompiledClassifier, verify_equivalence
+from data import questions
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / "models" / "chatbot_model.pkl"
+
+
+@pytest.fixture(scope="module")
+def sklearn_model():
+    with open(MODEL_PATH, "rb") as f:
+        data = pickle.load(f)
+    return data["vectorizer"], data["model"]
+
+
+def noisy_variants(count, seed=42):
+    """Typos, casing, padding and unseen text around the intent patterns."""
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzéèàçù0123456789  "
+
+    messages = ["", " ", "a", "Bonjour   comment\tça va", "QUELLE HEURE EST-IL", "x" * 200]
+    while len(messages) < count:
+        base = rng.choice(questions)
+        kind = rng.random()
+        if kind < 0.4:
+            position = rng.randrange(len(base) + 1)
+            messages.append(base[:position] + rng.choice(alphabet) + base[position:])
+        elif kind < 0.7:
+            messages.append(base.upper() if rng.random() < 0.5 else f"  {base}  ")
+        else:
+            messages.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 60))))
+    return messages
+
+
+@pytest.mark.parametrize("texts", [questions, noisy_variants(500)], ids=["intents", "noisy"])
+def test_predict_proba_matches_sklearn(sklearn_model, texts):
+    vectorizer, model = sklearn_model
+    compiled = CompiledClassifier.from_sklearn(vectorizer, model)
+
+    report = verify_equivalence(compiled, vectorizer, model, list(texts))
+
+    assert report["non_identical_rows"] == 0, report
+    assert report["prediction_mismatches"] == 0, report
+
+
+def test_arrays_round_trip(sklearn_model):
+    """The arrays written to the bundle rebuild the same classifier."""
+    vectorizer, model = sklearn_model
+    compiled = CompiledClassifier.from_arrays(CompiledClassifier.from_sklearn(vectorizer, model).to_arrays())
+
+    assert verify_equivalence(compiled, vectorizer, model, list(questions))["non_identical_rows"] == 0
@@ -0,0 +1,44 @@
+"""
+/health must report a preprocessor that cannot serve the model's features
+"""
+
+import os
+
+os.environ.setdefault("START_BACKGROUND_TASKS", "false")
+
+import app
+import preprocessing
+
+
+def health(monkeypatch, required, missing):
+    monkeypatch.setattr(preprocessing, "NLTK_REQUIRED", required)
+    fresh = preprocessing.Preprocessor()
+
+    def load():
+        fresh.missing = tuple(missing)
+        if missing and required:
+            fresh.load_error = "NLTK data missing"
+            raise RuntimeError(fresh.load_error)
+        fresh._ready = True
+
+    monkeypatch.setattr(fresh, "load", load)
+    monkeypatch.setattr(app, "preprocessor", fresh)
+    return app.app.test_client().get("/health")
+
+
+def test_healthy_with_the_nltk_data(monkeypatch):
+    response = health(monkeypatch, required=True, missing=())
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "healthy"
+
+
+def test_unhealthy_when_the_preprocessor_failed_to_load(monkeypatch):
+    response = health(monkeypatch, required=True, missing=("wordnet",))
+    assert response.status_code == 503
+    assert response.get_json()["preprocessing"]["load_error"]
+
+
+def test_unhealthy_when_serving_without_the_nltk_data(monkeypatch):
+    response = health(monkeypatch, required=False, missing=("wordnet",))
+    assert response.status_code == 503
+    assert response.get_json()["preprocessing"]["missing_nltk_data"] == ["wordnet"]
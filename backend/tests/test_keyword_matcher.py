@@ -0,0 +1,115 @@
+"""
+The compiled rule engine and pattern set must answer like the substring
+checks and re.search loop they replaced
+"""
+
+import random
+import re
+
+import pytest
+
+from data import questions, rules_data
+from handle_functions import extract_wikipedia_query, normalize_text, rule_engine, wikipedia_patterns
+from keyword_matcher import PatternSet, RuleEngine
+from model import rule_based_intent
+
+HANDLERS = ("email_recall", "time", "date", "goodbye")
+
+
+def reference_rules(table, message):
+    """Names of the rules of ``table`` fired by ``message``, one substring check per keyword."""
+    msg = normalize_text(message)
+    return [
+        rule["name"] for rule in table
+        if msg in rule.get("exact", []) or any(keyword in msg for keyword in rule.get("contains", []))
+    ]
+
+
+def reference_whole_word_rules(table, message):
+    words = " " + " ".join(re.findall(r"\w+", normalize_text(message))) + " "
+    return [
+        rule["name"] for rule in table
+        if normalize_text(message) in rule.get("exact", [])
+        or any(" " + " ".join(re.findall(r"\w+", keyword)) + " " in words for keyword in rule.get("contains", []))
+    ]
+
+
+def reference_pattern(patterns, message):
+    for index, pattern in enumerate(patterns):
+        match = re.search(pattern, message)
+        if match:
+            return index, match.group(1) if match.re.groups else None
+    return None
+
+
+def messages(count=400, seed=7):
+    """Intent patterns, casing and padding variants and keyword collisions."""
+    rng = random.Random(seed)
+    extra = [
+        "", " ", "hi", "philosophy", "mandate", "Bonjour, quelle heure est-il ?", "NO", "no thanks",
+        "Au revoir et merci", "c'est quoi la date d'aujourd'hui", "rappelle mon email stp",
+        "information about Paris", "search wiki for Ada Lovelace", "who is Marie Curie?",
+        "qui est Victor Hugo", "look up Rome on wikipedia", "tell me about it", "cherche la lune",
+    ]
+    result = list(questions) + extra
+    while len(result) < len(questions) + len(extra) + count:
+        base = rng.choice(questions)
+        left, right = rng.choice(questions), rng.choice(extra)
+        kind = rng.random()
+        if kind < 0.4:
+            result.append(base.upper() if rng.random() < 0.5 else f"  {base}  ")
+        else:
+            result.append(f"{left} {right}" if kind < 0.7 else f"{right}. {left}")
+    return result
+
+
+MESSAGES = messages()
+
+
+def test_rule_based_intent_matches_substring_reference():
+    for message in MESSAGES:
+        expected = reference_rules(rules_data["intent_rules"], message)
+        assert rule_based_intent(message) == (expected[0] if expected else None), message
+
+
+@pytest.mark.parametrize("whole_words", [False, True], ids=["substring", "whole_words"])
+def test_handler_rules_match_substring_reference(whole_words):
+    reference = reference_whole_word_rules if whole_words else reference_rules
+    for message in MESSAGES:
+        scan = rule_engine.scan(message, whole_words=whole_words)
+        expected = reference(rules_data["handler_rules"], message)
+        for name in HANDLERS:
+            assert scan.fired("handler", name) == (name in expected), (message, name)
+
+
+def test_wikipedia_patterns_match_first_re_search():
+    patterns = rules_data["wikipedia_patterns"]
+    for message in MESSAGES:
+        text = message.lower()
+        assert wikipedia_patterns.search(text) == reference_pattern(patterns, text), message
+
+
+def test_accented_keywords_are_normalized_at_build_time():
+    # The old checks normalized the message but not the keyword, so "téléphone" could never fire
+    table = [{"name": "contact", "contains": ["téléphone"]}]
+    engine = RuleEngine({"intent": table}, normalizer=normalize_text)
+
+    assert not any("téléphone" in normalize_text(message) for message in ("mon téléphone", "mon telephone"))
+    assert engine.scan("mon téléphone").first("intent") == "contact"
+    assert engine.scan("Mon TELEPHONE").first("intent") == "contact"
+
+
+def test_information_and_search_for_are_separate_patterns():
+    # A missing comma once fused these two into one pattern that matched neither phrase
+    patterns = rules_data["wikipedia_patterns"]
+    information = r"(?:information|info)\s+(?:about|on)\s+(.+)"
+    search_for = r"search (?:wikipedia |wiki )?for (.+)"
+    fused = PatternSet([information + search_for])
+
+    assert information in patterns and search_for in patterns
+    assert fused.search("information about paris") is None
+    assert fused.search("search for paris") is None
+
+    assert wikipedia_patterns.search("information about paris") == (patterns.index(information), "paris")
+    assert PatternSet([search_for]).search("search wiki for paris") == (0, "paris")
+    assert extract_wikipedia_query("Information about Paris?") == "paris"
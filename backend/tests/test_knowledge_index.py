@@ -0,0 +1,92 @@
+"""
+Offline knowledge index: chunked build and title matches beyond the champion lists
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import knowledge_index
+from knowledge_index import KnowledgeIndex, build_index
+
+ARRAYS = ("terms", "term_offsets", "postings_docs", "postings_tf", "doc_lengths", "doc_offsets",
+          "champion_terms", "champion_offsets", "champion_docs", "champion_tf", "title_hashes", "title_docs")
+
+
+def write_articles(path, articles):
+    with open(path, "w", encoding="utf-8") as f:
+        for title, abstract in articles:
+            f.write(json.dumps({"title": title, "abstract": abstract}) + "\n")
+    return path
+
+
+@pytest.fixture
+def articles():
+    # Many short pages that repeat "victor hugo" outscore the article itself on
+    # term impact, so a small champion list leaves the article out
+    pages = [(f"Hugo tribute {i}", "Victor Hugo. " * (1 + i % 3) + f"Tribute number {i}.") for i in range(40)]
+    pages.insert(17, ("Victor Hugo", "French Romantic writer, poet and politician, author of Les Misérables "
+                                     "and The Hunchback of Notre-Dame, born in Besançon in 1802."))
+    pages.append(("Élysée Palace", "Official residence of the President of the French Republic in Paris."))
+    pages += [(f"Filler {i}", f"Unrelated article number {i} about gardening and tools.") for i in range(60)]
+    return pages
+
+
+@pytest.fixture
+def index(tmp_path, articles):
+    source = write_articles(tmp_path / "articles.jsonl", articles)
+    build_index([source], tmp_path / "index", champion_size=5)
+    opened = KnowledgeIndex(tmp_path / "index")
+    yield opened
+    opened.close()
+
+
+def test_chunked_build_matches_single_chunk_build(tmp_path, monkeypatch, articles):
+    source = write_articles(tmp_path / "articles.jsonl", articles)
+    build_index([source], tmp_path / "single", champion_size=5)
+
+    monkeypatch.setattr(knowledge_index, "CHUNK_POSTINGS", 7)
+    build_index([source], tmp_path / "chunked", champion_size=5)
+
+    for name in ARRAYS:
+        single = np.load(tmp_path / "single" / f"{name}.npy")
+        chunked = np.load(tmp_path / "chunked" / f"{name}.npy")
+        assert single.dtype == chunked.dtype, name
+        assert np.array_equal(single, chunked), name
+    assert not list((tmp_path / "chunked").glob("chunk-*"))
+
+
+def test_postings_are_sorted_by_term_then_doc(index):
+    assert np.all(np.diff(index.terms.astype(np.float64)) > 0)
+    for position in range(len(index.terms)):
+        start, end = index.term_offsets[position], index.term_offsets[position + 1]
+        assert np.all(np.diff(index.postings_docs[start:end].astype(np.int64)) > 0)
+
+
+def test_title_match_outside_the_champion_list_is_scored(index):
+    hugo = [doc for doc in range(index.documents) if index.document(doc)["title"] == "Victor Hugo"][0]
+    for token in ("victor", "hugo"):
+        docs, _, df, complete = index._postings(token)
+        assert not complete and df > len(docs)
+        assert hugo not in docs
+
+    assert index.lookup("victor hugo")["title"] == "Victor Hugo"
+
+
+def test_normalized_title_match(index):
+    assert index.lookup("Who is VICTOR   Hugo?")["title"] == "Victor Hugo"
+    assert index.lookup("elysee palace")["title"] == "Élysée Palace"
+
+
+def test_title_match_score_is_full_bm25(index):
+    result = index.search("victor hugo", limit=1)[0]
+    hugo = [doc for doc in range(index.documents) if index.document(doc)["title"] == "Victor Hugo"][0]
+
+    expected = index._exact_scores(["victor", "hugo"], np.array([hugo])) * index.title_boost
+    assert result["score"] == pytest.approx(float(expected[0]))
+
+
+def test_unknown_query_finds_nothing(index):
+    assert index.search("zorblat quintuple") == []
+    assert index.lookup("zorblat") is None
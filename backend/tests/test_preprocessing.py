@@ -0,0 +1,82 @@
+"""
+Training and inference must build the same features from a message
+"""
+
+import pickle
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+import model
+from data import questions
+from preprocessing import preprocessor
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / "models" / "chatbot_model.pkl"
+
+pytestmark = pytest.mark.usefixtures("nltk_provisioned")
+
+
+def sample_messages(count, seed=7):
+    """The intent patterns plus combined, shouted and punctuated variants."""
+    rng = random.Random(seed)
+    messages = list(questions)
+    while len(messages) < count:
+        first, second = rng.choice(questions), rng.choice(questions)
+        messages.append(f"{first}, {second.upper()}!" if rng.random() < 0.5 else first + "?")
+    return messages
+
+
+MESSAGES = sample_messages(2000)
+
+
+def legacy_preprocess():
+    """The former model.preprocess(), preprocessing version 1 that the bundled model was trained with."""
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+
+    try:
+        stop_words = set(stopwords.words("french")) | set(stopwords.words("english"))
+        lemmatizer = WordNetLemmatizer()
+        lemmatizer.lemmatize("tests")
+    except LookupError as e:
+        # Only when NLTK_REQUIRED=false lets the preprocessor load without it
+        pytest.skip(f"NLTK data not provisioned (python provision_nltk.py): {e}")
+
+    def preprocess(text):
+        text = re.sub(r"[^\w\s]", "", text.lower())
+        words = text.split()
+        if len(words) <= 3:
+            return " ".join(lemmatizer.lemmatize(w) for w in words)
+        return " ".join(lemmatizer.lemmatize(w) for w in words if w not in stop_words)
+
+    return preprocess
+
+
+@pytest.fixture(scope="module")
+def vectorizer():
+    with open(MODEL_PATH, "rb") as f:
+        return pickle.load(f)["vectorizer"]
+
+
+def test_training_and_inference_texts_match():
+    # train_model_script.py transforms the corpus, /chat one message at a time
+    train_texts = preprocessor.transform(MESSAGES)
+    serve_texts = [model.nettoyer(message) for message in MESSAGES]
+
+    assert train_texts == serve_texts
+    assert [model.preprocess(message) for message in MESSAGES] == train_texts
+
+
+def test_training_and_inference_features_match(vectorizer):
+    train_features = vectorizer.transform(preprocessor.transform(MESSAGES))
+    serve_features = vectorizer.transform([model.nettoyer(message) for message in MESSAGES])
+
+    assert (train_features != serve_features).nnz == 0
+
+
+def test_matches_the_transform_the_model_was_trained_with():
+    legacy = legacy_preprocess()
+
+    assert preprocessor.transform(MESSAGES) == [legacy(message) for message in MESSAGES]
@@ -0,0 +1,143 @@
+"""
+Session records, ring-buffer history, expiry and eviction of the session store
+"""
+
+import pytest
+
+from session_manager import HISTORY_LIMIT, SESSION_BYTES, Session, SessionManager
+
+
+def manager(**kwargs):
+    kwargs.setdefault("max_sessions", 0)
+    kwargs.setdefault("max_bytes", 0)
+    return SessionManager(session_timeout_minutes=30, **kwargs)
+
+
+def age(store, session_id, minutes):
+    """Move a session's last activity back without touching it; callers age the oldest sessions, so order is kept."""
+    store._shard(session_id).sessions[session_id].last_activity -= minutes * 60
+
+
+def test_history_keeps_the_last_exchanges_in_order():
+    store = manager()
+    for turn in range(HISTORY_LIMIT + 7):
+        store.add_to_history("s", f"question {turn}", f"answer {turn}", "greeting")
+
+    history = store.get_history("s", limit=HISTORY_LIMIT + 10)
+    assert len(history) == HISTORY_LIMIT
+    assert [entry["user"] for entry in history] == [f"question {turn}" for turn in range(7, HISTORY_LIMIT + 7)]
+    assert [entry["user"] for entry in store.get_history("s", limit=3)] == [
+        f"question {turn}" for turn in range(HISTORY_LIMIT + 4, HISTORY_LIMIT + 7)
+    ]
+    assert store.get_session("s").exchanges() == HISTORY_LIMIT
+    assert store.get_stats()["total_conversations"] == HISTORY_LIMIT
+
+
+def test_conversation_history_matches_get_history():
+    store = manager()
+    for turn in range(HISTORY_LIMIT + 3):
+        store.add_to_history("s", f"q{turn}", f"a{turn}", "hours")
+
+    session = store.get_session("s")
+    assert session.get("conversation_history") == store.get_history("s", limit=HISTORY_LIMIT)
+    assert session["conversation_history"] == session.get_history(HISTORY_LIMIT)
+    assert set(session.get("conversation_history")[0]) == {"user", "bot", "intent", "timestamp"}
+
+
+def test_session_reads_like_a_dict():
+    store = manager()
+    store.update_session("s", user_name="Amal", email="amal@example.com", last_intent="greeting", unknown="x")
+    session = store.get_session("s")
+
+    assert session.get("user_name") == "Amal"
+    assert session["email"] == "amal@example.com"
+    assert session.get("last_intent") == "greeting"
+    assert session.get("name_asked") is False
+    assert session.get("unknown", "default") == "default"
+    assert session.get("created_at") <= session.get("last_activity")
+    with pytest.raises(KeyError):
+        session["unknown"]
+    # A new session is still truthy
+    assert Session(0.0)
+
+
+def test_cleanup_removes_expired_sessions():
+    store = manager(shards=1)
+    for session_id in ("old-1", "old-2", "fresh"):
+        store.add_to_history(session_id, "hello", "hi", "greeting")
+    age(store, "old-1", 31)
+    age(store, "old-2", 31)
+
+    assert store.cleanup_expired_sessions() == 2
+    stats = store.get_stats()
+    assert stats["total_sessions"] == 1
+    assert stats["expired_sessions"] == 2
+    assert stats["total_conversations"] == 1
+    assert store.cleanup_expired_sessions() == 0
+
+
+def test_expired_session_starts_over():
+    store = manager()
+    store.update_session("s", user_name="Amal")
+    age(store, "s", 31)
+
+    assert store.get_session("s").get("user_name") is None
+    assert store.get_stats()["expired_sessions"] == 1
+
+
+def test_max_sessions_evicts_the_least_recently_used():
+    store = manager(shards=1, max_sessions=3)
+    for session_id in ("a", "b", "c"):
+        store.get_session(session_id)
+    store.get_session("a")  # now the most recent
+    store.get_session("d")
+    store.get_session("e")
+
+    assert [session_id for shard in store.shards for session_id in shard.sessions] == ["a", "d", "e"]
+    stats = store.get_stats()
+    assert stats["total_sessions"] == 3
+    assert stats["evicted_sessions"] == 2
+
+
+def test_max_bytes_evicts_sessions_over_the_budget():
+    store = manager(shards=1, max_bytes=SESSION_BYTES * 3)
+    for session_id in ("a", "b", "c"):
+        store.get_session(session_id)
+    # History grows "c" past the budget: the oldest sessions go, never the one in use
+    store.add_to_history("c", "x" * 200, "y" * 200, "greeting")
+
+    assert list(store.shards[0].sessions) == ["c"]
+    stats = store.get_stats()
+    assert stats["evicted_sessions"] == 2
+    assert stats["memory_bytes"] == store.get_session("c").size
+
+
+def test_counters_return_to_zero_after_clear_session():
+    store = manager()
+    for session_id in ("a", "b"):
+        for turn in range(HISTORY_LIMIT + 5):
+            store.add_to_history(session_id, f"q{turn}", f"a{turn}", "hours")
+
+    assert store.get_stats()["total_conversations"] == 2 * HISTORY_LIMIT
+    assert store.clear_session("a")
+    assert store.clear_session("b")
+    assert not store.clear_session("b")
+
+    stats = store.get_stats()
+    assert stats["total_sessions"] == 0
+    assert stats["total_conversations"] == 0
+    assert stats["memory_bytes"] == 0
+
+
+def test_active_count_stops_at_idle_sessions():
+    store = manager(shards=2)
+    for i in range(10):
+        store.get_session(f"idle-{i}")
+    for i in range(10):
+        age(store, f"idle-{i}", 10)
+    for i in range(3):
+        store.get_session(f"active-{i}")
+
+    stats = store.get_stats()
+    assert stats["total_sessions"] == 13
+    assert stats["active_last_5min"] == 3
@@ -0,0 +1,144 @@
+"""
+The Wikipedia client against the local MediaWiki stand-in (benchmarks/fake_wikipedia.py)
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from fake_wikipedia import FakeWikipediaServer
+from wikipedia_client import WikipediaClient, WikipediaLookupError
+
+DELAY_MS = 300
+
+
+@pytest.fixture
+def server():
+    with FakeWikipediaServer() as fake:
+        yield fake
+
+
+@pytest.fixture
+def slow_server():
+    with FakeWikipediaServer(delay_ms=DELAY_MS) as fake:
+        yield fake
+
+
+def test_lookup_is_one_query_request_per_language(server):
+    client = WikipediaClient(api_url=server.api_url)
+
+    outcomes = client.lookup_many("victor hugo", ["en", "fr"])
+
+    assert outcomes["en"]["title"] == "Victor Hugo"
+    assert outcomes["en"]["url"] == "https://en.wikipedia.org/wiki/Victor_Hugo"
+    assert outcomes["fr"]["summary"].startswith("Victor Hugo est un poète")
+
+    queries = server.stats["queries"]
+    assert sorted(path for path, _ in queries) == ["/en/w/api.php", "/fr/w/api.php"]
+    for _, params in queries:
+        assert params["action"] == "query"
+        assert params["generator"] == "search"
+        assert params["gsrsearch"] == "victor hugo"
+
+
+def test_disambiguation_pages_are_skipped(server):
+    client = WikipediaClient(api_url=server.api_url)
+
+    assert client.lookup("mercury", "en")["title"] == "Mercury (planet)"
+
+
+def test_not_found_is_none_not_an_error(server):
+    client = WikipediaClient(api_url=server.api_url)
+
+    assert client.lookup_many("zorblat quintuple", ["en", "fr"]) == {"en": None, "fr": None}
+    assert client.lookup("baguette", "xx") is None
+
+
+def test_languages_are_queried_concurrently(slow_server):
+    client = WikipediaClient(api_url=slow_server.api_url)
+    client.warm_up()
+
+    started = time.perf_counter()
+    outcomes = client.lookup_many("victor hugo", ["en", "fr"])
+    elapsed = time.perf_counter() - started
+
+    assert outcomes["en"] and outcomes["fr"]
+    assert elapsed < 2 * DELAY_MS / 1000
+
+
+def test_slow_languages_report_a_timeout(slow_server):
+    client = WikipediaClient(api_url=slow_server.api_url, read_timeout=5)
+
+    outcomes = client.lookup_many("paris", ["en", "fr"], timeout=DELAY_MS / 1000 / 3)
+
+    assert all(isinstance(outcome, WikipediaLookupError) for outcome in outcomes.values())
+    assert "timed out" in str(outcomes["en"])
+
+
+def test_read_timeout_raises_lookup_error(slow_server):
+    client = WikipediaClient(api_url=slow_server.api_url, read_timeout=DELAY_MS / 1000 / 3)
+
+    with pytest.raises(WikipediaLookupError):
+        client.lookup("paris", "en")
+
+
+def test_http_errors_raise_lookup_error(server):
+    client = WikipediaClient(api_url=server.api_url.replace("/w/api.php", "/api.php"))
+
+    with pytest.raises(WikipediaLookupError):
+        client.lookup("paris", "en")
+
+
+def test_async_lookup_matches_blocking_lookup(server):
+    client = WikipediaClient(api_url=server.api_url)
+
+    async def run():
+        try:
+            return await client.lookup_many_async("victor hugo", ["en", "fr"])
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == client.lookup_many("victor hugo", ["en", "fr"])
+    assert len(server.stats["queries"]) == 4
+
+
+def test_async_timeout_and_not_found(slow_server):
+    client = WikipediaClient(api_url=slow_server.api_url)
+
+    async def run():
+        try:
+            slow = await client.lookup_many_async("paris", ["en", "fr"], timeout=DELAY_MS / 1000 / 3)
+            missing = await client.lookup_many_async("zorblat quintuple", ["en"])
+            return slow, missing
+        finally:
+            await client.aclose()
+
+    slow, missing = asyncio.run(run())
+
+    assert all(isinstance(outcome, WikipediaLookupError) for outcome in slow.values())
+    assert missing == {"en": None}
+
+
+def test_async_client_is_closed_when_the_loop_changes_and_on_aclose(server):
+    client = WikipediaClient(api_url=server.api_url)
+
+    async def lookup(close=False):
+        await client.lookup_async("paris", "en")
+        current = client._async_client
+        if close:
+            await client.aclose()
+        return current
+
+    first = asyncio.run(lookup())
+    second = asyncio.run(lookup(close=True))
+
+    # The first loop is gone, so its client is closed when the second loop takes over
+    assert second is not first
+    assert first.is_closed
+    assert second.is_closed
+    assert client._async_client is None
@@ -1,10 +1,12 @@
 
-
 import sys
+import time
+import argparse
+from datetime import datetime
 from pathlib import Path
 import logging
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
+from sklearn.metrics import classification_report
 import json
 
 # Set up logging
@@ -16,40 +18,60 @@ logger = logging.getLogger(__name__)
 
 # Import your model training function
 try:
-    from model import train_model, save_model, preprocess, MODEL_PATH
+    from model import save_model, preprocessor, MODEL_PATH
     from data import questions, labels
+    from training import (DEFAULT_GRID, DEFAULT_PARAMS, CLASSIFIERS, fit, grid_search, evaluate,
+                          model_size, inference_latency)
 except ImportError as e:
     logger.error(f"Import error: {e}")
     logger.error("Make sure model.py and data.py are in the same directory")
     sys.exit(1)
 
+METRICS_PATH = MODEL_PATH.parent / "metrics.json"
+REPORT_PATH = MODEL_PATH.parent / "training_report.json"
+
 
 def evaluate_model(vectorizer, model, X, y):
-   
+    """Held-out metrics; X is already normalized."""
+
     logger.info("Evaluating model...")
 
-    # Transform test data
-    X_processed = [preprocess(x) for x in X]
-    X_vec = vectorizer.transform(X_processed)
+    metrics = evaluate(vectorizer, model, X, y)
+
+    logger.info(f"Accuracy: {metrics['accuracy']:.2%}")
+    logger.info("\nClassification Report:")
+    print(classification_report(y, model.predict(vectorizer.transform(X)), zero_division=0))
 
-    # Predict
-    y_pred = model.predict(X_vec)
+    return metrics
 
-    # Calculate metrics
-    accuracy = accuracy_score(y, y_pred)
 
-    logger.info(f"Accuracy: {accuracy:.2%}")
-    logger.info("\nClassification Report:")
-    print(classification_report(y, y_pred))
+def parse_ngram_range(value):
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
 
-    return {
-        "accuracy": float(accuracy),
-        "total_samples": len(y)
-    }
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train, cross-validate and tune the intent classifier")
+    parser.add_argument("--folds", type=int, default=5, help="Stratified folds of the grid search")
+    parser.add_argument("--workers", type=int, default=None, help="Search processes (default: all CPUs)")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Held-out share of the patterns")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--classifiers", nargs="+", choices=CLASSIFIERS, default=DEFAULT_GRID["classifier"])
+    parser.add_argument("--ngram-ranges", nargs="+", type=parse_ngram_range, metavar="MIN-MAX",
+                        default=DEFAULT_GRID["ngram_range"])
+    parser.add_argument("--max-features", nargs="+", type=lambda v: None if v == "none" else int(v),
+                        default=DEFAULT_GRID["max_features"], help="Vocabulary sizes ('none' for unlimited)")
+    parser.add_argument("--C", nargs="+", type=float, default=DEFAULT_GRID["C"], dest="C",
+                        help="Inverse regularization strengths")
+    parser.add_argument("--no-search", action="store_true",
+                        help="Train with the default parameters (training.DEFAULT_PARAMS)")
+    return parser.parse_args(argv)
 
-def main():
+
+def main(argv=None):
     """Main training function"""
+    args = parse_args(argv)
+
     logger.info("=" * 60)
     logger.info("CHATBOT MODEL TRAINING")
     logger.info("=" * 60)
@@ -63,13 +85,22 @@ def main():
     logger.info(f"Training data: {len(questions)} samples")
     logger.info(f"Unique labels: {len(set(labels))}")
 
-    # Split data for evaluation (80/20)
+    # Preprocess the corpus once: every fit below works on these texts
+    started = time.perf_counter()
+    try:
+        corpus = preprocessor.transform(questions)
+    except RuntimeError as e:
+        logger.error(f"✗ {e}")
+        return False
+    logger.info(f"Corpus preprocessed in {time.perf_counter() - started:.2f}s")
+
+    # Split data for evaluation (80/20); the test set is only used for the final report
     try:
         X_train, X_test, y_train, y_test = train_test_split(
-            questions,
+            corpus,
             labels,
-            test_size=0.2,
-            random_state=42,
+            test_size=args.test_size,
+            random_state=args.seed,
             stratify=labels
         )
         logger.info(f"Train set: {len(X_train)} samples")
@@ -77,42 +108,84 @@ def main():
     except Exception as e:
         logger.warning(f"Could not split data: {e}")
         logger.warning("Training on full dataset without evaluation")
-        X_train, X_test = questions, []
+        X_train, X_test = corpus, []
         y_train, y_test = labels, []
 
-    # Train model
-    try:
-        logger.info("\nTraining model...")
-
-        # Create custom training data structure
-
-        vectorizer, model = train_model()
-        logger.info("✓ Model trained successfully!")
-
-    except Exception as e:
-        logger.error(f"✗ Error training model: {e}")
-        return False
+    # Pick the parameters by cross-validation on the training set
+    search = []
+    params = dict(DEFAULT_PARAMS)
+    if not args.no_search:
+        try:
+            grid = {
+                "classifier": args.classifiers,
+                "ngram_range": args.ngram_ranges,
+                "max_features": args.max_features,
+                "C": args.C,
+            }
+            search = grid_search(X_train, y_train, grid, n_splits=args.folds, seed=args.seed,
+                                 workers=args.workers)
+            params = search[0]["params"]
+
+            logger.info("\nBest parameter sets (cross-validated accuracy, macro F1):")
+            for result in search[:5]:
+                logger.info(f"  {result['accuracy']:.2%} ± {result['accuracy_std']:.2%}, "
+                            f"F1 {result['macro_f1']:.3f}  {result['params']}")
+        except Exception as e:
+            logger.warning(f"Grid search failed, using the default parameters: {e}")
 
-    # Evaluate if we have test data
+    # Train on the training set only, so the test metrics are not leaked
     metrics = {}
     if X_test and y_test:
         try:
+            logger.info(f"\nTraining on the train set with {params}...")
+            vectorizer, model = fit(X_train, y_train, params)
             metrics = evaluate_model(vectorizer, model, X_test, y_test)
         except Exception as e:
             logger.warning(f"Could not evaluate model: {e}")
 
+    # The served model learns from every pattern
+    try:
+        logger.info("\nTraining model on all patterns...")
+        vectorizer, model = fit(corpus, labels, params)
+        logger.info("✓ Model trained successfully!")
+
+    except Exception as e:
+        logger.error(f"✗ Error training model: {e}")
+        return False
+
     # Save model
     try:
         logger.info(f"\nSaving model to {MODEL_PATH}...")
         save_model(vectorizer, model)
         logger.info("✓ Model saved successfully!")
 
+        size = model_size(vectorizer, model)
+        latency = inference_latency(vectorizer, model, X_test or corpus)
+        logger.info(f"Model size: {size['features']} features, {size['compiled_bytes'] / 1024:.0f} KiB served, "
+                    f"{size['pickle_bytes'] / 1024:.0f} KiB pickled")
+        logger.info(f"Inference latency per message: p50 {latency['p50_us']:.0f} µs, "
+                    f"p95 {latency['p95_us']:.0f} µs")
+
         # Save metrics
         if metrics:
-            metrics_path = MODEL_PATH.parent / "metrics.json"
-            with open(metrics_path, 'w') as f:
-                json.dump(metrics, f, indent=2)
-            logger.info(f"✓ Metrics saved to {metrics_path}")
+            summary = {key: metrics[key] for key in ("accuracy", "macro_f1", "total_samples")}
+            summary["params"] = params
+            with open(METRICS_PATH, 'w') as f:
+                json.dump(summary, f, indent=2)
+            logger.info(f"✓ Metrics saved to {METRICS_PATH}")
+
+        report = {
+            "trained_at": datetime.utcnow().isoformat(),
+            "samples": {"total": len(corpus), "train": len(X_train), "test": len(X_test)},
+            "params": params,
+            "test": metrics,
+            "model_size": size,
+            "inference_latency": latency,
+            "search": {"folds": args.folds, "results": search},
+        }
+        with open(REPORT_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"✓ Training report saved to {REPORT_PATH}")
 
     except Exception as e:
         logger.error(f"✗ Error saving model: {e}")
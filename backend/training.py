@@ -0,0 +1,210 @@
+"""
+Training pipeline: estimators, cross-validated evaluation and hyperparameter search
+Used by train_model_script.py and model.train_model. Imports scikit-learn, so
+it is only loaded to train. Texts are already normalized (preprocessing.preprocessor):
+the corpus is preprocessed once and shared by every fit.
+"""
+
+import os
+import time
+import pickle
+import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, classification_report, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+from compiled_model import CompiledClassifier
+
+logger = logging.getLogger(__name__)
+
+CLASSIFIERS = ("logreg", "sgd")
+
+# The served model's settings
+DEFAULT_PARAMS = {
+    "classifier": "logreg",
+    "ngram_range": (1, 3),
+    "max_features": 5000,
+    "C": 1.0,
+}
+
+# Searched by train_model_script.py unless narrowed on the command line
+DEFAULT_GRID = {
+    "classifier": ["logreg", "sgd"],
+    "ngram_range": [(1, 3), (2, 4), (1, 4)],
+    "max_features": [2000, 5000, None],
+    "C": [1.0, 10.0],
+}
+
+
+def build_estimators(params=None, n_samples=None):
+    """
+    Unfitted vectorizer and classifier for training parameters (see
+    DEFAULT_PARAMS). Both classifiers give probabilities and compile
+    (compiled_model.CompiledClassifier); for 'sgd', C sets the L2 penalty
+    alpha = 1 / (C * n_samples), as in logistic regression.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+
+    vectorizer = TfidfVectorizer(
+        analyzer="char_wb",
+        ngram_range=tuple(params["ngram_range"]),
+        max_df=0.8,
+        min_df=1,
+        max_features=params["max_features"],
+    )
+
+    if params["classifier"] == "logreg":
+        model = LogisticRegression(
+            max_iter=2000,
+            C=params["C"],
+            class_weight='balanced',  # Handle imbalanced classes
+            random_state=42
+        )
+    elif params["classifier"] == "sgd":
+        model = SGDClassifier(
+            loss="log_loss",
+            alpha=1.0 / (params["C"] * (n_samples or 1000)),
+            max_iter=1000,
+            tol=1e-4,
+            class_weight='balanced',
+            random_state=42
+        )
+    else:
+        raise ValueError(f"Unknown classifier {params['classifier']!r}, expected one of {CLASSIFIERS}")
+
+    return vectorizer, model
+
+
+def fit(texts, labels, params=None):
+    """Fit a vectorizer and classifier on normalized texts. Returns (vectorizer, model)."""
+    vectorizer, model = build_estimators(params, n_samples=len(texts))
+    model.fit(vectorizer.fit_transform(texts), labels)
+    return vectorizer, model
+
+
+def param_grid(grid):
+    """Every combination of a {name: [values]} grid, as parameter dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def cross_validate(texts, labels, params=None, n_splits=5, seed=42):
+    """
+    Stratified k-fold accuracy and macro F1 of one parameter set. Intents
+    with fewer patterns than folds are only in some of the training folds.
+    """
+    texts = np.asarray(texts, dtype=object)
+    labels = np.asarray(labels, dtype=object)
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+
+    accuracies, macro_f1, fit_ms = [], [], []
+    for train_index, test_index in folds.split(texts, labels):
+        started = time.perf_counter()
+        vectorizer, model = fit(texts[train_index].tolist(), labels[train_index].tolist(), params)
+        fit_ms.append((time.perf_counter() - started) * 1000)
+
+        predicted = model.predict(vectorizer.transform(texts[test_index].tolist()))
+        accuracies.append(accuracy_score(labels[test_index], predicted))
+        macro_f1.append(f1_score(labels[test_index], predicted, average="macro", zero_division=0))
+
+    return {
+        "params": {**DEFAULT_PARAMS, **(params or {})},
+        "accuracy": float(np.mean(accuracies)),
+        "accuracy_std": float(np.std(accuracies)),
+        "macro_f1": float(np.mean(macro_f1)),
+        "fold_accuracies": [float(a) for a in accuracies],
+        "fit_ms": float(np.mean(fit_ms)),
+    }
+
+
+# Corpus of a search worker, sent once per process instead of with every task
+_corpus = None
+
+
+def _init_worker(texts, labels):
+    global _corpus
+    _corpus = (texts, labels)
+
+
+def _cross_validate_task(params, n_splits, seed):
+    texts, labels = _corpus
+    return cross_validate(texts, labels, params, n_splits=n_splits, seed=seed)
+
+
+def grid_search(texts, labels, grid=None, n_splits=5, seed=42, workers=None):
+    """
+    Cross-validate every parameter set of ``grid`` (DEFAULT_GRID) across a
+    process pool of ``workers`` processes (all CPUs by default, 1 runs inline).
+    Returns the results, best (accuracy, then macro F1) first.
+    """
+    candidates = param_grid(grid or DEFAULT_GRID)
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    logger.info(f"Grid search: {len(candidates)} parameter sets x {n_splits} folds on {workers} process(es)")
+
+    started = time.perf_counter()
+    if workers <= 1:
+        _init_worker(texts, labels)
+        results = [_cross_validate_task(params, n_splits, seed) for params in candidates]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(list(texts), list(labels))) as pool:
+            results = list(pool.map(_cross_validate_task, candidates,
+                                    itertools.repeat(n_splits), itertools.repeat(seed)))
+    logger.info(f"Grid search finished in {time.perf_counter() - started:.1f}s")
+
+    return sorted(results, key=lambda r: (r["accuracy"], r["macro_f1"]), reverse=True)
+
+
+def evaluate(vectorizer, model, texts, labels):
+    """Accuracy and per-intent precision, recall and F1 on normalized texts."""
+    predicted = model.predict(vectorizer.transform(texts))
+    report = classification_report(labels, predicted, output_dict=True, zero_division=0)
+    per_intent = {
+        intent: {key: float(value) for key, value in scores.items()}
+        for intent, scores in report.items()
+        if intent not in ("accuracy", "macro avg", "weighted avg")
+    }
+    return {
+        "accuracy": float(accuracy_score(labels, predicted)),
+        "macro_f1": float(report["macro avg"]["f1-score"]),
+        "total_samples": len(labels),
+        "per_intent": per_intent,
+    }
+
+
+def model_size(vectorizer, model):
+    """Bytes of the pickled model and of the arrays the bundle serves."""
+    compiled = CompiledClassifier.from_sklearn(vectorizer, model)
+    return {
+        "features": len(compiled.terms),
+        "pickle_bytes": len(pickle.dumps({"vectorizer": vectorizer, "model": model})),
+        "compiled_bytes": int(sum(np.asarray(array).nbytes for array in compiled.to_arrays().values())),
+    }
+
+
+def inference_latency(vectorizer, model, texts, repeats=20):
+    """
+    Per-message latency of the served (compiled) classifier on normalized
+    texts, one message per call as in /chat, in microseconds.
+    """
+    compiled = CompiledClassifier.from_sklearn(vectorizer, model)
+    compiled.predict_proba(list(texts))
+
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            compiled.predict_proba([text])
+            timings.append((time.perf_counter() - started) * 1e6)
+
+    return {
+        "messages": len(timings),
+        "p50_us": float(np.percentile(timings, 50)),
+        "p95_us": float(np.percentile(timings, 95)),
+        "p99_us": float(np.percentile(timings, 99)),
+    }
@@ -0,0 +1,217 @@
+"""
+Persistent cache for Wikipedia lookups
+SQLite-backed, shared by every worker process and kept across restarts
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wikipedia_cache (
+    lang TEXT NOT NULL,
+    query TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    title TEXT,
+    summary TEXT,
+    url TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (lang, query)
+);
+CREATE INDEX IF NOT EXISTS idx_wikipedia_cache_accessed ON wikipedia_cache (accessed_at);
+"""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class WikipediaCache:
+    """
+    TTL cache of Wikipedia answers keyed by (language, normalized query).
+
+    Found articles are kept for ttl_seconds, "not found" answers for the
+    shorter negative_ttl_seconds. When the table grows past max_entries,
+    expired rows go first, then the least recently used ones.
+    """
+
+    # Only refresh accessed_at when it is older than this, to avoid a write per hit
+    TOUCH_INTERVAL = 60.0
+    # How many stores happen between two size checks
+    EVICTION_CHECK_EVERY = 100
+
+    def __init__(self, path, ttl_seconds: float = 7 * 24 * 3600, negative_ttl_seconds: float = 3600,
+                 max_entries: int = 50000):
+        """
+        Initialize the cache. The database is opened lazily on first use.
+
+        Args:
+            path: SQLite file shared by all workers (None disables the cache)
+            ttl_seconds: Lifetime of a found article
+            negative_ttl_seconds: Lifetime of a "not found" entry
+            max_entries: Upper bound on stored rows
+        """
+        self.path = Path(path) if path else None
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self.max_entries = max_entries
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stores_since_check = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, lang: str, query: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Look up a query.
+
+        Returns (hit, article): hit is False when nothing valid is cached;
+        article is None for a cached "not found".
+        """
+        if not self.enabled:
+            return False, None
+
+        try:
+            conn = self._connection()
+            now = time.time()
+            row = conn.execute(
+                "SELECT found, title, summary, url, accessed_at FROM wikipedia_cache "
+                "WHERE lang = ? AND query = ? AND expires_at > ?",
+                (lang, normalize_query(query), now),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Wikipedia cache read failed: {e}")
+            self._count("errors")
+            return False, None
+
+        if row is None:
+            self._count("misses")
+            return False, None
+
+        found, title, summary, url, accessed_at = row
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            try:
+                conn.execute(
+                    "UPDATE wikipedia_cache SET accessed_at = ? WHERE lang = ? AND query = ?",
+                    (now, lang, normalize_query(query)),
+                )
+            except sqlite3.Error as e:
+                logger.debug(f"Wikipedia cache touch failed: {e}")
+
+        if not found:
+            self._count("negative_hits")
+            return True, None
+
+        self._count("hits")
+        return True, {"title": title, "summary": summary, "url": url}
+
+    def put(self, lang: str, query: str, article: Optional[Dict]):
+        """Store a found article, or a negative entry when ``article`` is None."""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        ttl = self.ttl if article else self.negative_ttl
+        article = article or {}
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO wikipedia_cache "
+                "(lang, query, found, title, summary, url, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (lang, normalize_query(query), 1 if article else 0, article.get("title"),
+                 article.get("summary"), article.get("url"), now + ttl, now),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Wikipedia cache write failed: {e}")
+            self._count("errors")
+            return
+
+        with self._stats_lock:
+            self.stores += 1
+            self._stores_since_check += 1
+            check = self._stores_since_check >= self.EVICTION_CHECK_EVERY
+            if check:
+                self._stores_since_check = 0
+
+        if check:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows, then the least recently used ones above max_entries."""
+        if not self.enabled:
+            return 0
+
+        try:
+            conn = self._connection()
+            removed = conn.execute("DELETE FROM wikipedia_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+            (count,) = conn.execute("SELECT COUNT(*) FROM wikipedia_cache").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM wikipedia_cache WHERE rowid IN "
+                    "(SELECT rowid FROM wikipedia_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Wikipedia cache eviction failed: {e}")
+            self._count("errors")
+            return 0
+
+        if removed:
+            logger.info(f"Evicted {removed} Wikipedia cache entries")
+            with self._stats_lock:
+                self.evictions += removed
+        return removed
+
+    def get_stats(self) -> Dict:
+
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "path": str(self.path) if self.path else None,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
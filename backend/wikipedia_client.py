@@ -0,0 +1,266 @@
+"""
+Wikipedia client
+Pooled keep-alive HTTP, one MediaWiki API call per answer, languages queried concurrently.
+Blocking lookups go through requests and a thread pool; the *_async ones
+(asgi.py) through an httpx.AsyncClient on the running event loop.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+WIKIPEDIA_API_URL = os.getenv('WIKIPEDIA_API_URL', 'https://{lang}.wikipedia.org/w/api.php')
+WIKIPEDIA_CONNECT_TIMEOUT = float(os.getenv('WIKIPEDIA_CONNECT_TIMEOUT', '1.5'))
+WIKIPEDIA_READ_TIMEOUT = float(os.getenv('WIKIPEDIA_READ_TIMEOUT', '3'))
+WIKIPEDIA_POOL_SIZE = int(os.getenv('WIKIPEDIA_POOL_SIZE', '16'))
+WIKIPEDIA_USER_AGENT = os.getenv(
+    'WIKIPEDIA_USER_AGENT',
+    'ai-chatbot/1.1 (https://github.com/Yessineee/ai-chatbot)'
+)
+
+
+class WikipediaLookupError(Exception):
+    """The lookup failed (network, timeout, bad response) rather than finding nothing."""
+
+
+class WikipediaClient:
+    """
+    Minimal MediaWiki API client.
+
+    A lookup is a single action=query request that runs the search and
+    returns the intro extract and canonical URL of every hit, so an answer
+    costs one round trip per language over a pooled keep-alive session.
+    """
+
+    def __init__(self, api_url: str = WIKIPEDIA_API_URL, connect_timeout: float = WIKIPEDIA_CONNECT_TIMEOUT,
+                 read_timeout: float = WIKIPEDIA_READ_TIMEOUT, pool_size: int = WIKIPEDIA_POOL_SIZE,
+                 user_agent: str = WIKIPEDIA_USER_AGENT, results: int = 5, sentences: int = 3):
+        """
+        Initialize the client. Sessions and threads are created lazily.
+
+        Args:
+            api_url: api.php URL template with a {lang} placeholder
+            connect_timeout: Seconds allowed to open a connection
+            read_timeout: Seconds allowed between response bytes
+            pool_size: Keep-alive connections kept per host
+            user_agent: Sent with every request, as Wikimedia requires
+            results: Search hits considered per language
+            sentences: Length of the returned summary
+        """
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.user_agent = user_agent
+        self.results = results
+        self.sentences = sentences
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+        self._pid = None
+        self._async_client = None
+        self._async_loop = None
+
+    def _ensure_resources(self):
+        # Sessions and thread pools must not be shared across fork()
+        if self._pid == os.getpid():
+            return
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": self.user_agent, "Accept": "application/json"})
+
+            self._session = session
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="wikipedia")
+            self._pid = os.getpid()
+
+    def warm_up(self):
+        """Import requests and open the session ahead of the first lookup."""
+        self._ensure_resources()
+
+    def _params(self, query: str) -> Dict:
+        return {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "generator": "search",
+            "gsrsearch": query,
+            "gsrlimit": str(self.results),
+            "prop": "extracts|info|pageprops",
+            "exintro": "1",
+            "explaintext": "1",
+            "exsentences": str(self.sentences),
+            "exlimit": str(self.results),
+            "inprop": "url",
+            "ppprop": "disambiguation",
+        }
+
+    def lookup(self, query: str, lang: str) -> Optional[Dict]:
+        """
+        Find the best article for ``query`` in one language.
+
+        Returns {"title", "summary", "url"}, or None when no usable article
+        exists. Raises WikipediaLookupError when the request itself fails.
+        """
+        self._ensure_resources()
+
+        try:
+            response = self._session.get(self.api_url.format(lang=lang), params=self._params(query),
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            raise WikipediaLookupError(f"Wikipedia ({lang}) lookup failed for '{query}': {e}") from e
+
+        return self._best_article(data, lang)
+
+    def _best_article(self, data: Dict, lang: str) -> Optional[Dict]:
+        if "error" in data:
+            raise WikipediaLookupError(f"Wikipedia ({lang}) API error: {data['error']}")
+
+        pages = data.get("query", {}).get("pages", [])
+        if isinstance(pages, dict):
+            # formatversion=1 style response
+            pages = list(pages.values())
+
+        # Keep the search ranking, skip disambiguation pages and empty extracts
+        for page in sorted(pages, key=lambda p: p.get("index", 0)):
+            if "disambiguation" in page.get("pageprops", {}):
+                continue
+            summary = (page.get("extract") or "").strip()
+            if not summary or page.get("missing"):
+                continue
+            return {
+                "title": page["title"],
+                "summary": summary,
+                "url": page.get("fullurl") or page.get("canonicalurl")
+                       or f"https://{lang}.wikipedia.org/wiki/{page['title'].replace(' ', '_')}",
+            }
+
+        return None
+
+    def lookup_many(self, query: str, languages: List[str], timeout: Optional[float] = None) -> Dict:
+        """
+        Query several languages concurrently.
+
+        Returns {lang: article, None, or the WikipediaLookupError raised}.
+        Languages still running after ``timeout`` seconds report an error.
+        """
+        if not languages:
+            return {}
+
+        self._ensure_resources()
+
+        if timeout is None:
+            timeout = sum(self.timeout)
+
+        futures = {lang: self._executor.submit(self.lookup, query, lang) for lang in languages}
+        wait(futures.values(), timeout=timeout)
+
+        outcomes = {}
+        for lang, future in futures.items():
+            if not future.done():
+                future.cancel()
+                outcomes[lang] = WikipediaLookupError(f"Wikipedia ({lang}) lookup timed out after {timeout}s")
+                continue
+            error = future.exception()
+            outcomes[lang] = error if error is not None else future.result()
+        return outcomes
+
+    async def _ensure_async_client(self):
+        import asyncio
+
+        # An AsyncClient belongs to the event loop that created it
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            import httpx
+
+            stale, stale_loop = self._async_client, self._async_loop
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size),
+                headers={"User-Agent": self.user_agent, "Accept": "application/json"},
+            )
+            self._async_loop = loop
+
+            # The previous loop's client would otherwise keep its pooled connections open
+            if stale is not None:
+                await self._close_stale_client(stale, stale_loop)
+        return self._async_client
+
+    @staticmethod
+    async def _close_stale_client(client, loop):
+        import asyncio
+
+        if not loop.is_closed():
+            # Still alive (another thread): close the client on its own loop
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+
+        # Its loop is gone: closing here still releases the sockets, though
+        # httpx then reports that the loop is closed
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Closed Wikipedia client of a finished event loop: {e}")
+
+    async def lookup_async(self, query: str, lang: str) -> Optional[Dict]:
+        """lookup() without blocking a thread: awaited on the running event loop."""
+        client = await self._ensure_async_client()
+
+        try:
+            response = await client.get(self.api_url.format(lang=lang), params=self._params(query))
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            raise WikipediaLookupError(f"Wikipedia ({lang}) lookup failed for '{query}': {e}") from e
+
+        return self._best_article(data, lang)
+
+    async def lookup_many_async(self, query: str, languages: List[str], timeout: Optional[float] = None) -> Dict:
+        """lookup_many() on the running event loop; same outcomes."""
+        import asyncio
+
+        if not languages:
+            return {}
+
+        if timeout is None:
+            timeout = sum(self.timeout)
+
+        tasks = {lang: asyncio.ensure_future(self.lookup_async(query, lang)) for lang in languages}
+        await asyncio.wait(tasks.values(), timeout=timeout)
+
+        outcomes = {}
+        for lang, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                outcomes[lang] = WikipediaLookupError(f"Wikipedia ({lang}) lookup timed out after {timeout}s")
+                continue
+            error = task.exception()
+            outcomes[lang] = error if error is not None else task.result()
+        return outcomes
+
+    async def aclose(self):
+        """Close the async connection pool (server shutdown)."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+
+wikipedia_client = WikipediaClient()